@@ -0,0 +1,342 @@
+# absence_index.py
+"""
+Интервальный индекс отсутствий в памяти.
+
+  - по каждому сотруднику — список периодов, отсортированный по date_from,
+    с накопленным максимумом date_to: «отсутствует ли X в день D» —
+    бинарный поиск и короткий просмотр назад;
+  - по всей организации — центрированное интервальное дерево:
+    «кто отсутствует в день D» и «кто отсутствовал в период» за O(log n + k).
+
+Индекс загружается из БД при первом запросе. AbsenceRepository сообщает
+об изменениях через on_created/on_status_changed/on_deleted: списки
+сотрудников обновляются сразу, дерево помечается устаревшим и
+перестраивается при следующем общем запросе.
+
+Индекс помнит счётчик data_versions.ABSENCES, с которым он совпадает с БД.
+Перед запросом счётчик сверяется с БД: если Absences менял другой процесс,
+индекс перечитывается. Изменение через репозиторий применяется на месте,
+только если оно следующее по счётчику, иначе индекс тоже перечитывается.
+Ручной SQL счётчик не меняет — после него нужен reload(); при смене БД
+он вызывается сам.
+"""
+import threading
+from bisect import bisect_right, insort
+from dataclasses import replace
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import data_versions
+import db
+from models import Absence
+
+# (date_from, date_to, absence_id)
+Interval = Tuple[str, str, int]
+
+
+def _day(value) -> str:
+    # принимаем и 'YYYY-MM-DD', и datetime.date
+    return value.isoformat() if hasattr(value, "isoformat") else value
+
+
+class _Node:
+    __slots__ = ("center", "by_start", "by_end", "left", "right")
+
+
+def _build(items: List[Interval]) -> Optional[_Node]:
+    """
+    Центрированное дерево: в узле — периоды, содержащие center.
+    items должны быть отсортированы по date_from (порядок сохраняется в поддеревьях).
+    """
+    if not items:
+        return None
+    # начало среднего периода: он сам попадает в узел, а левое и правое
+    # поддеревья получают не больше половины периодов каждое
+    center = items[len(items) // 2][0]
+
+    left: List[Interval] = []
+    right: List[Interval] = []
+    here: List[Interval] = []
+    for it in items:
+        if it[1] < center:
+            left.append(it)
+        elif it[0] > center:
+            right.append(it)
+        else:
+            here.append(it)
+
+    node = _Node()
+    node.center = center
+    node.by_start = here
+    node.by_end = sorted(here, key=lambda it: it[1], reverse=True)
+    node.left = _build(left)
+    node.right = _build(right)
+    return node
+
+
+def _query(node: Optional[_Node], start: str, end: str, out: List[int]) -> None:
+    """id периодов, пересекающих [start, end] (для точки start == end)."""
+    while node is not None:
+        if end < node.center:
+            # здесь все периоды заканчиваются не раньше center > end: нужен только date_from <= end
+            for it in node.by_start:
+                if it[0] > end:
+                    break
+                out.append(it[2])
+            node = node.left
+        elif start > node.center:
+            for it in node.by_end:
+                if it[1] < start:
+                    break
+                out.append(it[2])
+            node = node.right
+        else:
+            out.extend(it[2] for it in node.by_start)
+            _query(node.left, start, end, out)
+            node = node.right
+
+
+class _EmployeeAbsences:
+    """Периоды одного сотрудника по возрастанию date_from + накопленный максимум date_to."""
+
+    __slots__ = ("items", "starts", "max_end")
+
+    def __init__(self):
+        self.items: List[Interval] = []
+        self.starts: List[str] = []
+        self.max_end: List[str] = []
+
+    def _reindex(self) -> None:
+        self.starts = [it[0] for it in self.items]
+        self.max_end = []
+        top = ""
+        for it in self.items:
+            top = max(top, it[1])
+            self.max_end.append(top)
+
+    def add(self, item: Interval) -> None:
+        insort(self.items, item)
+        self._reindex()
+
+    def load(self, items: List[Interval]) -> None:
+        self.items = sorted(items)
+        self._reindex()
+
+    def remove(self, item: Interval) -> None:
+        self.items.remove(item)
+        self._reindex()
+
+    def overlapping(self, start: str, end: str) -> List[int]:
+        i = bisect_right(self.starts, end) - 1
+        found = []
+        while i >= 0 and self.max_end[i] >= start:
+            if self.items[i][1] >= start:
+                found.append(self.items[i][2])
+            i -= 1
+        found.reverse()
+        return found
+
+
+class AbsenceIndex:
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._records: Dict[int, Absence] = {}
+        self._by_employee: Dict[int, _EmployeeAbsences] = {}
+        self._tree: Optional[_Node] = None
+        self._tree_dirty = True
+        self._loaded = False
+        # значение счётчика в БД, которому соответствует индекс (None — счётчиков в БД нет)
+        self._db_version: Optional[int] = None
+        # растёт при каждом изменении: загрузка, пересёкшаяся с изменением, не засчитывается
+        self._version = 0
+
+    # ---------- загрузка ----------
+
+    def _ensure_loaded(self) -> None:
+        if self._loaded and not db.in_transaction():
+            # внутри транзакции свои изменения ещё не применены — сверка до COMMIT не нужна
+            current = data_versions.read(data_versions.ABSENCES)
+            with self._lock:
+                if self._loaded and current != self._db_version:
+                    self.reload()       # Absences изменил другой процесс
+        if self._loaded:
+            return
+        while True:
+            version = self._version
+            if db.in_transaction():
+                # соединение транзакции видит незафиксированные строки — читаем отдельным
+                conn = db.get_pool().open_detached()
+            else:
+                conn = db.get_connection()
+            try:
+                db_version = data_versions.read(data_versions.ABSENCES, conn)
+                rows = conn.execute("""
+                    SELECT absence_id, employee_id, absence_type_id, date_from, date_to, status
+                    FROM Absences
+                """).fetchall()
+            finally:
+                conn.close()
+            with self._lock:
+                if version != self._version:
+                    continue
+                self._records = {row[0]: Absence(*row) for row in rows}
+                grouped: Dict[int, List[Interval]] = {}
+                for rec in self._records.values():
+                    grouped.setdefault(rec.employee_id, []).append(self._interval(rec))
+                self._by_employee = {}
+                for employee_id, items in grouped.items():
+                    self._employee(employee_id).load(items)
+                self._tree_dirty = True
+                self._db_version = db_version
+                self._loaded = True
+                return
+
+    def reload(self) -> None:
+        """Перечитать индекс из БД при следующем запросе."""
+        with self._lock:
+            self._version += 1
+            self._loaded = False
+            self._records = {}
+            self._by_employee = {}
+            self._tree = None
+            self._tree_dirty = True
+
+    @staticmethod
+    def _interval(rec: Absence) -> Interval:
+        return rec.date_from, rec.date_to, rec.absence_id
+
+    def _employee(self, employee_id: int) -> _EmployeeAbsences:
+        emp = self._by_employee.get(employee_id)
+        if emp is None:
+            emp = self._by_employee[employee_id] = _EmployeeAbsences()
+        return emp
+
+    def _get_tree(self) -> Optional[_Node]:
+        if self._tree_dirty:
+            self._tree = _build(sorted(self._interval(r) for r in self._records.values()))
+            self._tree_dirty = False
+        return self._tree
+
+    # ---------- синхронизация с AbsenceRepository ----------
+
+    def _in_sequence(self, version: Optional[int]) -> bool:
+        """
+        Можно ли применить изменение с новым счётчиком version на месте.
+        Если между загрузкой и ним был чужой коммит, индекс перечитывается.
+        """
+        if not self._loaded:
+            return False
+        if version is None:
+            return True                 # БД без счётчиков: верим репозиторию
+        if self._db_version is None or version != self._db_version + 1:
+            self.reload()
+            return False
+        self._db_version = version
+        return True
+
+    def on_created(self, absence: Absence, version: Optional[int] = None) -> None:
+        with self._lock:
+            self._version += 1
+            if not self._in_sequence(version):
+                return
+            rec = replace(absence)
+            self._records[rec.absence_id] = rec
+            self._employee(rec.employee_id).add(self._interval(rec))
+            self._tree_dirty = True
+
+    def on_status_changed(self, absence_id: int, status: str,
+                          version: Optional[int] = None) -> None:
+        with self._lock:
+            self._version += 1
+            if not self._in_sequence(version):
+                return
+            rec = self._records.get(absence_id)
+            if rec is not None:
+                rec.status = status       # границы не меняются — дерево остаётся прежним
+
+    def on_deleted(self, absence_id: int, version: Optional[int] = None) -> None:
+        with self._lock:
+            self._version += 1
+            if not self._in_sequence(version):
+                return
+            rec = self._records.pop(absence_id, None)
+            if rec is not None:
+                self._by_employee[rec.employee_id].remove(self._interval(rec))
+                self._tree_dirty = True
+
+    # ---------- запросы ----------
+
+    def _select(self, ids: Iterable[int], statuses: Optional[Iterable[str]]) -> List[Absence]:
+        allowed = set(statuses) if statuses is not None else None
+        result = []
+        for absence_id in ids:
+            rec = self._records[absence_id]
+            if allowed is None or rec.status in allowed:
+                # копия, чтобы вызывающий код не испортил индекс
+                result.append(Absence(rec.absence_id, rec.employee_id, rec.absence_type_id,
+                                      rec.date_from, rec.date_to, rec.status))
+        return result
+
+    def for_employee(self, employee_id: int, start, end=None,
+                     statuses: Optional[Iterable[str]] = None) -> List[Absence]:
+        """Отсутствия сотрудника, пересекающие [start, end] (без end — в день start)."""
+        start = _day(start)
+        end = _day(end) if end is not None else start
+        self._ensure_loaded()
+        with self._lock:
+            emp = self._by_employee.get(employee_id)
+            if emp is None:
+                return []
+            return self._select(emp.overlapping(start, end), statuses)
+
+    def is_absent(self, employee_id: int, day,
+                  statuses: Optional[Iterable[str]] = None) -> bool:
+        day = _day(day)
+        self._ensure_loaded()
+        allowed = set(statuses) if statuses is not None else None
+        with self._lock:
+            emp = self._by_employee.get(employee_id)
+            if emp is None:
+                return False
+            return any(allowed is None or self._records[i].status in allowed
+                       for i in emp.overlapping(day, day))
+
+    def between(self, start, end, statuses: Optional[Iterable[str]] = None) -> List[Absence]:
+        """Все отсутствия организации, пересекающие [start, end], по возрастанию date_from."""
+        start, end = _day(start), _day(end)
+        self._ensure_loaded()
+        with self._lock:
+            ids: List[int] = []
+            _query(self._get_tree(), start, end, ids)
+            result = self._select(ids, statuses)
+        result.sort(key=lambda a: (a.date_from, a.absence_id))
+        return result
+
+    def on_day(self, day, statuses: Optional[Iterable[str]] = None) -> List[Absence]:
+        """Кто отсутствует в указанный день."""
+        return self.between(day, day, statuses)
+
+    def absent_employees(self, day, statuses: Optional[Iterable[str]] = None) -> List[int]:
+        return sorted({a.employee_id for a in self.on_day(day, statuses)})
+
+
+index = AbsenceIndex()
+
+
+def on_created(absence: Absence, version: Optional[int] = None) -> None:
+    index.on_created(absence, version)
+
+
+def on_status_changed(absence_id: int, status: str, version: Optional[int] = None) -> None:
+    index.on_status_changed(absence_id, status, version)
+
+
+def on_deleted(absence_id: int, version: Optional[int] = None) -> None:
+    index.on_deleted(absence_id, version)
+
+
+def reload() -> None:
+    index.reload()
+
+
+db.on_db_changed(reload)
@@ -0,0 +1,341 @@
+# analytics.py
+"""
+Опоздания и переработки за период.
+
+Рабочие дни периода вместе с первым приходом (IN) и последним уходом (OUT)
+загружаются в массивы NumPy, после чего показатели считаются векторно:
+  - опоздание — минуты между planned_start и первым IN (если пришёл позже);
+  - переработка — часы сверх нормы rollups.NORM_HOURS;
+  - итоги по сотрудникам и отделам — через np.bincount.
+
+Время хранится в минутах от полуночи, -1 — нет значения. Опоздание
+считается с точностью до минуты, как и в сводных таблицах rollups.py.
+Если часы дня не посчитаны (total_hours пусто), берётся промежуток
+от первого IN до последнего OUT.
+
+reference_summaries — та же логика на чистом Python, для сверки.
+"""
+import argparse
+import random
+import time
+from array import array
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from db import get_connection
+import partitions
+from rollups import NORM_HOURS
+
+FETCH_SIZE = 5000
+
+_PERIOD_SQL = """
+    SELECT w.workday_id,
+           w.employee_id,
+           IFNULL(e.department, '') AS department,
+           IFNULL(CAST(substr(w.planned_start, 1, 2) AS INTEGER) * 60
+                  + CAST(substr(w.planned_start, 4, 2) AS INTEGER), -1) AS planned_start,
+           IFNULL(CAST(substr(p.first_in, 12, 2) AS INTEGER) * 60
+                  + CAST(substr(p.first_in, 15, 2) AS INTEGER), -1) AS first_in,
+           IFNULL(CAST(substr(p.last_out, 12, 2) AS INTEGER) * 60
+                  + CAST(substr(p.last_out, 15, 2) AS INTEGER), -1) AS last_out,
+           w.total_hours
+    FROM WorkDays w
+    JOIN Employee e ON e.employee_id = w.employee_id
+    LEFT JOIN (
+        SELECT t.workday_id,
+               MIN(CASE WHEN t.event_type = 'IN' THEN t.event_time END) AS first_in,
+               MAX(CASE WHEN t.event_type = 'OUT' THEN t.event_time END) AS last_out
+        FROM {source} t
+        JOIN WorkDays d ON d.workday_id = t.workday_id
+        WHERE d.work_date BETWEEN ? AND ?
+        GROUP BY t.workday_id
+    ) p ON p.workday_id = w.workday_id
+    WHERE w.work_date BETWEEN ? AND ?
+"""
+
+
+def _require_numpy() -> None:
+    if np is None:
+        raise RuntimeError("Для аналитики нужен NumPy (pip install numpy)")
+
+
+@dataclass
+class PeriodData:
+    """Рабочие дни периода по колонкам. department — коды в списке departments."""
+    workday_id: "np.ndarray"        # int64
+    employee_id: "np.ndarray"       # int32
+    department: "np.ndarray"        # int32
+    planned_start: "np.ndarray"     # int16, минуты от полуночи или -1
+    first_in: "np.ndarray"          # int16
+    last_out: "np.ndarray"          # int16
+    total_hours: "np.ndarray"       # float64, NaN — не посчитано
+    departments: List[str]
+
+    def __len__(self) -> int:
+        return len(self.workday_id)
+
+
+@dataclass
+class Summary:
+    """Итоги по ключам (сотрудникам или отделам); i-й элемент массивов относится к keys[i]."""
+    keys: list
+    days: "np.ndarray"
+    late_days: "np.ndarray"
+    late_minutes: "np.ndarray"
+    hours: "np.ndarray"
+    overtime_hours: "np.ndarray"
+
+    def rows(self) -> List[Tuple]:
+        """(ключ, дней, дней с опозданием, минут опоздания, часы, переработка)."""
+        return [
+            (key, int(d), int(ld), int(lm), round(float(h), 2), round(float(o), 2))
+            for key, d, ld, lm, h, o in zip(self.keys, self.days, self.late_days,
+                                            self.late_minutes, self.hours, self.overtime_hours)
+        ]
+
+
+def load_period(start_date: str,
+                end_date: str,
+                department: Optional[str] = None,
+                fetch_size: int = FETCH_SIZE) -> PeriodData:
+    """Загрузить рабочие дни периода с первым IN и последним OUT."""
+    _require_numpy()
+    sql = _PERIOD_SQL
+    if department is not None:
+        sql += " AND e.department = ?"
+
+    cols = {name: array(code) for name, code in (
+        ("workday_id", "q"), ("employee_id", "i"), ("department", "i"),
+        ("planned_start", "h"), ("first_in", "h"), ("last_out", "h"), ("total_hours", "d"),
+    )}
+    codes: Dict[str, int] = {}
+    nan = float("nan")
+
+    conn = get_connection()
+    try:
+        cur = conn.cursor()
+        # при помесячных разделах отметок период читается частями (partitions.chunks)
+        for chunk_start, chunk_end, source in partitions.chunks(conn, start_date, end_date):
+            params: List = [chunk_start, chunk_end, chunk_start, chunk_end]
+            if department is not None:
+                params.append(department)
+            cur.execute(sql.format(source=source), params)
+            while True:
+                rows = cur.fetchmany(fetch_size)
+                if not rows:
+                    break
+                for wid, eid, dept, planned, first_in, last_out, hours in rows:
+                    code = codes.get(dept)
+                    if code is None:
+                        code = codes[dept] = len(codes)
+                    cols["workday_id"].append(wid)
+                    cols["employee_id"].append(eid)
+                    cols["department"].append(code)
+                    cols["planned_start"].append(planned)
+                    cols["first_in"].append(first_in)
+                    cols["last_out"].append(last_out)
+                    cols["total_hours"].append(nan if hours is None else hours)
+    finally:
+        conn.close()
+
+    dtypes = {"q": np.int64, "i": np.int32, "h": np.int16, "d": np.float64}
+    arrays = {
+        name: np.frombuffer(col, dtype=dtypes[col.typecode]) if len(col) else
+        np.empty(0, dtypes[col.typecode])
+        for name, col in cols.items()
+    }
+    return PeriodData(departments=list(codes), **arrays)
+
+
+# ====== Векторный расчёт ======
+
+def day_metrics(data: PeriodData, norm_hours: float = NORM_HOURS) -> Dict[str, "np.ndarray"]:
+    """Показатели каждого дня: минуты опоздания, часы и переработка."""
+    first_in = data.first_in.astype(np.int32)
+    last_out = data.last_out.astype(np.int32)
+    planned = data.planned_start.astype(np.int32)
+
+    has_start = (planned >= 0) & (first_in >= 0)
+    late_minutes = np.where(has_start, np.maximum(first_in - planned, 0), 0)
+
+    has_span = (first_in >= 0) & (last_out > first_in)
+    span_hours = np.where(has_span, (last_out - first_in) / 60.0, 0.0)
+    hours = np.where(np.isnan(data.total_hours), span_hours, data.total_hours)
+    overtime = np.maximum(hours - norm_hours, 0.0)
+
+    return {"late_minutes": late_minutes, "hours": hours, "overtime_hours": overtime}
+
+
+def _summarize(keys: list, codes: "np.ndarray", metrics: Dict[str, "np.ndarray"]) -> Summary:
+    n = len(keys)
+    late_minutes = metrics["late_minutes"]
+    return Summary(
+        keys=keys,
+        days=np.bincount(codes, minlength=n),
+        late_days=np.bincount(codes, weights=late_minutes > 0, minlength=n).astype(np.int64),
+        late_minutes=np.bincount(codes, weights=late_minutes, minlength=n).astype(np.int64),
+        hours=np.bincount(codes, weights=metrics["hours"], minlength=n),
+        overtime_hours=np.bincount(codes, weights=metrics["overtime_hours"], minlength=n),
+    )
+
+
+def summaries(data: PeriodData, norm_hours: float = NORM_HOURS) -> Tuple[Summary, Summary]:
+    """Итоги (по сотрудникам, по отделам)."""
+    _require_numpy()
+    metrics = day_metrics(data, norm_hours)
+    employee_ids, employee_codes = np.unique(data.employee_id, return_inverse=True)
+    by_employee = _summarize(employee_ids.tolist(), employee_codes.ravel(), metrics)
+    by_department = _summarize(list(data.departments), data.department, metrics)
+    return by_employee, by_department
+
+
+def analyze(start_date: str,
+            end_date: str,
+            department: Optional[str] = None,
+            norm_hours: float = NORM_HOURS) -> Tuple[Summary, Summary]:
+    """Опоздания и переработки за период: (по сотрудникам, по отделам)."""
+    return summaries(load_period(start_date, end_date, department), norm_hours)
+
+
+# ====== Эталон на чистом Python ======
+
+def reference_summaries(data: PeriodData,
+                        norm_hours: float = NORM_HOURS) -> Tuple[Dict, Dict]:
+    """
+    Те же итоги циклом по дням. Возвращает два словаря
+    ключ -> [дней, дней с опозданием, минут опоздания, часы, переработка].
+    """
+    by_employee: Dict[int, list] = {}
+    by_department: Dict[str, list] = {}
+    columns = zip(data.employee_id.tolist(), data.department.tolist(),
+                  data.planned_start.tolist(), data.first_in.tolist(),
+                  data.last_out.tolist(), data.total_hours.tolist())
+
+    for eid, dept, planned, first_in, last_out, total in columns:
+        late = max(first_in - planned, 0) if planned >= 0 and first_in >= 0 else 0
+        if total != total:       # NaN
+            total = (last_out - first_in) / 60.0 if first_in >= 0 and last_out > first_in else 0.0
+        overtime = max(total - norm_hours, 0.0)
+        for acc in (by_employee.setdefault(eid, [0, 0, 0, 0.0, 0.0]),
+                    by_department.setdefault(data.departments[dept], [0, 0, 0, 0.0, 0.0])):
+            acc[0] += 1
+            acc[1] += late > 0
+            acc[2] += late
+            acc[3] += total
+            acc[4] += overtime
+    return by_employee, by_department
+
+
+def matches_reference(summary: Summary, reference: Dict) -> bool:
+    """Совпадают ли векторные итоги с эталонными (часы — с точностью до 1e-6)."""
+    if sorted(reference) != sorted(k for k, d in zip(summary.keys, summary.days) if d):
+        return False
+    for i, key in enumerate(summary.keys):
+        if not summary.days[i]:
+            continue
+        days, late_days, late_minutes, hours, overtime = reference[key]
+        if (days, late_days, late_minutes) != (
+                summary.days[i], summary.late_days[i], summary.late_minutes[i]):
+            return False
+        if abs(hours - summary.hours[i]) > 1e-6 or abs(overtime - summary.overtime_hours[i]) > 1e-6:
+            return False
+    return True
+
+
+# ====== Замер ======
+
+def synthetic_period(workdays: int, employees: int = 2000, seed: int = 1) -> PeriodData:
+    """Случайный период для замеров: часть дней без отметок и без посчитанных часов."""
+    _require_numpy()
+    rng = np.random.default_rng(seed)
+    employee_id = rng.integers(1, employees + 1, workdays, dtype=np.int32)
+    planned = rng.choice(np.array([480, 540, 600, -1], dtype=np.int16), workdays,
+                         p=[0.3, 0.5, 0.15, 0.05])
+    first_in = (540 + rng.normal(0, 20, workdays)).astype(np.int16)
+    first_in[rng.random(workdays) < 0.05] = -1
+    last_out = (first_in + rng.integers(360, 660, workdays)).astype(np.int16)
+    last_out[rng.random(workdays) < 0.05] = -1
+    total = np.round(rng.uniform(4, 12, workdays), 2)
+    total[rng.random(workdays) < 0.1] = np.nan
+    departments = [f"Отдел {i}" for i in range(20)]
+    return PeriodData(
+        workday_id=np.arange(1, workdays + 1, dtype=np.int64),
+        employee_id=employee_id,
+        department=((employee_id - 1) % len(departments)).astype(np.int32),
+        planned_start=planned,
+        first_in=first_in,
+        last_out=last_out,
+        total_hours=total,
+        departments=departments,
+    )
+
+
+def benchmark(workdays: int = 200_000, repeat: int = 3) -> Dict[str, float]:
+    """Сравнить векторный расчёт с эталоном на синтетических данных."""
+    data = synthetic_period(workdays)
+
+    def best(func) -> float:
+        times = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func(data)
+            times.append(time.perf_counter() - started)
+        return min(times)
+
+    by_employee, by_department = summaries(data)
+    ref_employee, ref_department = reference_summaries(data)
+    if not (matches_reference(by_employee, ref_employee)
+            and matches_reference(by_department, ref_department)):
+        raise AssertionError("Векторный расчёт расходится с эталоном")
+
+    vectorized = best(summaries)
+    reference = best(reference_summaries)
+    return {
+        "workdays": workdays,
+        "numpy_s": vectorized,
+        "python_s": reference,
+        "speedup": reference / vectorized if vectorized else float("inf"),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Опоздания и переработки за период")
+    parser.add_argument("--from", dest="start_date", help="с даты (YYYY-MM-DD)")
+    parser.add_argument("--to", dest="end_date", help="по дату (YYYY-MM-DD)")
+    parser.add_argument("--department", help="только этот отдел")
+    parser.add_argument("--check", action="store_true", help="сверить с эталонным расчётом")
+    parser.add_argument("--benchmark", type=int, metavar="N",
+                        help="замер на N синтетических рабочих днях вместо отчёта")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        result = benchmark(args.benchmark)
+        print(f"Рабочих дней: {result['workdays']}")
+        print(f"  NumPy:  {result['numpy_s'] * 1000:9.1f} мс")
+        print(f"  Python: {result['python_s'] * 1000:9.1f} мс")
+        print(f"  Ускорение: x{result['speedup']:.1f}")
+        return
+
+    if not args.start_date or not args.end_date:
+        parser.error("укажите --from и --to (или --benchmark N)")
+
+    data = load_period(args.start_date, args.end_date, args.department)
+    by_employee, by_department = summaries(data)
+    if args.check:
+        ref_employee, ref_department = reference_summaries(data)
+        ok = (matches_reference(by_employee, ref_employee)
+              and matches_reference(by_department, ref_department))
+        print("Сверка с эталоном:", "совпадает" if ok else "РАСХОДИТСЯ")
+
+    print(f"{'Отдел':<20} {'Дней':>6} {'Опозд.':>7} {'Минут':>7} {'Часы':>9} {'Перераб.':>9}")
+    for dept, days, late_days, late_minutes, hours, overtime in by_department.rows():
+        print(f"{dept or '-':<20} {days:>6} {late_days:>7} {late_minutes:>7} {hours:>9.2f} {overtime:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,45 +1,110 @@
 # app.py
-from typing import Iterable, Sequence, Any
+from itertools import chain
+from typing import Iterable, Optional
 
+import pivot
+from console import print_table, screen_page_size
 from repositories import (
     EmployeeRepository,
     WorkDayRepository,
     UserAccountRepository,
 )
+from sessions import login as open_session, get_session, logout
 from services import (
-    authenticate,
     get_personal_report,
+    get_monthly_report,
+    get_monthly_timesheet,
+    get_department_summary,
     mark_time_entry,
-    generate_timesheet,
+    iter_timesheet,
     export_timesheet_to_csv,
     get_department_of_employee,
+    find_employees,
     update_employee_data,
     create_user_with_role,
     create_employee,
 )
 
 
-def print_table(headers: Sequence[str], rows: Iterable[Sequence[Any]]) -> None:
-    rows = list(rows)
-    str_rows = [[str(x) for x in row] for row in rows]
-    str_headers = [str(h) for h in headers]
-
-    col_widths = []
-    num_cols = len(headers)
-    for col in range(num_cols):
-        max_len = len(str_headers[col])
-        for row in str_rows:
-            if col < len(row):
-                max_len = max(max_len, len(row[col]))
-        col_widths.append(max_len)
-
-    fmt = "  ".join("{:<" + str(w) + "}" for w in col_widths)
-
-    print(fmt.format(*str_headers))
-    print("  ".join("-" * w for w in col_widths))
-
-    for row in str_rows:
-        print(fmt.format(*row))
+def show_timesheet(rows: Iterable[tuple]) -> bool:
+    """
+    Показать табель постранично: rows — iter_timesheet или готовый список.
+    Возвращает False, если за период нет данных.
+    """
+    timesheet = iter(rows)
+    try:
+        first = next(timesheet, None)
+        if first is None:
+            return False
+        shown = print_table(["Отдел", "ФИО", "Дата", "Часы"], chain([first], timesheet),
+                            page_size=screen_page_size())
+        print(f"Показано строк: {shown}")
+    finally:
+        close = getattr(rows, "close", None)
+        if close is not None:
+            close()           # вернуть соединение в пул, если табель не дочитан
+    return True
+
+
+def input_employee_id(prompt: str) -> Optional[int]:
+    """
+    Спросить сотрудника: ID или часть ФИО/должности/отдела («иван пет»).
+    При нескольких совпадениях показывает список и просит выбрать ID.
+    None — сотрудник не выбран.
+    """
+    text = input(prompt).strip()
+    if text.isdigit():
+        return int(text)
+    found = find_employees(text)
+    if not found:
+        print("Сотрудники не найдены.")
+        return None
+    if len(found) == 1:
+        e = found[0]
+        print(f"Найден: {e.last_name} {e.first_name} {e.middle_name or ''}".rstrip() + f" (ID={e.employee_id})")
+        return e.employee_id
+    print_table(["ID", "ФИО", "Должность", "Отдел"], [
+        (e.employee_id, f"{e.last_name} {e.first_name} {e.middle_name or ''}".strip(),
+         e.position or "", e.department or "")
+        for e in found
+    ])
+    choice = input("ID сотрудника из списка: ").strip()
+    if not choice.isdigit():
+        print("Некорректный ID.")
+        return None
+    return int(choice)
+
+
+def input_month(prompt: str = "Месяц (YYYY-MM): ") -> str:
+    return input(prompt).strip()
+
+
+def show_monthly_timesheet(month: str, department: Optional[str]) -> None:
+    """Сводный табель за месяц из EmployeeMonthStats (не из сырых отметок)."""
+    rows = get_monthly_timesheet(month, department)
+    if not rows:
+        print("Нет данных за месяц.")
+        return
+    print_table(["Отдел", "ФИО", "Часы", "Отметок", "Опозданий", "Переработка"], rows,
+                page_size=screen_page_size())
+
+
+def show_month_pivot(month: str, department: Optional[str]) -> None:
+    """Табель сотрудники × дни за месяц (pivot.py), по запросу — в CSV."""
+    try:
+        table = pivot.build(month, department)
+    except ValueError:
+        print("Некорректный месяц, ожидается YYYY-MM.")
+        return
+    if not len(table):
+        print("Нет сотрудников.")
+        return
+    print_table(table.header(), table.rows(), page_size=screen_page_size())
+    ans = input("Экспортировать в CSV? (y/n): ").strip().lower()
+    if ans == "y":
+        filename = input("Имя файла (например tabel.csv): ").strip()
+        count = pivot.export_csv(table, filename)
+        print(f"Табель экспортирован в {filename} ({count} строк)")
 
 
 def input_dates() -> tuple[str, str]:
@@ -48,8 +113,17 @@ def input_dates() -> tuple[str, str]:
     return start_date, end_date
 
 
-def main_menu(user, role_names):
+def main_menu(token: str):
     while True:
+        # учётная запись и роли — из сессии на каждом шаге:
+        # блокировка, смена ролей или истечение сессии действуют сразу
+        session = get_session(token)
+        if session is None:
+            print("Сессия завершена. Войдите снова.")
+            break
+        user, roles = session
+        role_names = {r.name for r in roles}
+
         print("\n=== Главное меню ===")
         print(f"Вы вошли как: {user.login} (ID={user.user_id}), роли: {', '.join(sorted(role_names))}")
         print("0 - Выход")
@@ -59,15 +133,21 @@ def main_menu(user, role_names):
             print("1 - Отметить приход")
             print("2 - Отметить уход")
             print("3 - Посмотреть личный отчёт")
+            print("10 - Личный отчёт по месяцам")
 
         # HR
         if "HR" in role_names:
             print("4 - Редактировать данные сотрудника")
             print("5 - Сформировать табель по всей организации")
+            print("12 - Сводный табель организации за месяц")
+            print("13 - Итоги по отделам за период")
+            print("14 - Табель за месяц по дням (организация или отдел)")
 
         # Руководитель
         if "Manager" in role_names:
             print("6 - Просмотреть отчёт по своему подразделению")
+            print("11 - Сводный табель подразделения за месяц")
+            print("15 - Табель подразделения за месяц по дням")
 
         # Админ
         if "Admin" in role_names:
@@ -94,14 +174,21 @@ def main_menu(user, role_names):
                 print("Данные отсутствуют.")
             else:
                 print("\nЛичный отчёт:")
-                print_table(["Дата", "Часы", "Кол-во отметок"], report)
+                print_table(["Дата", "Часы", "Кол-во отметок"], report, page_size=screen_page_size())
+
+        elif choice == "10" and "Employee" in role_names:
+            report = get_monthly_report(user.employee_id)
+            if not report:
+                print("Данные отсутствуют.")
+            else:
+                print("\nЛичный отчёт по месяцам:")
+                print_table(["Месяц", "Часы", "Отметок", "Опозданий", "Переработка"], report,
+                            page_size=screen_page_size())
 
         # === Функции HR ===
         elif choice == "4" and "HR" in role_names:
-            try:
-                emp_id = int(input("ID сотрудника для редактирования: ").strip())
-            except ValueError:
-                print("Некорректный ID.")
+            emp_id = input_employee_id("ID или ФИО сотрудника для редактирования: ")
+            if emp_id is None:
                 continue
             new_pos = input("Новая должность (пусто — оставить прежнюю): ").strip()
             new_dep = input("Новый отдел (пусто — оставить прежний): ").strip()
@@ -118,16 +205,32 @@ def main_menu(user, role_names):
         elif choice == "5" and "HR" in role_names:
             print("\nФормирование табеля по всей организации")
             start_date, end_date = input_dates()
-            rows = generate_timesheet(start_date, end_date, department=None)
-            if not rows:
+            if not show_timesheet(iter_timesheet(start_date, end_date, None)):
                 print("Нет данных за указанный период.")
             else:
-                print_table(["Отдел", "ФИО", "Дата", "Часы"], rows)
                 ans = input("Экспортировать в CSV? (y/n): ").strip().lower()
                 if ans == "y":
                     filename = input("Имя файла (например timesheet_all.csv): ").strip()
-                    export_timesheet_to_csv(filename, rows)
-                    print(f"Табель экспортирован в {filename}")
+                    count = export_timesheet_to_csv(filename, iter_timesheet(start_date, end_date, None))
+                    print(f"Табель экспортирован в {filename} ({count} строк)")
+
+        elif choice == "12" and "HR" in role_names:
+            show_monthly_timesheet(input_month(), None)
+
+        elif choice == "13" and "HR" in role_names:
+            start_month = input_month("Месяц начала (YYYY-MM): ")
+            end_month = input_month("Месяц окончания (YYYY-MM): ")
+            summary = get_department_summary(start_month, end_month)
+            if not summary:
+                print("Нет данных за период.")
+            else:
+                print_table(["Отдел", "Месяц", "Часы", "Отметок", "Опозданий", "Переработка"], summary,
+                            page_size=screen_page_size())
+
+        elif choice == "14" and "HR" in role_names:
+            month = input_month()
+            dep = input("Отдел (пусто — вся организация): ").strip()
+            show_month_pivot(month, dep or None)
 
         # === Функции руководителя ===
         elif choice == "6" and "Manager" in role_names:
@@ -137,24 +240,36 @@ def main_menu(user, role_names):
             else:
                 print(f"\nТабель по отделу: {dep}")
                 start_date, end_date = input_dates()
-                rows = generate_timesheet(start_date, end_date, department=dep)
-                if not rows:
+                if not show_timesheet(iter_timesheet(start_date, end_date, dep)):
                     print("Нет данных за период.")
                 else:
-                    print_table(["Отдел", "ФИО", "Дата", "Часы"], rows)
                     ans = input("Экспортировать в CSV? (y/n): ").strip().lower()
                     if ans == "y":
                         filename = input("Имя файла (например dept_report.csv): ").strip()
-                        export_timesheet_to_csv(filename, rows)
-                        print(f"Отчёт отдела экспортирован в {filename}")
+                        count = export_timesheet_to_csv(filename, iter_timesheet(start_date, end_date, dep))
+                        print(f"Отчёт отдела экспортирован в {filename} ({count} строк)")
+
+        elif choice == "11" and "Manager" in role_names:
+            dep = get_department_of_employee(user.employee_id)
+            if not dep:
+                print("Не удалось определить ваш отдел.")
+            else:
+                print(f"\nСводный табель отдела: {dep}")
+                show_monthly_timesheet(input_month(), dep)
+
+        elif choice == "15" and "Manager" in role_names:
+            dep = get_department_of_employee(user.employee_id)
+            if not dep:
+                print("Не удалось определить ваш отдел.")
+            else:
+                print(f"\nТабель отдела по дням: {dep}")
+                show_month_pivot(input_month(), dep)
 
         # === Функции администратора ===
         elif choice == "7" and "Admin" in role_names:
             # создать пользователя для уже существующего сотрудника
-            try:
-                emp_id = int(input("ID существующего сотрудника: ").strip())
-            except ValueError:
-                print("Некорректный ID.")
+            emp_id = input_employee_id("ID или ФИО существующего сотрудника: ")
+            if emp_id is None:
                 continue
 
             login = input("Логин: ").strip()
@@ -170,14 +285,12 @@ def main_menu(user, role_names):
         elif choice == "8" and "Admin" in role_names:
             print("\nГлобальный табель")
             start_date, end_date = input_dates()
-            rows = generate_timesheet(start_date, end_date, department=None)
-            if not rows:
+            if not show_timesheet(iter_timesheet(start_date, end_date, None)):
                 print("Нет данных за период.")
             else:
-                print_table(["Отдел", "ФИО", "Дата", "Часы"], rows)
                 filename = input("Имя CSV файла (например timesheet_global.csv): ").strip()
-                export_timesheet_to_csv(filename, rows)
-                print(f"Табель экспортирован в {filename}")
+                count = export_timesheet_to_csv(filename, iter_timesheet(start_date, end_date, None))
+                print(f"Табель экспортирован в {filename} ({count} строк)")
 
         elif choice == "9" and "Admin" in role_names:
             # полный цикл: создать сотрудника + учётку
@@ -223,19 +336,25 @@ def main():
         login = input("Логин: ").strip()
         password = input("Пароль: ").strip()
 
-        auth_result = authenticate(login, password)
-        if auth_result is None:
+        token = open_session(login, password)
+        if token is None:
             print("Неверный логин или пароль, попробуйте ещё раз.")
-        else:
-            user, roles = auth_result
-            role_names = {r.name for r in roles}
-            if not role_names:
+            continue
+        try:
+            # учётную запись могли заблокировать или удалить сразу после входа
+            session = get_session(token)
+            if session is None:
+                print("Вход не удался, попробуйте ещё раз.")
+                continue
+            if not session[1]:
                 print("У пользователя нет ролей. Доступ запрещён.")
                 return
 
             print("\nУспешный вход.")
-            main_menu(user, role_names)
-            return
+            main_menu(token)
+        finally:
+            logout(token)
+        return
 
     print("Превышено количество попыток входа.")
 
@@ -0,0 +1,377 @@
+# bench.py
+"""
+Замеры репозиториев, сервисов и экспорта.
+
+Запускается на БД, созданной datagen.py (БД меняется: замеры записи
+создают и удаляют строки, mark_time_entry добавляет отметки за сегодня),
+поэтому не запускайте его на рабочей базе.
+
+    python datagen.py --db bench.db --employees 10000 --days 730
+    python bench.py --db bench.db --out results.json
+    python bench.py --db bench.db --compare results.json
+
+Результаты пишутся в JSON: на каждый замер — число вызовов за повтор и
+время одного вызова (min/median/mean/max, мс). --compare сравнивает
+медианы с прошлым файлом и завершается с кодом 1, если что-то
+замедлилось больше чем на --threshold.
+"""
+import argparse
+import contextlib
+import io
+import json
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import db
+import export
+import services
+from models import Absence, Employee, TimeEntry, UserAccount, WorkDay
+from repositories import (
+    AbsenceRepository, EmployeeRepository, TimeEntryRepository,
+    UserAccountRepository, UserRoleRepository, WorkDayRepository,
+)
+
+TABLES = ["Employee", "WorkDays", "TimeEntries", "Absences", "UserAccounts"]
+
+
+@dataclass
+class Case:
+    name: str
+    func: Callable[[int], object]     # получает номер вызова
+    number: int = 100                  # вызовов за один повтор
+
+
+def _time_case(case: Case, repeat: int) -> dict:
+    per_call = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for i in range(case.number):
+            case.func(i)
+        per_call.append((time.perf_counter() - started) / case.number * 1000)
+    return {
+        "number": case.number,
+        "repeat": repeat,
+        "min_ms": min(per_call),
+        "median_ms": statistics.median(per_call),
+        "mean_ms": statistics.fmean(per_call),
+        "max_ms": max(per_call),
+    }
+
+
+class Fixture:
+    """Выборка реальных id из БД, на которых гоняются замеры."""
+
+    def __init__(self, seed: int = 1):
+        rnd = random.Random(seed)
+        conn = db.get_connection()
+        try:
+            cur = conn.cursor()
+            employees = [r[0] for r in cur.execute("SELECT employee_id FROM Employee")]
+            workdays = [r[0] for r in cur.execute(
+                "SELECT workday_id FROM WorkDays ORDER BY random() LIMIT 1000")]
+            self.logins = [r[0] for r in cur.execute(
+                "SELECT login FROM UserAccounts ORDER BY random() LIMIT 1000")]
+            self.user_ids = [r[0] for r in cur.execute(
+                "SELECT user_id FROM UserAccounts ORDER BY random() LIMIT 1000")]
+            self.role_ids = [r[0] for r in cur.execute("SELECT role_id FROM Roles")]
+            self.absence_type = cur.execute("SELECT MIN(absence_type_id) FROM AbsenceType").fetchone()[0]
+            # дни, созданные прошлыми замерами (2100 год и дальше), не считаем
+            last = cur.execute("SELECT MAX(work_date) FROM WorkDays WHERE work_date < '2099-01-01'").fetchone()[0]
+            self.department = cur.execute(
+                "SELECT department FROM Employee GROUP BY department ORDER BY COUNT(*) DESC LIMIT 1"
+            ).fetchone()[0]
+            self.rows = {t: cur.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0] for t in TABLES}
+        finally:
+            conn.close()
+        if not employees or not workdays:
+            raise SystemExit("В БД нет данных — сначала запустите datagen.py")
+
+        self.employees = [rnd.choice(employees) for _ in range(1000)]
+        self.workdays = workdays
+        # месяц в конце данных: табель и отчёты считаются по нему
+        self.month_start = last[:8] + "01"
+        self.month_end = last
+
+    def employee(self, i: int) -> int:
+        return self.employees[i % len(self.employees)]
+
+    def workday(self, i: int) -> int:
+        return self.workdays[i % len(self.workdays)]
+
+    @staticmethod
+    def last_workday(employee_id: int) -> date:
+        conn = db.get_connection()
+        try:
+            last = conn.execute("SELECT MAX(work_date) FROM WorkDays WHERE employee_id = ?",
+                                (employee_id,)).fetchone()[0]
+        finally:
+            conn.close()
+        return date.fromisoformat(last) if last else date.min
+
+
+def build_cases(fx: Fixture, export_dir: Path) -> List[Case]:
+    cases: List[Case] = []
+    created: Dict[str, list] = {"employee": [], "absence": [], "user": []}
+    run_id = int(time.time() * 1000)
+    users = {"n": 0}
+
+    creators = {
+        "employee": lambda i: EmployeeRepository.create(
+            Employee(None, "Замеров", "Тест", None, "Стажёр", "Замеры")),
+        "absence": lambda i: AbsenceRepository.create(
+            Absence(None, fx.employee(i), fx.absence_type, "2099-01-01", "2099-01-05", "Requested")),
+        "user": lambda i: UserAccountRepository.create(
+            UserAccount(None, fx.employee(i), f"bench-{run_id}-{next_user()}", "x", True)),
+    }
+
+    def next_user() -> int:
+        users["n"] += 1
+        return users["n"]
+
+    def create(kind: str, i: int) -> None:
+        created[kind].append(creators[kind](i))
+
+    def pick(kind: str, i: int) -> int:
+        # строка, созданная замером create; если его отфильтровали (--only) — создаём
+        ids = created[kind]
+        if not ids:
+            create(kind, i)
+        return ids[i % len(ids)]
+
+    def case(name: str, number: int = 100):
+        def register(func):
+            cases.append(Case(name, func, number))
+            return func
+        return register
+
+    # ---------- EmployeeRepository ----------
+
+    case("EmployeeRepository.create")(lambda i: create("employee", i))
+
+    case("EmployeeRepository.get_by_id", 1000)(lambda i: EmployeeRepository.get_by_id(fx.employee(i)))
+    case("EmployeeRepository.get_all", 3)(lambda i: EmployeeRepository.get_all())
+    case("EmployeeRepository.get_page", 1000)(
+        lambda i: EmployeeRepository.get_page(50, (fx.employee(i),)))
+    case("EmployeeRepository.iter_all", 3)(lambda i: sum(1 for _ in EmployeeRepository.iter_all()))
+
+    case("EmployeeRepository.update")(lambda i: EmployeeRepository.update(
+        Employee(pick("employee", i), "Замеров", "Тест", str(i), "Стажёр", "Замеры")))
+
+    @case("EmployeeRepository.delete")
+    def _(i):
+        if created["employee"]:
+            EmployeeRepository.delete(created["employee"].pop())
+
+    # ---------- WorkDays / TimeEntries ----------
+
+    bench_employee = fx.employee(0)
+    # новые дни — после последнего дня сотрудника, но не раньше 2100 года,
+    # чтобы не пересекаться с данными datagen и прошлыми запусками
+    next_day = {"date": max(fx.last_workday(bench_employee) + timedelta(days=1), date(2100, 1, 1))}
+
+    @case("WorkDayRepository.create")
+    def _(i):
+        day = next_day["date"]
+        next_day["date"] = day + timedelta(days=1)
+        WorkDayRepository.create(WorkDay(None, bench_employee, day.isoformat(), "09:00", None))
+
+    case("WorkDayRepository.get_for_employee")(lambda i: WorkDayRepository.get_for_employee(fx.employee(i)))
+    case("WorkDayRepository.get_page_for_employee", 1000)(
+        lambda i: WorkDayRepository.get_page_for_employee(fx.employee(i), 50))
+
+    @case("WorkDayRepository.get_or_create_ids", 20)
+    def _(i):
+        keys = [(fx.employee(i * 50 + k), fx.month_end) for k in range(50)]
+        WorkDayRepository.get_or_create_ids(keys)
+
+    @case("TimeEntryRepository.create")
+    def _(i):
+        TimeEntryRepository.create(TimeEntry(None, fx.workday(i), f"{fx.month_end} 12:{i % 60:02d}:00",
+                                             "IN" if i % 2 == 0 else "OUT", "bench"))
+
+    @case("TimeEntryRepository.create_many", 10)
+    def _(i):
+        workday = fx.workday(i)
+        TimeEntryRepository.create_many([
+            TimeEntry(None, workday, f"{fx.month_end} 13:{k % 60:02d}:00",
+                      "IN" if k % 2 == 0 else "OUT", "bench")
+            for k in range(100)
+        ])
+
+    case("TimeEntryRepository.get_for_workday", 1000)(lambda i: TimeEntryRepository.get_for_workday(fx.workday(i)))
+
+    # ---------- Absences ----------
+
+    case("AbsenceRepository.create")(lambda i: create("absence", i))
+
+    case("AbsenceRepository.get_for_employee", 1000)(lambda i: AbsenceRepository.get_for_employee(fx.employee(i)))
+    case("AbsenceRepository.get_page_for_employee", 1000)(
+        lambda i: AbsenceRepository.get_page_for_employee(fx.employee(i), 50))
+
+    case("AbsenceRepository.update_status")(
+        lambda i: AbsenceRepository.update_status(pick("absence", i), "Approved"))
+
+    @case("AbsenceRepository.delete")
+    def _(i):
+        if created["absence"]:
+            AbsenceRepository.delete(created["absence"].pop())
+
+    # ---------- UserAccounts / UserRoles ----------
+
+    case("UserAccountRepository.create")(lambda i: create("user", i))
+
+    case("UserAccountRepository.get_by_id", 1000)(
+        lambda i: UserAccountRepository.get_by_id(fx.user_ids[i % len(fx.user_ids)]))
+    case("UserAccountRepository.get_by_login", 1000)(
+        lambda i: UserAccountRepository.get_by_login(fx.logins[i % len(fx.logins)]))
+    case("UserAccountRepository.get_all", 3)(lambda i: UserAccountRepository.get_all())
+    case("UserAccountRepository.get_page", 1000)(
+        lambda i: UserAccountRepository.get_page(50, (fx.user_ids[i % len(fx.user_ids)],)))
+
+    @case("UserAccountRepository.update")
+    def _(i):
+        uid = pick("user", i)
+        UserAccountRepository.update(UserAccount(uid, fx.employee(i), f"bench-{run_id}-u{uid}", "y", True))
+
+    role_id = fx.role_ids[0] if fx.role_ids else 1
+
+    case("UserRoleRepository.add_role_to_user")(
+        lambda i: UserRoleRepository.add_role_to_user(pick("user", i), role_id))
+
+    case("UserRoleRepository.get_role_ids_for_user", 1000)(
+        lambda i: UserRoleRepository.get_role_ids_for_user(fx.user_ids[i % len(fx.user_ids)]))
+
+    case("UserRoleRepository.remove_role_from_user")(
+        lambda i: UserRoleRepository.remove_role_from_user(pick("user", i), role_id))
+
+    case("UserRoleRepository.delete_all_for_user")(
+        lambda i: UserRoleRepository.delete_all_for_user(pick("user", i)))
+
+    @case("UserAccountRepository.delete")
+    def _(i):
+        if created["user"]:
+            UserAccountRepository.delete(created["user"].pop())
+
+    # ---------- Сервисы ----------
+
+    case("services.mark_time_entry")(
+        lambda i: services.mark_time_entry(fx.employee(i // 2), "IN" if i % 2 == 0 else "OUT", "bench"))
+    case("services.get_personal_report")(lambda i: services.get_personal_report(fx.employee(i)))
+    case("services.generate_timesheet[department, month]", 5)(
+        lambda i: services.generate_timesheet(fx.month_start, fx.month_end, fx.department))
+    case("services.generate_timesheet[all, month]", 1)(
+        lambda i: services.generate_timesheet(fx.month_start, fx.month_end))
+
+    # ---------- Экспорт ----------
+
+    def export_case(formats: Optional[List[str]]):
+        def run(i):
+            names = export.available_formats(formats)
+            writers = [export.FORMATS[name](export_dir / f"data.{name}") for name in names]
+            # писатели печатают «сохранён в ...» — в выводе замеров это лишнее
+            with contextlib.redirect_stdout(io.StringIO()):
+                export.export_stream(export.iter_employees(export.iter_employee_workdays()), writers)
+        return run
+
+    case("export.pipeline[default formats]", 1)(export_case(None))
+    for name in export.FORMATS:
+        case(f"export.pipeline[{name}]", 1)(export_case([name]))
+
+    return cases
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                             text=True, cwd=Path(__file__).parent, timeout=5)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def run(db_name: str, repeat: int = 5, only: Optional[str] = None, seed: int = 1) -> dict:
+    db.configure_pool(db_name=db_name)
+    export.DB_NAME = db_name
+    fx = Fixture(seed)
+
+    results: Dict[str, dict] = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for case in build_cases(fx, Path(tmp)):
+            if only and only not in case.name:
+                continue
+            results[case.name] = _time_case(case, repeat)
+            r = results[case.name]
+            print(f"  {case.name:<50} {r['median_ms']:10.3f} мс  (min {r['min_ms']:.3f})", flush=True)
+
+    return {
+        "meta": {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "git": _git_revision(),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "db": db_name,
+            "rows": fx.rows,
+        },
+        "results": results,
+    }
+
+
+def compare(old: dict, new: dict, threshold: float = 0.2) -> List[str]:
+    """Сравнить медианы; вернуть замеры, замедлившиеся больше чем на threshold."""
+    regressions = []
+    print(f"\n  {'замер':<50} {'было':>10} {'стало':>10} {'изм.':>8}")
+    for name, result in new["results"].items():
+        before = old.get("results", {}).get(name)
+        if before is None:
+            continue
+        change = result["median_ms"] / before["median_ms"] - 1 if before["median_ms"] else 0.0
+        mark = ""
+        if change > threshold:
+            regressions.append(name)
+            mark = "  <-- медленнее"
+        print(f"  {name:<50} {before['median_ms']:10.3f} {result['median_ms']:10.3f} {change:+8.0%}{mark}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Замеры репозиториев, сервисов и экспорта")
+    parser.add_argument("--db", default="bench.db", help="БД, созданная datagen.py")
+    parser.add_argument("--repeat", type=int, default=5, help="повторов каждого замера")
+    parser.add_argument("--only", help="только замеры, в имени которых есть эта строка")
+    parser.add_argument("--out", help="записать результаты в JSON-файл")
+    parser.add_argument("--compare", help="сравнить с результатами из JSON-файла")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="допустимое замедление для --compare (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    if not Path(args.db).exists():
+        parser.error(f"нет файла {args.db!r} — создайте его через datagen.py")
+
+    result = run(args.db, args.repeat, args.only)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"Результаты сохранены в {args.out}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            old = json.load(f)
+        regressions = compare(old, result, args.threshold)
+        if regressions:
+            print(f"Замедлились: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Общие фикстуры тестов: временная база данных со схемой из init_db.
+
+temp_db   — пустая база: схема, индексы и справочники (роль 'Employee',
+            типы отсутствия 'Отпуск' и 'Больничный');
+seeded_db — база с тестовыми данными init_db.insert_test_data;
+make_db   — создать ещё одну базу (для тестов, которым нужны две).
+
+Фикстура направляет пул соединений на временный файл и возвращает путь к нему;
+после теста пул и init_db.DB_NAME возвращаются к прежней базе.
+"""
+
+import os
+
+import pytest
+
+import db
+import init_db
+
+
+def _make_db(directory: str, with_test_data: bool) -> str:
+    path = os.path.join(str(directory), "worktime.db")
+    init_db.DB_NAME = path
+    conn = init_db.create_connection()
+    try:
+        init_db.create_tables(conn)
+        if with_test_data:
+            init_db.insert_test_data(conn)
+        else:
+            conn.execute("INSERT INTO Roles (name) VALUES ('Employee')")
+            conn.execute("INSERT INTO AbsenceType (name) VALUES ('Отпуск'), ('Больничный')")
+            conn.commit()
+    finally:
+        conn.close()
+    db.configure_pool(db_name=path)
+    return path
+
+
+@pytest.fixture
+def _restore_db():
+    old_db_name, old_init_name = db.DB_NAME, init_db.DB_NAME
+    try:
+        yield
+    finally:
+        db.configure_pool(db_name=old_db_name)
+        init_db.DB_NAME = old_init_name
+
+
+@pytest.fixture
+def make_db(tmp_path, _restore_db):
+    count = 0
+
+    def make(with_test_data: bool = False) -> str:
+        nonlocal count
+        count += 1
+        directory = tmp_path / f"db{count}"
+        directory.mkdir()
+        return _make_db(directory, with_test_data)
+
+    return make
+
+
+@pytest.fixture
+def temp_db(make_db):
+    return make_db()
+
+
+@pytest.fixture
+def seeded_db(make_db):
+    return make_db(with_test_data=True)
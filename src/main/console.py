@@ -0,0 +1,82 @@
+# console.py
+"""
+Вывод таблиц в консоль.
+
+print_table печатает строки по мере чтения, не собирая их в список:
+ширина колонок оценивается по первым SAMPLE_ROWS строкам (или задаётся
+явно через widths), более длинные значения обрезаются с «…».
+С page_size строки выводятся страницами с вопросом «дальше?»; ответ «q»
+прекращает вывод, а генератор (например, iter_timesheet) закрывается —
+соединение возвращается в пул, не дочитывая табель.
+"""
+import shutil
+from itertools import chain, islice
+from typing import Any, Callable, Iterable, List, Optional, Sequence
+
+SAMPLE_ROWS = 200         # по скольким первым строкам оценивать ширину колонок
+MAX_COLUMN_WIDTH = 40     # шире — обрезаем
+MORE_PROMPT = "-- Enter — дальше, q — закончить --"
+
+
+def screen_page_size(reserve: int = 4) -> int:
+    """Сколько строк таблицы помещается на экран (за вычетом заголовка и подсказки)."""
+    return max(shutil.get_terminal_size().lines - reserve, 5)
+
+
+def _cell(value: Any) -> str:
+    return "" if value is None else str(value)
+
+
+def _fit(text: str, width: int) -> str:
+    return text if len(text) <= width else text[:width - 1] + "…"
+
+
+def column_widths(headers: Sequence[str],
+                  sample: Iterable[Sequence[Any]],
+                  max_width: int = MAX_COLUMN_WIDTH) -> List[int]:
+    """Ширины колонок по заголовкам и образцу строк (не шире max_width, но не уже заголовка)."""
+    widths = [0] * len(headers)
+    for row in sample:
+        for col, value in enumerate(row[:len(widths)]):
+            widths[col] = max(widths[col], len(_cell(value)))
+    return [max(len(str(h)), min(w, max_width)) for h, w in zip(headers, widths)]
+
+
+def print_table(headers: Sequence[str],
+                rows: Iterable[Sequence[Any]],
+                widths: Optional[Sequence[int]] = None,
+                page_size: Optional[int] = None,
+                sample_size: int = SAMPLE_ROWS,
+                ask: Optional[Callable[[str], str]] = None) -> int:
+    """
+    Напечатать таблицу. rows может быть генератором — строки выводятся по мере чтения.
+    page_size — сколько строк показывать до вопроса «дальше?» (None — без остановок).
+    ask — чем спрашивать «дальше?» (по умолчанию input).
+    Возвращает, сколько строк напечатано.
+    """
+    ask = ask or input
+    it = iter(rows)
+    sample: List[Sequence[Any]] = []
+    if widths is None:
+        sample = list(islice(it, sample_size))
+        widths = column_widths(headers, sample)
+
+    fmt = "  ".join("{:<" + str(w) + "}" for w in widths)
+    print(fmt.format(*(_fit(str(h), w) for h, w in zip(headers, widths))))
+    print("  ".join("-" * w for w in widths))
+
+    printed = 0
+    try:
+        for row in chain(sample, it):
+            if page_size and printed and printed % page_size == 0:
+                if ask(MORE_PROMPT).strip().lower() == "q":
+                    break
+            cells = [_fit(_cell(v), w) for v, w in zip(row, widths)]
+            cells += [""] * (len(widths) - len(cells))
+            print(fmt.format(*cells))
+            printed += 1
+    finally:
+        close = getattr(rows, "close", None)
+        if close is not None:
+            close()
+    return printed
@@ -0,0 +1,75 @@
+# data_versions.py
+"""
+Счётчики изменений данных (таблица DataVersions), по которым кэши процесса
+замечают записи других процессов.
+
+Счётчик увеличивают сами пути записи — одним UPDATE в той же транзакции,
+что и изменение (bump), а не триггером на каждую строку. Запись в обход
+приложения (ручной SQL) счётчик не меняет — после неё нужен сброс кэша.
+
+  ABSENCES — таблица Absences (absence_index);
+  REPORTS  — данные табеля и личного отчёта: Employee, WorkDays,
+             WorkDayState, TimeEntries (report_cache).
+
+PRAGMA data_version не подходит: он не меняется от коммитов того же
+соединения, а соединения берутся из пула.
+"""
+import sqlite3
+from typing import List, Optional
+
+from db import get_connection
+
+ABSENCES = "absences"
+REPORTS = "reports"
+NAMES = (ABSENCES, REPORTS)
+
+
+def schema() -> List[str]:
+    """Таблица счётчиков (init_db.create_tables)."""
+    return [
+        """
+        CREATE TABLE IF NOT EXISTS DataVersions (
+            name    TEXT PRIMARY KEY,
+            version INTEGER NOT NULL
+        );
+        """,
+        "INSERT OR IGNORE INTO DataVersions (name, version) VALUES "
+        + ", ".join(f"('{name}', 0)" for name in NAMES) + ";",
+    ]
+
+
+def _missing(error: sqlite3.OperationalError) -> bool:
+    # БД ещё не обновлена (init_db --upgrade): счётчиков нет
+    return "DataVersions" in str(error)
+
+
+def bump(cur, name: str) -> Optional[int]:
+    """
+    Отметить изменение данных name в текущей транзакции записи.
+    Возвращает новое значение счётчика (None, если DataVersions в БД нет).
+    """
+    try:
+        rows = cur.execute("UPDATE DataVersions SET version = version + 1 WHERE name = ? RETURNING version",
+                           (name,)).fetchall()
+    except sqlite3.OperationalError as e:
+        if _missing(e):
+            return None
+        raise
+    return rows[0][0] if rows else None
+
+
+def read(name: str, conn=None) -> Optional[int]:
+    """Текущее значение счётчика; None, если DataVersions в БД нет."""
+    own = conn is None
+    if own:
+        conn = get_connection()
+    try:
+        row = conn.execute("SELECT version FROM DataVersions WHERE name = ?", (name,)).fetchone()
+    except sqlite3.OperationalError as e:
+        if _missing(e):
+            return None
+        raise
+    finally:
+        if own:
+            conn.close()
+    return row[0] if row is not None else None
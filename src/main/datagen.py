@@ -0,0 +1,219 @@
+# datagen.py
+"""
+Генератор синтетических данных для замеров.
+
+Создаёт новую БД со схемой init_db, демо-данными insert_test_data
+(роли, типы отсутствий, четыре демо-пользователя) и сгенерированными
+сотрудниками: рабочие дни по будням, отметки IN/OUT парами, отсутствия,
+учётные записи. Часы и WorkDayState считаются сразу при генерации
+(по тем же правилам, что hours.py), сводные таблицы — rollups.rebuild.
+
+Пример: 10 000 сотрудников за 2 года
+    python datagen.py --db bench.db --employees 10000 --days 730
+"""
+import argparse
+import os
+import random
+import time
+from datetime import date, timedelta
+
+import data_versions
+import hours
+import init_db
+import rollups
+
+LAST_NAMES = ["Иванов", "Петров", "Сидоров", "Смирнов", "Кузнецов", "Попов", "Васильев",
+              "Соколов", "Михайлов", "Новиков", "Фёдоров", "Морозов", "Волков", "Алексеев"]
+FIRST_NAMES = ["Иван", "Пётр", "Алексей", "Сергей", "Андрей", "Дмитрий", "Михаил", "Олег",
+               "Николай", "Егор", "Артём", "Юрий"]
+MIDDLE_NAMES = ["Иванович", "Петрович", "Сергеевич", "Андреевич", "Олегович", "Николаевич"]
+POSITIONS = ["Разработчик", "Аналитик", "Менеджер", "Инженер", "Бухгалтер", "Специалист"]
+PLANNED_STARTS = ["08:00", "09:00", "10:00"]
+SOURCES = ["терминал", "web", "mobile"]
+
+# сколько строк копить перед executemany
+BATCH_SIZE = 20000
+
+
+def _clock(seconds: int) -> str:
+    return f"{seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+
+def generate(db_name: str,
+             employees: int = 1000,
+             departments: int = 20,
+             days: int = 365,
+             start_date: str = "2024-01-01",
+             punches_per_day: int = 2,
+             absence_rate: float = 0.02,
+             seed: int = 1,
+             with_accounts: bool = True) -> dict:
+    """
+    Пересоздать БД db_name и заполнить её синтетическими данными.
+    absence_rate — вероятность, что в данный рабочий день начинается отсутствие (1–10 дней).
+    Возвращает количество созданных строк по таблицам.
+    """
+    rnd = random.Random(seed)
+    for path in (db_name, db_name + "-wal", db_name + "-shm"):
+        if os.path.exists(path):
+            os.remove(path)
+
+    old_db_name = init_db.DB_NAME
+    init_db.DB_NAME = db_name
+    try:
+        conn = init_db.create_connection()
+    finally:
+        init_db.DB_NAME = old_db_name
+    try:
+        init_db.create_tables(conn)
+        init_db.insert_test_data(conn)
+        # состояние демо-дней — по их отметкам (сгенерированные дни считаются ниже сразу)
+        hours.recompute(conn=conn)
+        cur = conn.cursor()
+        counts = {"Employee": 0, "WorkDays": 0, "TimeEntries": 0, "Absences": 0, "UserAccounts": 0}
+
+        first_employee = cur.execute("SELECT IFNULL(MAX(employee_id), 0) + 1 FROM Employee").fetchone()[0]
+        workday_id = cur.execute("SELECT IFNULL(MAX(workday_id), 0) FROM WorkDays").fetchone()[0]
+        absence_types = [r[0] for r in cur.execute("SELECT absence_type_id FROM AbsenceType")]
+        employee_role = cur.execute("SELECT role_id FROM Roles WHERE name = 'Employee'").fetchone()
+        password_hash = init_db.hash_password("password")
+
+        dept_names = [f"Отдел {i + 1}" for i in range(departments)]
+        start = date.fromisoformat(start_date)
+        calendar = [(start + timedelta(days=i)) for i in range(days)]
+        calendar = [d.isoformat() for d in calendar if d.weekday() < 5]
+
+        employee_rows, account_rows = [], []
+        for i in range(employees):
+            employee_rows.append((
+                first_employee + i, rnd.choice(LAST_NAMES), rnd.choice(FIRST_NAMES),
+                rnd.choice(MIDDLE_NAMES), rnd.choice(POSITIONS), dept_names[i % departments],
+            ))
+            if with_accounts:
+                account_rows.append((first_employee + i, f"user{first_employee + i}", password_hash, 1))
+        cur.executemany("""
+            INSERT INTO Employee (employee_id, last_name, first_name, middle_name, position, department)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, employee_rows)
+        counts["Employee"] = len(employee_rows)
+        if account_rows:
+            cur.executemany("""
+                INSERT INTO UserAccounts (employee_id, login, password_hash, is_active)
+                VALUES (?, ?, ?, ?)
+            """, account_rows)
+            counts["UserAccounts"] = len(account_rows)
+            if employee_role is not None:
+                cur.execute("""
+                    INSERT INTO UserRoles (user_id, role_id)
+                    SELECT user_id, ? FROM UserAccounts WHERE employee_id >= ?
+                """, (employee_role[0], first_employee))
+
+        workdays, states, entries, absences = [], [], [], []
+
+        def flush(force: bool = False):
+            if not force and len(entries) < BATCH_SIZE and len(workdays) < BATCH_SIZE:
+                return
+            cur.executemany("""
+                INSERT INTO WorkDays (workday_id, employee_id, work_date, planned_start, total_hours)
+                VALUES (?, ?, ?, ?, ?)
+            """, workdays)
+            cur.executemany("""
+                INSERT INTO WorkDayState
+                    (workday_id, first_in, last_out, open_since, last_event, worked_seconds, punch_count)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, states)
+            cur.executemany("""
+                INSERT INTO TimeEntries (workday_id, event_time, event_type, source)
+                VALUES (?, ?, ?, ?)
+            """, entries)
+            cur.executemany("""
+                INSERT INTO Absences (employee_id, absence_type_id, date_from, date_to, status)
+                VALUES (?, ?, ?, ?, ?)
+            """, absences)
+            counts["WorkDays"] += len(workdays)
+            counts["TimeEntries"] += len(entries)
+            counts["Absences"] += len(absences)
+            workdays.clear()
+            states.clear()
+            entries.clear()
+            absences.clear()
+
+        pairs = max(punches_per_day // 2, 1)
+        for employee_id, *_ in employee_rows:
+            planned = rnd.choice(PLANNED_STARTS)
+            planned_seconds = int(planned[:2]) * 3600 + int(planned[3:]) * 60
+            source = rnd.choice(SOURCES)
+            absent_until = -1
+            for day_index, day in enumerate(calendar):
+                if day_index <= absent_until:
+                    continue
+                if absence_types and rnd.random() < absence_rate:
+                    absent_until = min(day_index + rnd.randint(0, 9), len(calendar) - 1)
+                    absences.append((employee_id, rnd.choice(absence_types), day,
+                                     calendar[absent_until], rnd.choice(["Approved", "Approved", "Requested"])))
+                    continue
+
+                workday_id += 1
+                # приход около планового начала, затем пары IN/OUT с перерывами;
+                # рабочее время дня (7.5–9.5 ч) делится между парами поровну
+                t = planned_seconds + int(rnd.gauss(0, 600))
+                segment = rnd.randint(450 * 60, 570 * 60) // pairs
+                worked = 0
+                first_in = last_out = open_since = None
+                for n in range(punches_per_day):
+                    stamp = f"{day} {_clock(t)}"
+                    if n % 2 == 0:
+                        entries.append((workday_id, stamp, "IN", source))
+                        open_since = t
+                        if first_in is None:
+                            first_in = stamp
+                        t += segment
+                    else:
+                        entries.append((workday_id, stamp, "OUT", source))
+                        worked += t - open_since
+                        open_since = None
+                        last_out = stamp
+                        t += rnd.randint(15 * 60, 60 * 60)
+                last_event = entries[-1][1] if punches_per_day else None
+                open_stamp = None
+                if open_since is not None:
+                    open_stamp = f"{day} {_clock(open_since)}"
+                workdays.append((workday_id, employee_id, day, planned, round(worked / 3600, 2)))
+                states.append((workday_id, first_in, last_out, open_stamp, last_event,
+                               worked, punches_per_day))
+                flush()
+        flush(force=True)
+        for name in data_versions.NAMES:
+            data_versions.bump(cur, name)
+        conn.commit()
+
+        rollups.rebuild(conn)
+        init_db.analyze(conn)
+    finally:
+        conn.close()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Генератор синтетических данных")
+    parser.add_argument("--db", default="bench.db", help="файл БД (будет пересоздан)")
+    parser.add_argument("--employees", type=int, default=1000)
+    parser.add_argument("--departments", type=int, default=20)
+    parser.add_argument("--days", type=int, default=365, help="календарных дней от --start")
+    parser.add_argument("--start", default="2024-01-01")
+    parser.add_argument("--punches", type=int, default=2, help="отметок в рабочий день")
+    parser.add_argument("--absence-rate", type=float, default=0.02)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--no-accounts", action="store_true", help="не создавать учётные записи")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    counts = generate(args.db, args.employees, args.departments, args.days, args.start,
+                      args.punches, args.absence_rate, args.seed, not args.no_accounts)
+    for table, count in counts.items():
+        print(f"  {table:<13} {count:>10}")
+    print(f"Готово за {time.perf_counter() - started:.1f} с, БД: {args.db!r}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,476 @@
 # db.py
+import atexit
+import contextlib
+import functools
+import queue
+import random
 import sqlite3
+import threading
+import time
+from typing import Callable, Iterator, List, Optional
+
+import tracing
 
 DB_NAME = "worktime.db"
 
+# Профиль конкурентного доступа:
+# в WAL читатели не блокируют писателя, а писатель — читателей;
+# synchronous=NORMAL в WAL не теряет целостность, но не делает fsync на каждый коммит;
+# busy_timeout — сколько SQLite сам ждёт занятую блокировку, прежде чем вернуть ошибку.
+JOURNAL_MODE = "WAL"
+SYNCHRONOUS = "NORMAL"
+BUSY_TIMEOUT_MS = 5000
+# повторы записи после "database is locked": задержка растёт вдвое с каждой попыткой
+WRITE_RETRIES = 5
+WRITE_RETRY_DELAY = 0.05
+
+# Размер пула: сколько физических соединений может быть открыто одновременно
+POOL_SIZE = 5
+# Сколько секунд ждать свободное соединение, если пул исчерпан
+POOL_TIMEOUT = 30.0
+
+
+class PoolExhaustedError(RuntimeError):
+    pass
+
 
-def get_connection():
-    conn = sqlite3.connect(DB_NAME)
-    conn.row_factory = sqlite3.Row       # чтобы удобно читать по именам полей
+class TransactionError(RuntimeError):
+    pass
+
+
+def configure_connection(conn: sqlite3.Connection) -> None:
+    """Применить к соединению профиль конкурентного доступа и внешние ключи."""
+    conn.execute(f"PRAGMA busy_timeout = {int(BUSY_TIMEOUT_MS)};")
+    if JOURNAL_MODE:
+        conn.execute(f"PRAGMA journal_mode = {JOURNAL_MODE};")
+    if SYNCHRONOUS:
+        conn.execute(f"PRAGMA synchronous = {SYNCHRONOUS};")
     conn.execute("PRAGMA foreign_keys = ON;")
-    return conn
+
+
+def _set_synchronous(conn: sqlite3.Connection, level: str) -> None:
+    # без имени схемы PRAGMA synchronous действует только на main,
+    # а отметки могут лежать в подключённых разделах (partitions.py)
+    for row in conn.execute("PRAGMA database_list").fetchall():
+        if row[1] != "temp":
+            conn.execute(f"PRAGMA {row[1]}.synchronous = {level};")
+
+
+def configure_profile(journal_mode: Optional[str] = None,
+                      synchronous: Optional[str] = None,
+                      busy_timeout_ms: Optional[int] = None,
+                      write_retries: Optional[int] = None,
+                      write_retry_delay: Optional[float] = None) -> None:
+    """
+    Поменять профиль конкурентного доступа.
+    Новые настройки действуют для соединений, открытых после вызова,
+    поэтому пул пересоздаётся.
+    """
+    global JOURNAL_MODE, SYNCHRONOUS, BUSY_TIMEOUT_MS, WRITE_RETRIES, WRITE_RETRY_DELAY
+    if journal_mode is not None:
+        JOURNAL_MODE = journal_mode
+    if synchronous is not None:
+        SYNCHRONOUS = synchronous
+    if busy_timeout_ms is not None:
+        BUSY_TIMEOUT_MS = busy_timeout_ms
+    if write_retries is not None:
+        WRITE_RETRIES = write_retries
+    if write_retry_delay is not None:
+        WRITE_RETRY_DELAY = write_retry_delay
+    configure_pool()
+
+
+def is_busy_error(error: BaseException) -> bool:
+    if not isinstance(error, sqlite3.OperationalError):
+        return False
+    message = str(error).lower()
+    return "locked" in message or "busy" in message
+
+
+def retry_on_busy(func):
+    """
+    Повторить запись, если БД занята другим писателем.
+    Повтор делается только для внешнего вызова: если поток уже держит
+    соединение (вложенный вызов внутри чужой транзакции), ошибка пробрасывается.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        delay = WRITE_RETRY_DELAY
+        attempt = 0
+        while True:
+            try:
+                return func(*args, **kwargs)
+            except sqlite3.OperationalError as e:
+                if (not is_busy_error(e)
+                        or attempt >= WRITE_RETRIES
+                        or get_pool().holds_connection()):
+                    raise
+            attempt += 1
+            time.sleep(delay * (1 + random.random()))
+            delay *= 2
+    return wrapper
+
+
+class PooledConnection(sqlite3.Connection):
+    """
+    Соединение из пула.
+    close() не закрывает файл БД, а возвращает соединение в пул,
+    поэтому код вида get_connection() ... conn.close() работает как раньше.
+    Соединение можно взять и блоком with — оно вернётся в пул при любом выходе:
+
+        with get_connection() as conn:
+            ...
+            conn.commit()
+
+    В отличие от sqlite3.Connection, with сам ничего не фиксирует: изменения,
+    не зафиксированные через commit(), откатываются при возврате в пул.
+    """
+
+    _pool: Optional["ConnectionPool"] = None
+    # вложенность transaction() и действия, отложенные до COMMIT
+    _tx_depth = 0
+    _after_commit: Optional[List[Callable[[], None]]] = None
+
+    def commit(self) -> None:
+        # внутри transaction() репозитории не фиксируют изменения сами:
+        # коммит один, в конце единицы работы
+        if not self._tx_depth:
+            super().commit()
+
+    def close(self) -> None:
+        if self._pool is None:
+            super().close()
+        else:
+            self._pool.release(self)
+
+    def __enter__(self) -> "PooledConnection":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        self.close()
+        return False
+
+    def close_physical(self) -> None:
+        super().close()
+
+
+class TracedConnection(PooledConnection):
+    """
+    Соединение пула при включённой трассировке (см. tracing.py):
+    курсоры замеряют запросы, COMMIT замеряется отдельно.
+    Пока трассировка выключена, пул создаёт обычные PooledConnection.
+    """
+
+    def cursor(self, factory=sqlite3.Cursor):
+        # conn.execute() тоже создаёт курсор через этот метод
+        if factory is sqlite3.Cursor:
+            factory = tracing.TracingCursor
+        return super().cursor(factory)
+
+    def commit(self) -> None:
+        if self._tx_depth:
+            return
+        tracing.timed("COMMIT", super().commit)
+
+
+class ConnectionPool:
+    """
+    Пул соединений с SQLite.
+
+    Внутри одного потока соединение переиспользуется: вложенные вызовы
+    get_connection() (сервис -> репозиторий) получают то же самое соединение,
+    а в пул оно возвращается после последнего close().
+    Разные потоки получают разные соединения, поэтому пул можно
+    использовать в многопоточном сервере.
+    """
+
+    def __init__(self, db_name: str, size: int = POOL_SIZE, timeout: float = POOL_TIMEOUT):
+        if size < 1:
+            raise ValueError("size must be >= 1")
+        self.db_name = db_name
+        self.size = size
+        self.timeout = timeout
+        self._idle: "queue.LifoQueue[PooledConnection]" = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._all: set = set()
+        self._closed = False
+
+    def open_detached(self) -> PooledConnection:
+        """
+        Отдельное соединение с теми же настройками, вне пула: close() закрывает
+        его физически. Нужно, чтобы внутри transaction() прочитать только
+        зафиксированные данные — соединение пула этого потока видит и незафиксированные.
+        """
+        conn = sqlite3.connect(self.db_name,
+                               factory=TracedConnection if tracing.ENABLED else PooledConnection,
+                               check_same_thread=False)
+        conn.row_factory = sqlite3.Row       # чтобы удобно читать по именам полей
+        if tracing.ENABLED:
+            conn.set_trace_callback(tracing.trace_statement)
+        configure_connection(conn)
+        return conn
+
+    def _connect(self) -> PooledConnection:
+        conn = self.open_detached()
+        conn._pool = self
+        with self._lock:
+            self._all.add(conn)
+        return conn
+
+    def _discard(self, conn: PooledConnection) -> None:
+        with self._lock:
+            self._all.discard(conn)
+        try:
+            conn.close_physical()
+        except sqlite3.Error:
+            pass
+
+    @staticmethod
+    def _is_healthy(conn: PooledConnection) -> bool:
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def acquire(self) -> PooledConnection:
+        if self._closed:
+            raise PoolExhaustedError("connection pool is closed")
+
+        # соединение уже выдано этому потоку — отдаём его же
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            self._local.depth += 1
+            return conn
+
+        if not self._slots.acquire(timeout=self.timeout):
+            raise PoolExhaustedError(
+                f"no free connection in pool (size={self.size}) after {self.timeout}s"
+            )
+
+        try:
+            conn = None
+            while conn is None:
+                try:
+                    candidate = self._idle.get_nowait()
+                except queue.Empty:
+                    conn = self._connect()
+                    break
+                if self._is_healthy(candidate):
+                    conn = candidate
+                else:
+                    self._discard(candidate)
+        except BaseException:
+            self._slots.release()
+            raise
+
+        self._local.conn = conn
+        self._local.depth = 1
+        return conn
+
+    def holds_connection(self) -> bool:
+        """Держит ли текущий поток соединение из этого пула."""
+        return getattr(self._local, "conn", None) is not None
+
+    def release(self, conn: PooledConnection) -> None:
+        if getattr(self._local, "conn", None) is not conn:
+            # соединение не принадлежит этому потоку (повторный close и т.п.)
+            return
+
+        self._local.depth -= 1
+        if self._local.depth > 0:
+            return
+
+        self._local.conn = None
+        conn._tx_depth = 0
+        conn._after_commit = None
+        try:
+            # незакоммиченные изменения откатываем, как это делал бы close()
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            self._discard(conn)
+        else:
+            if self._closed:
+                self._discard(conn)
+            else:
+                self._idle.put(conn)
+        finally:
+            self._slots.release()
+
+    def close_all(self) -> None:
+        """Закрыть все свободные соединения; занятые закроются при возврате."""
+        self._closed = True
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
+
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+# сбросы кэшей процесса (lookups, report_cache, sessions...) при смене БД
+_reset_callbacks: List[Callable[[], None]] = []
+
+
+def on_db_changed(callback: Callable[[], None]) -> Callable[[], None]:
+    """
+    Зарегистрировать сброс кэша модуля: вызывается, когда пул переключается
+    на другую БД или configure_pool() получает db_name (файл мог быть пересоздан).
+    """
+    _reset_callbacks.append(callback)
+    return callback
+
+
+def _notify_db_changed() -> None:
+    for callback in list(_reset_callbacks):
+        callback()
+
+
+def configure_pool(size: Optional[int] = None,
+                   timeout: Optional[float] = None,
+                   db_name: Optional[str] = None) -> ConnectionPool:
+    """
+    Пересоздать пул с новыми параметрами (старый пул закрывается).
+    С db_name или при смене БД кэши процесса сбрасываются (on_db_changed).
+    """
+    global _pool, POOL_SIZE, POOL_TIMEOUT, DB_NAME
+    with _pool_lock:
+        if size is not None:
+            POOL_SIZE = size
+        if timeout is not None:
+            POOL_TIMEOUT = timeout
+        if db_name is not None:
+            DB_NAME = db_name
+        changed = db_name is not None or (_pool is not None and _pool.db_name != DB_NAME)
+        if _pool is not None:
+            _pool.close_all()
+        _pool = pool = ConnectionPool(DB_NAME, POOL_SIZE, POOL_TIMEOUT)
+    if changed:
+        _notify_db_changed()
+    return pool
+
+
+def get_pool() -> ConnectionPool:
+    global _pool
+    pool = _pool
+    # DB_NAME могли поменять снаружи (например, в тестах) — пересоздаём пул
+    if pool is None or pool.db_name != DB_NAME:
+        changed = False
+        with _pool_lock:
+            if _pool is None or _pool.db_name != DB_NAME:
+                if _pool is not None:
+                    _pool.close_all()
+                    changed = True
+                _pool = ConnectionPool(DB_NAME, POOL_SIZE, POOL_TIMEOUT)
+            pool = _pool
+        if changed:
+            _notify_db_changed()
+    return pool
+
+
+def get_connection() -> PooledConnection:
+    return get_pool().acquire()
+
+
+def _current_connection() -> Optional[PooledConnection]:
+    pool = _pool
+    return getattr(pool._local, "conn", None) if pool is not None else None
+
+
+def in_transaction() -> bool:
+    """Идёт ли в текущем потоке transaction() (данные могут быть ещё не зафиксированы)."""
+    conn = _current_connection()
+    return conn is not None and conn._tx_depth > 0
+
+
+def on_commit(callback: Callable[[], None]) -> None:
+    """
+    Выполнить callback после фиксации изменений: сразу, если transaction()
+    не идёт, иначе — после её COMMIT (при откате callback отбрасывается).
+    Так сбрасываются кэши: другой поток не успеет закэшировать старые данные
+    между сбросом и коммитом.
+    """
+    conn = _current_connection()
+    if conn is not None and conn._tx_depth > 0:
+        conn._after_commit.append(callback)
+    else:
+        callback()
+
+
+@contextlib.contextmanager
+def transaction(immediate: bool = True,
+                synchronous: Optional[str] = None) -> Iterator[PooledConnection]:
+    """
+    Единица работы: все вызовы репозиториев внутри блока идут через одно
+    соединение и фиксируются одним COMMIT в конце (при исключении — откат).
+
+        with transaction():
+            emp = EmployeeRepository.get_by_id(1)
+            EmployeeRepository.update(emp)
+
+    immediate=True сразу берёт блокировку записи (BEGIN IMMEDIATE), чтобы
+    проверки внутри блока (например, уникальность логина) не устарели
+    к моменту записи. Вложенные transaction() присоединяются к внешней.
+    Повтор при занятой БД делает retry_on_busy на внешней функции.
+
+    synchronous — PRAGMA synchronous на время единицы работы, например FULL:
+    в WAL с профильным NORMAL последние коммиты могут пропасть при отключении
+    питания, с FULL коммит сбрасывается на диск. Задаётся для всех подключённых
+    файлов (разделы, подключённые уже внутри транзакции, получают умолчание
+    SQLite — FULL). Действует только у внешней transaction(); после неё
+    восстанавливается значение профиля.
+    """
+    conn = get_connection()
+    outer = conn._tx_depth == 0
+    if outer and conn.in_transaction:
+        # чужие незафиксированные изменения не фиксируем, не откатываем
+        # и не присоединяем к единице работы: это ошибка вызывающего кода
+        conn.close()
+        raise TransactionError("transaction() started with uncommitted changes "
+                               "on this connection; commit or roll them back first")
+    durable = outer and synchronous is not None
+    try:
+        if durable:
+            _set_synchronous(conn, synchronous)
+        if outer:
+            conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+            conn._after_commit = []
+        conn._tx_depth += 1
+        try:
+            yield conn
+        finally:
+            conn._tx_depth -= 1
+        if outer:
+            callbacks, conn._after_commit = conn._after_commit, None
+            conn.commit()
+            for callback in callbacks:
+                callback()
+    except BaseException:
+        if outer:
+            conn._after_commit = None
+            if conn.in_transaction:
+                conn.rollback()
+        raise
+    finally:
+        try:
+            if durable:
+                _set_synchronous(conn, SYNCHRONOUS or "FULL")
+        finally:
+            conn.close()
+
+
+def close_pool() -> None:
+    """Закрыть пул (вызывается автоматически при завершении программы)."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close_all()
+            _pool = None
+
+
+atexit.register(close_pool)
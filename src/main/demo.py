@@ -1,6 +1,5 @@
 # demo.py
-from typing import Iterable, Sequence, Any
-
+from console import print_table
 from repositories import (
     EmployeeRepository,
     WorkDayRepository,
@@ -16,35 +15,6 @@ from services import (
 )
 
 
-def print_table(headers: Sequence[str], rows: Iterable[Sequence[Any]]) -> None:
-    rows = list(rows)
-    # приводим всё к строкам
-    str_rows = [[str(x) for x in row] for row in rows]
-    str_headers = [str(h) for h in headers]
-
-    # ширина колонок = максимум из заголовка и всех значений
-    col_widths = []
-    num_cols = len(headers)
-    for col in range(num_cols):
-        max_len = len(str_headers[col])
-        for row in str_rows:
-            if col < len(row):
-                max_len = max(max_len, len(row[col]))
-        col_widths.append(max_len)
-
-    # формируем форматную строку
-    fmt = "  ".join("{:<" + str(w) + "}" for w in col_widths)
-
-    # печать заголовка
-    print(fmt.format(*str_headers))
-    # разделитель
-    print("  ".join("-" * w for w in col_widths))
-
-    # печать строк
-    for row in str_rows:
-        print(fmt.format(*row))
-
-
 def section(title: str) -> None:
     print()
     print("=" * (len(title) + 4))
@@ -55,16 +25,16 @@ def section(title: str) -> None:
 def main():
     # Все сотрудники
     section("Все сотрудники")
-    employees = EmployeeRepository.get_all()
-    emp_rows = [
+    # постранично: список сотрудников не собирается в память целиком
+    emp_rows = (
         (
             e.employee_id,
             f"{e.last_name} {e.first_name} {e.middle_name or ''}".strip(),
             e.position or "",
             e.department or "",
         )
-        for e in employees
-    ]
+        for e in EmployeeRepository.iter_all()
+    )
     print_table(
         ["ID", "ФИО", "Должность", "Отдел"],
         emp_rows,
@@ -0,0 +1,136 @@
+# employee_search.py
+"""
+Полнотекстовый поиск сотрудников (FTS5) по фамилии, имени, отчеству,
+должности и отделу.
+
+Индекс EmployeeSearch (rowid = employee_id) ведут триггеры на Employee,
+поэтому он совпадает с таблицей после любых create/update/delete — в том
+числе сделанных в обход EmployeeRepository. Токенизатор unicode61 приводит
+кириллицу к нижнему регистру, но «ё» и «е» различает — их сводит normalize()
+и такое же выражение в триггерах. Индексы префиксов (prefix) делают
+поиск по началу слова быстрым и на коротких префиксах.
+
+Запрос «иван пет» ищет сотрудников, у которых есть слова, начинающиеся
+на «иван» и на «пет»: сначала только в ФИО, затем, если найдено меньше
+лимита, — во всех колонках. Совпадения не ранжируются (bm25 пришлось бы
+считать для всех найденных, а у частого префикса их десятки тысяч):
+берутся первые limit по индексу и сортируются по ФИО.
+
+Если SQLite собран без FTS5 (таблицы EmployeeSearch нет), поиск идёт
+перебором Employee с тем же смыслом запроса: like_condition() строит
+условие LIKE по нормализованным словам колонок (функция search_words,
+регистрируется на соединении). Это медленнее, но меню поиска работают.
+"""
+import re
+import sqlite3
+from typing import List, Optional, Sequence, Tuple
+
+COLUMNS = ("last_name", "first_name", "middle_name", "position", "department")
+NAME_COLUMNS = COLUMNS[:3]
+SEARCH_LIMIT = 20
+
+_WORD = re.compile(r"\w+")
+
+
+def _sql_normalize(expr: str) -> str:
+    return f"replace(replace(IFNULL({expr}, ''), 'ё', 'е'), 'Ё', 'Е')"
+
+
+def _indexed_values(alias: str) -> str:
+    return ", ".join(_sql_normalize(f"{alias}.{c}") for c in COLUMNS)
+
+
+def schema() -> List[str]:
+    """Таблица FTS5 и триггеры синхронизации (init_db.create_tables)."""
+    cols = ", ".join(COLUMNS)
+    return [
+        f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS EmployeeSearch USING fts5(
+            {cols},
+            tokenize = 'unicode61',
+            prefix = '2 3'
+        );
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_employee_insert_search
+        AFTER INSERT ON Employee
+        BEGIN
+            INSERT INTO EmployeeSearch (rowid, {cols}) VALUES (new.employee_id, {_indexed_values("new")});
+        END;
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_employee_update_search
+        AFTER UPDATE ON Employee
+        BEGIN
+            DELETE FROM EmployeeSearch WHERE rowid = old.employee_id;
+            INSERT INTO EmployeeSearch (rowid, {cols}) VALUES (new.employee_id, {_indexed_values("new")});
+        END;
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_employee_delete_search
+        AFTER DELETE ON Employee
+        BEGIN
+            DELETE FROM EmployeeSearch WHERE rowid = old.employee_id;
+        END;
+        """,
+    ]
+
+
+def sync(conn) -> int:
+    """Добавить в индекс сотрудников, которых в нём нет (после создания индекса на старой БД)."""
+    cols = ", ".join(COLUMNS)
+    cur = conn.execute(f"""
+        INSERT INTO EmployeeSearch (rowid, {cols})
+        SELECT e.employee_id, {_indexed_values("e")}
+        FROM Employee e
+        WHERE NOT EXISTS (SELECT 1 FROM EmployeeSearch s WHERE s.rowid = e.employee_id)
+    """)
+    return cur.rowcount
+
+
+def normalize(text: str) -> str:
+    return text.lower().replace("ё", "е")
+
+
+def match_query(text: str) -> Optional[str]:
+    """
+    Запрос MATCH из пользовательского ввода: каждое слово — префикс,
+    слова соединяются по И. None, если слов нет.
+    """
+    words = _WORD.findall(normalize(text))
+    if not words:
+        return None
+    # слова в кавычках: ввод не разбирается как синтаксис FTS5 (AND, NEAR, «-»)
+    return " ".join(f'"{w}"*' for w in words)
+
+
+def name_query(query: str) -> str:
+    """Тот же запрос MATCH, но только по колонкам ФИО."""
+    return f"{{{' '.join(NAME_COLUMNS)}}} : ({query})"
+
+
+# ====== Без FTS5 ======
+
+def unavailable(error: sqlite3.OperationalError) -> bool:
+    """Ошибка означает, что индекса нет (не создан или нет модуля fts5)."""
+    message = str(error)
+    return "EmployeeSearch" in message or "fts5" in message
+
+
+def _search_words(*values) -> str:
+    # ' иванов иван петрович': каждое слово — после пробела, для LIKE '% слово%'
+    return " " + " ".join(_WORD.findall(normalize(" ".join(v for v in values if v))))
+
+
+def like_condition(conn, text: str, columns: Sequence[str] = COLUMNS) -> Tuple[str, List[str]]:
+    """
+    Условие WHERE и параметры для поиска без FTS5: каждое слово запроса —
+    начало какого-нибудь слова в columns. Вызывается для непустого запроса
+    (match_query() не None).
+    """
+    conn.create_function("search_words", -1, _search_words, deterministic=True)
+    expr = f"search_words({', '.join(columns)})"
+    words = _WORD.findall(normalize(text))
+    # «_» — тоже \w, а в LIKE это шаблон
+    patterns = ["% " + w.replace("_", "\\_") + "%" for w in words]
+    return " AND ".join(f"{expr} LIKE ? ESCAPE '\\'" for _ in words), patterns
@@ -1,8 +1,19 @@
+import argparse
 import sqlite3
 import json
 import csv
+import multiprocessing
+import queue
+import shutil
+import threading
+import time
 import xml.etree.ElementTree as ET
+from array import array
+from datetime import date
 from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, Optional
+
+from db import configure_connection
 
 # Попробуем подключить PyYAML для YAML
 try:
@@ -11,6 +22,12 @@ except ImportError:
     yaml = None
     print("Внимание: модуль PyYAML не установлен, файл data.yaml создан не будет.")
 
+# NumPy нужен только для колоночного снимка
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 DB_NAME = "worktime.db"          # наша БД из лабораторной
 OUT_DIR = Path("out")            # папка для вывода
 
@@ -18,19 +35,25 @@ JSON_PATH = OUT_DIR / "data.json"
 CSV_PATH = OUT_DIR / "data.csv"
 XML_PATH = OUT_DIR / "data.xml"
 YAML_PATH = OUT_DIR / "data.yaml"
+COLUMNAR_DIR = OUT_DIR / "workdays.columnar"
+
+# сколько строк читать из курсора за один раз
+FETCH_SIZE = 1000
 
 
 def get_connection() -> sqlite3.Connection:
     conn = sqlite3.connect(DB_NAME)
     conn.row_factory = sqlite3.Row
+    configure_connection(conn)
     return conn
 
 
-def fetch_employee_workdays() -> list[sqlite3.Row]:
+def iter_employee_workdays(fetch_size: int = FETCH_SIZE) -> Iterator[sqlite3.Row]:
     """
-    Достаём Employee + WorkDays.
+    Достаём Employee + WorkDays построчно.
     Все поля WorkDays идут с префиксом workday_, чтобы затем
     построить вложенный объект workdays.
+    Строки одного сотрудника идут подряд (ORDER BY employee_id).
     """
     sql = """
         SELECT
@@ -49,82 +72,158 @@ def fetch_employee_workdays() -> list[sqlite3.Row]:
         ORDER BY e.employee_id, w.work_date
     """
     conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(sql)
-    rows = cur.fetchall()
-    conn.close()
-    return rows
+    try:
+        cur = conn.cursor()
+        cur.execute(sql)
+        while True:
+            rows = cur.fetchmany(fetch_size)
+            if not rows:
+                break
+            yield from rows
+    finally:
+        conn.close()
+
 
+def fetch_employee_workdays() -> list[sqlite3.Row]:
+    """Все строки Employee + WorkDays одним списком (для небольших БД)."""
+    return list(iter_employee_workdays())
+
+
+def split_row(row: sqlite3.Row) -> tuple[dict, dict]:
+    """Разделить плоскую строку на поля сотрудника и поля рабочего дня."""
+    emp_data: dict = {}
+    workday_data: dict = {}
+
+    for key, value in dict(row).items():
+        if key == "workday_id":
+            workday_data["id"] = value
+        elif key.startswith("workday_"):
+            # поле рабочего дня
+            workday_data[key[len("workday_"):]] = value
+        else:
+            # поле сотрудника
+            emp_data[key] = value
 
-def build_nested_structure(rows: list[sqlite3.Row]) -> list[dict]:
+    return emp_data, workday_data
+
+
+def iter_employees(rows: Iterable[sqlite3.Row]) -> Iterator[dict]:
     """
-    Из плоских строк (employee + workday) делаем список сотрудников
-    с вложенным списком workdays.
+    Из плоских строк (employee + workday) делаем сотрудников
+    с вложенным списком workdays. Сотрудник отдаётся, как только
+    закончились его строки, поэтому в памяти всегда один сотрудник.
     """
-    employees: dict[int, dict] = {}
+    current: Optional[dict] = None
 
     for row in rows:
-        row_dict = dict(row)
-        emp_id = row_dict["employee_id"]
-
-        emp_data: dict = {}
-        workday_data: dict = {}
-
-        for key, value in row_dict.items():
-            if key.startswith("workday_") or key == "workday_id":
-                # поле рабочего дня
-                if key == "workday_id":
-                    wd_key = "id"
-                elif key.startswith("workday_"):
-                    wd_key = key[len("workday_"):]
-                else:
-                    wd_key = key
-                workday_data[wd_key] = value
-            else:
-                # поле сотрудника
-                emp_data[key] = value
-
-        # создаём сотрудника, если его ещё нет
-        if emp_id not in employees:
-            employees[emp_id] = emp_data
-            employees[emp_id]["workdays"] = []
+        emp_data, workday_data = split_row(row)
+
+        if current is None or current["employee_id"] != emp_data["employee_id"]:
+            if current is not None:
+                yield current
+            current = emp_data
+            current["workdays"] = []
 
         # если есть реальный рабочий день (не все поля None)
         if any(v is not None for v in workday_data.values()):
-            employees[emp_id]["workdays"].append(workday_data)
+            current["workdays"].append(workday_data)
 
-    return list(employees.values())
+    if current is not None:
+        yield current
+
+
+def build_nested_structure(rows: Iterable[sqlite3.Row]) -> list[dict]:
+    """Список сотрудников с вложенными workdays целиком (для небольших БД)."""
+    return list(iter_employees(rows))
 
 
 def ensure_out_dir():
     OUT_DIR.mkdir(exist_ok=True)
 
 
-def export_json(data: list[dict]):
-    with JSON_PATH.open("w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=4)
-    print(f"JSON сохранён в {JSON_PATH}")
+# ====== Потоковые писатели: begin() -> write(employee)... -> end() ======
 
+# имя формата -> класс писателя; новые форматы подключаются через @register_format
+FORMATS: Dict[str, Callable] = {}
+# форматы, которые выгружаются без --formats
+DEFAULT_FORMATS: list[str] = []
 
-def export_csv(rows: list[sqlite3.Row]):
+
+def register_format(name: str, default: bool = True):
+    """
+    Зарегистрировать писатель формата (класс с begin/write/end и атрибутом available).
+    default=False — формат выгружается только по явному запросу (--formats).
+    """
+    def decorator(writer_cls):
+        FORMATS[name] = writer_cls
+        if default:
+            DEFAULT_FORMATS.append(name)
+        return writer_cls
+    return decorator
+
+
+@register_format("json")
+class JsonWriter:
+    """JSON-массив, который пишется по одному сотруднику."""
+
+    available = True
+
+    def __init__(self, path: Path = JSON_PATH):
+        self.path = path
+        self._f = None
+        self._count = 0
+
+    def begin(self):
+        self._f = self.path.open("w", encoding="utf-8")
+        self._f.write("[")
+
+    def write(self, emp: dict):
+        text = json.dumps(emp, ensure_ascii=False, indent=4)
+        # тот же вид, что у json.dump(list, indent=4): элемент сдвинут на 4 пробела
+        self._f.write(",\n" if self._count else "\n")
+        self._f.write("\n".join("    " + line for line in text.split("\n")))
+        self._count += 1
+
+    def end(self):
+        self._f.write("\n]" if self._count else "]")
+        self._f.close()
+        print(f"JSON сохранён в {self.path}")
+
+
+@register_format("csv")
+class CsvWriter:
     """
     Для CSV оставляем плоскую структуру — каждая строка это employee + workday.
     Кодировка utf-8-sig, чтобы Excel нормально открыл русский.
     И ДЕЛАЕМ workday_total_hours ТЕКСТОМ с апострофом,
     чтобы Excel не превращал 8.0 в дату 07.май.
     """
-    if not rows:
-        print("Нет данных для CSV.")
-        return
-
-    fieldnames = rows[0].keys()
-
-    with CSV_PATH.open("w", encoding="utf-8-sig", newline="") as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames, delimiter=";")
-        writer.writeheader()
 
-        for row in rows:
-            row_dict = dict(row)
+    FIELDNAMES = [
+        "employee_id", "last_name", "first_name", "middle_name", "position", "department",
+        "workday_id", "workday_date", "workday_planned_start", "workday_total_hours",
+    ]
+
+    available = True
+
+    def __init__(self, path: Path = CSV_PATH):
+        self.path = path
+        self._f = None
+        self._writer = None
+        self._count = 0
+
+    def begin(self):
+        self._f = self.path.open("w", encoding="utf-8-sig", newline="")
+        self._writer = csv.DictWriter(self._f, fieldnames=self.FIELDNAMES, delimiter=";")
+        self._writer.writeheader()
+
+    def write(self, emp: dict):
+        emp_data = {k: v for k, v in emp.items() if k != "workdays"}
+        # сотрудник без рабочих дней — одна строка с пустыми полями дня (как LEFT JOIN)
+        for wd in emp["workdays"] or [{}]:
+            row_dict = dict(emp_data)
+            for k, v in wd.items():
+                row_dict["workday_id" if k == "id" else "workday_" + k] = v
 
             # Превращаем workday_total_hours в текст, чтобы Excel не трогал
             if row_dict.get("workday_total_hours") is not None:
@@ -133,16 +232,35 @@ def export_csv(rows: list[sqlite3.Row]):
                     f"'{row_dict['workday_total_hours']}"
                 )
 
-            writer.writerow(row_dict)
+            self._writer.writerow(row_dict)
+            self._count += 1
+
+    def end(self):
+        self._f.close()
+        if not self._count:
+            self.path.unlink()
+            print("Нет данных для CSV.")
+            return
+        print(f"CSV сохранён в {self.path}")
+
 
-    print(f"CSV сохранён в {CSV_PATH}")
+@register_format("xml")
+class XmlWriter:
+    """XML: каждый <employee> строится и сериализуется отдельно."""
 
+    available = True
 
-def export_xml(data: list[dict]):
-    root = ET.Element("employees")
+    def __init__(self, path: Path = XML_PATH):
+        self.path = path
+        self._f = None
+        self._count = 0
 
-    for emp in data:
-        emp_elem = ET.SubElement(root, "employee")
+    def begin(self):
+        self._f = self.path.open("w", encoding="utf-8")
+        self._f.write("<?xml version='1.0' encoding='utf-8'?>\n")
+
+    def write(self, emp: dict):
+        emp_elem = ET.Element("employee")
 
         # поля сотрудника (кроме workdays)
         for key, value in emp.items():
@@ -159,29 +277,442 @@ def export_xml(data: list[dict]):
                 c = ET.SubElement(wd_elem, k)
                 c.text = "" if v is None else str(v)
 
-    tree = ET.ElementTree(root)
-    tree.write(XML_PATH, encoding="utf-8", xml_declaration=True)
-    print(f"XML сохранён в {XML_PATH}")
+        if not self._count:
+            self._f.write("<employees>")
+        self._f.write(ET.tostring(emp_elem, encoding="unicode"))
+        self._count += 1
+
+    def end(self):
+        self._f.write("</employees>" if self._count else "<employees />")
+        self._f.close()
+        print(f"XML сохранён в {self.path}")
+
+
+@register_format("yaml")
+class YamlWriter:
+    """YAML-список: каждый сотрудник дописывается отдельным элементом."""
+
+    available = yaml is not None
+
+    def __init__(self, path: Path = YAML_PATH):
+        self.path = path
+        self._f = None
+        self._count = 0
 
+    def begin(self):
+        self._f = self.path.open("w", encoding="utf-8")
 
-def export_yaml(data: list[dict]):
+    def write(self, emp: dict):
+        yaml.safe_dump([emp], self._f, allow_unicode=True, sort_keys=False)
+        self._count += 1
+
+    def end(self):
+        if not self._count:
+            yaml.safe_dump([], self._f)
+        self._f.close()
+        print(f"YAML сохранён в {self.path}")
+
+
+@register_format("columnar", default=False)
+class ColumnarWriter:
+    """
+    Колоночный снимок рабочих дней для аналитики: каталог, где каждая колонка
+    лежит в своём .npy-файле, а meta.json описывает колонки и словари.
+    Отдел, ФИО и должность хранятся кодами словаря (-1 — пусто),
+    даты — числом дней от 1970-01-01, плановое начало — минутами от полуночи.
+    Одна строка — один рабочий день; сотрудники без рабочих дней не попадают.
+    Колонки копятся в памяти не больше CHUNK_ROWS строк, затем дописываются на диск.
+    """
+
+    FORMAT = "worktime-columnar"
+    VERSION = 1
+    # колонка -> (код типа для array, dtype NumPy)
+    COLUMNS = {
+        "employee_id": ("i", "int32"),
+        "name": ("i", "int32"),
+        "position": ("i", "int32"),
+        "department": ("i", "int32"),
+        "workday_id": ("q", "int64"),
+        "work_date": ("i", "int32"),
+        "planned_start": ("h", "int16"),
+        # часы — как в БД (REAL): float32 теряет точность на суммах
+        "total_hours": ("d", "float64"),
+    }
+    DICTIONARY_COLUMNS = ("name", "position", "department")
+    EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+    CHUNK_ROWS = 65536
+
+    available = np is not None
+
+    def __init__(self, path: Path = COLUMNAR_DIR):
+        self.path = path
+        self._columns: Dict[str, array] = {}
+        self._parts: Dict[str, object] = {}
+        self._codes: Dict[str, Dict[str, int]] = {}
+        self._rows = 0
+
+    def _part_path(self, name: str) -> Path:
+        return self.path / f"{name}.npy.part"
+
+    def begin(self):
+        self.path.mkdir(parents=True, exist_ok=True)
+        # снимок без meta.json считается недописанным — прежний больше не действителен
+        (self.path / "meta.json").unlink(missing_ok=True)
+        # пока идёт выгрузка, значения копятся в компактных array, а не в списках;
+        # каждые CHUNK_ROWS строк они сбрасываются в файлы колонок без заголовка
+        self._columns = {name: array(code) for name, (code, _) in self.COLUMNS.items()}
+        self._parts = {name: self._part_path(name).open("wb") for name in self.COLUMNS}
+        self._codes = {name: {} for name in self.DICTIONARY_COLUMNS}
+        self._rows = 0
+
+    def _encode(self, column: str, value: Optional[str]) -> int:
+        if value is None:
+            return -1
+        codes = self._codes[column]
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(codes)
+        return code
+
+    def _flush(self):
+        for name, (code, _) in self.COLUMNS.items():
+            self._columns[name].tofile(self._parts[name])
+            self._columns[name] = array(code)
+
+    def write(self, emp: dict):
+        if not emp["workdays"]:
+            return
+        name = " ".join(p for p in (emp["last_name"], emp["first_name"], emp["middle_name"]) if p)
+        name_code = self._encode("name", name or None)
+        position_code = self._encode("position", emp["position"])
+        department_code = self._encode("department", emp["department"])
+        cols = self._columns
+        for wd in emp["workdays"]:
+            cols["employee_id"].append(emp["employee_id"])
+            cols["name"].append(name_code)
+            cols["position"].append(position_code)
+            cols["department"].append(department_code)
+            cols["workday_id"].append(wd["id"])
+            cols["work_date"].append(date.fromisoformat(wd["date"]).toordinal() - self.EPOCH_ORDINAL)
+            planned = wd["planned_start"]
+            cols["planned_start"].append(
+                int(planned[:2]) * 60 + int(planned[3:5]) if planned else -1
+            )
+            hours = wd["total_hours"]
+            cols["total_hours"].append(float("nan") if hours is None else hours)
+        self._rows += len(emp["workdays"])
+        if len(cols["workday_id"]) >= self.CHUNK_ROWS:
+            self._flush()
+
+    def end(self):
+        self._flush()
+        for part in self._parts.values():
+            part.close()
+        # число строк известно только теперь: заголовок .npy, затем данные колонки
+        for name, (_, dtype) in self.COLUMNS.items():
+            header = {
+                "descr": np.lib.format.dtype_to_descr(np.dtype(dtype)),
+                "fortran_order": False,
+                "shape": (self._rows,),
+            }
+            with (self.path / f"{name}.npy").open("wb") as out, self._part_path(name).open("rb") as part:
+                np.lib.format.write_array_header_1_0(out, header)
+                shutil.copyfileobj(part, out)
+            self._part_path(name).unlink()
+        meta = {
+            "format": self.FORMAT,
+            "version": self.VERSION,
+            "rows": self._rows,
+            "columns": {name: dtype for name, (_, dtype) in self.COLUMNS.items()},
+            "dictionaries": {name: list(codes) for name, codes in self._codes.items()},
+            "date_epoch": "1970-01-01",
+            "null_code": -1,
+        }
+        # meta.json пишем последним: снимок без него считается недописанным
+        with (self.path / "meta.json").open("w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+        self._columns = {}
+        self._parts = {}
+        print(f"Колоночный снимок сохранён в {self.path}")
+
+
+class ColumnarSnapshot:
+    """
+    Загруженный колоночный снимок.
+    columns — массивы NumPy (при mmap=True — отображённые в память, только чтение),
+    dictionaries — значения для закодированных колонок.
+    """
+
+    def __init__(self, columns: Dict[str, "np.ndarray"], meta: dict):
+        self.columns = columns
+        self.meta = meta
+        self.dictionaries: Dict[str, list] = meta["dictionaries"]
+
+    def __len__(self) -> int:
+        return self.meta["rows"]
+
+    def __getitem__(self, name: str) -> "np.ndarray":
+        return self.columns[name]
+
+    def dates(self) -> "np.ndarray":
+        """work_date как datetime64[D]."""
+        return self.columns["work_date"].astype("datetime64[D]")
+
+    def decode(self, column: str) -> "np.ndarray":
+        """Раскодировать словарную колонку в массив строк (None для пустых)."""
+        values = np.array(self.dictionaries[column] + [None], dtype=object)
+        return values[self.columns[column]]      # код -1 попадает на None в конце
+
+    def code_of(self, column: str, value: str) -> int:
+        """Код значения в словаре (-1, если такого значения нет) — для фильтров без decode."""
+        try:
+            return self.dictionaries[column].index(value)
+        except ValueError:
+            return -1
+
+
+def load_columnar(path: Path = COLUMNAR_DIR, mmap: bool = True) -> ColumnarSnapshot:
+    """Загрузить колоночный снимок; при mmap=True колонки читаются с диска по мере обращения."""
+    if np is None:
+        raise RuntimeError("Для колоночного снимка нужен NumPy")
+    path = Path(path)
+    with (path / "meta.json").open(encoding="utf-8") as f:
+        meta = json.load(f)
+    if meta.get("format") != ColumnarWriter.FORMAT:
+        raise ValueError(f"{path} не является колоночным снимком")
+    if meta.get("version") != ColumnarWriter.VERSION:
+        raise ValueError(f"Неподдерживаемая версия снимка: {meta.get('version')}")
+    mode = "r" if mmap else None
+    columns = {
+        name: np.load(path / f"{name}.npy", mmap_mode=mode, allow_pickle=False)
+        for name in meta["columns"]
+    }
+    return ColumnarSnapshot(columns, meta)
+
+
+def available_formats(formats: Optional[Iterable[str]] = None) -> list[str]:
+    """Имена форматов, которые можно выгрузить (по умолчанию — DEFAULT_FORMATS)."""
+    names = list(DEFAULT_FORMATS) if formats is None else list(formats)
+    result = []
+    for name in names:
+        if name not in FORMATS:
+            raise ValueError(f"Неизвестный формат {name!r}. Доступны: {', '.join(FORMATS)}")
+        if not FORMATS[name].available:
+            print(f"Формат {name} недоступен (не установлена библиотека), пропускаем.")
+            continue
+        result.append(name)
+    return result
+
+
+def make_writers(formats: Optional[Iterable[str]] = None) -> list:
+    return [FORMATS[name]() for name in available_formats(formats)]
+
+
+def export_stream(employees: Iterable[dict], writers: list) -> int:
+    """Прогнать сотрудников через все писатели за один проход. Возвращает число сотрудников."""
+    count = 0
+    for w in writers:
+        w.begin()
+    for emp in employees:
+        for w in writers:
+            w.write(emp)
+        count += 1
+    for w in writers:
+        w.end()
+    return count
+
+
+def export_json(data: Iterable[dict]):
+    export_stream(data, [JsonWriter()])
+
+
+def export_csv(data: Iterable[dict]):
+    export_stream(data, [CsvWriter()])
+
+
+def export_xml(data: Iterable[dict]):
+    export_stream(data, [XmlWriter()])
+
+
+def export_yaml(data: Iterable[dict]):
     if yaml is None:
         print("PyYAML не установлен, YAML не будет создан.")
         return
-    with YAML_PATH.open("w", encoding="utf-8") as f:
-        yaml.safe_dump(data, f, allow_unicode=True, sort_keys=False)
-    print(f"YAML сохранён в {YAML_PATH}")
+    export_stream(data, [YamlWriter()])
+
+
+# ====== Параллельная выгрузка ======
+
+# сколько сотрудников передавать писателю за раз и сколько пачек держать в очереди
+PARALLEL_BATCH = 200
+PARALLEL_QUEUE = 8
+# как часто, ожидая очередь, проверять, что рабочие живы, секунд
+WORKER_POLL = 0.5
+
+
+def _run_writer(name: str, batches, results) -> None:
+    """Рабочий: читает пачки сотрудников из очереди и пишет их в свой формат."""
+    busy = 0.0
+    error = None
+    writer = None
+    try:
+        writer = FORMATS[name]()
+        started = time.perf_counter()
+        writer.begin()
+        busy += time.perf_counter() - started
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+
+    while True:
+        batch = batches.get()
+        if batch is None:
+            break
+        if error is not None:
+            continue          # дочитываем очередь, чтобы не остановить раздачу
+        started = time.perf_counter()
+        try:
+            for emp in batch:
+                writer.write(emp)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        busy += time.perf_counter() - started
+
+    if error is None:
+        started = time.perf_counter()
+        try:
+            writer.end()
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        busy += time.perf_counter() - started
+
+    results.put((name, busy, error))
+
+
+def _worker_died(name: str, worker) -> RuntimeError:
+    exitcode = getattr(worker, "exitcode", None)
+    detail = f" (код завершения {exitcode})" if exitcode is not None else ""
+    return RuntimeError(f"Рабочий формата {name} завершился, не закончив выгрузку{detail}")
+
+
+def _put(q, item, name: str, worker) -> None:
+    """Положить пачку в очередь рабочего; если рабочий умер, очередь не освободится — ошибка."""
+    while True:
+        try:
+            q.put(item, timeout=WORKER_POLL)
+            return
+        except queue.Full:
+            if not worker.is_alive():
+                raise _worker_died(name, worker) from None
+
+
+def _collect(results, workers: Dict[str, object]) -> list:
+    """Дождаться итога (name, busy, error) от каждого рабочего."""
+    pending = dict(workers)
+    collected = []
+    suspects = set()
+    while pending:
+        try:
+            item = results.get(timeout=WORKER_POLL)
+        except queue.Empty:
+            for name, worker in pending.items():
+                if worker.is_alive():
+                    continue
+                # итог мог ещё идти по каналу — даём рабочему ещё один интервал
+                if name in suspects:
+                    raise _worker_died(name, worker)
+                suspects.add(name)
+            continue
+        pending.pop(item[0], None)
+        collected.append(item)
+    return collected
+
+
+def export_parallel(formats: Optional[Iterable[str]] = None,
+                    mode: str = "process",
+                    batch_size: int = PARALLEL_BATCH,
+                    queue_size: int = PARALLEL_QUEUE) -> Dict[str, float]:
+    """
+    Выгрузить все форматы параллельно: данные читаются из БД один раз,
+    а пачки сотрудников раздаются рабочим — по одному на формат.
+    mode="process" — отдельные процессы (сериализация YAML/XML идёт
+    на разных ядрах), mode="thread" — потоки одного процесса.
+    Возвращает время работы каждого формата (без ожидания данных)
+    и общее время под ключом "total".
+    """
+    names = available_formats(formats)
+    if mode == "process":
+        make_queue, make_worker = multiprocessing.Queue, multiprocessing.Process
+    elif mode == "thread":
+        make_queue, make_worker = queue.Queue, threading.Thread
+    else:
+        raise ValueError("mode должен быть 'process' или 'thread'")
+
+    started = time.perf_counter()
+    results = make_queue()
+    queues = {name: make_queue(queue_size) for name in names}
+    workers = {
+        name: make_worker(target=_run_writer, args=(name, queues[name], results), daemon=True)
+        for name in names
+    }
+    for w in workers.values():
+        w.start()
+
+    # очереди ограничены, поэтому без проверки живости рабочих упавший процесс
+    # (например, убитый по памяти) подвесил бы и раздачу, и ожидание итогов
+    def send(batch) -> None:
+        for name, q in queues.items():
+            _put(q, batch, name, workers[name])
+
+    try:
+        batch = []
+        for emp in iter_employees(iter_employee_workdays()):
+            batch.append(emp)
+            if len(batch) >= batch_size:
+                send(batch)
+                batch = []
+        if batch:
+            send(batch)
+    finally:
+        for name, q in queues.items():
+            try:
+                _put(q, None, name, workers[name])
+            except RuntimeError:
+                pass          # о погибшем рабочем сообщит send() или _collect()
+
+    timings: Dict[str, float] = {}
+    errors = []
+    for name, busy, error in _collect(results, workers):
+        timings[name] = busy
+        if error is not None:
+            errors.append(f"{name}: {error}")
+    for w in workers.values():
+        w.join()
+    timings["total"] = time.perf_counter() - started
+
+    if errors:
+        raise RuntimeError("Ошибка экспорта — " + "; ".join(errors))
+    return timings
 
 
 def main():
-    ensure_out_dir()
-    rows = fetch_employee_workdays()
-    nested = build_nested_structure(rows)
+    parser = argparse.ArgumentParser(description="Экспорт сотрудников и рабочих дней")
+    parser.add_argument("--parallel", choices=["process", "thread"],
+                        help="писать форматы параллельно (по рабочему на формат)")
+    parser.add_argument("--formats", help="список форматов через запятую, например json,xml "
+                                          f"(по умолчанию {','.join(DEFAULT_FORMATS)}; "
+                                          "columnar — только явно)")
+    args = parser.parse_args()
+    formats = args.formats.split(",") if args.formats else None
 
-    export_json(nested)
-    export_csv(rows)
-    export_xml(nested)
-    export_yaml(nested)
+    ensure_out_dir()
+    if args.parallel:
+        timings = export_parallel(formats, mode=args.parallel)
+        width = max(map(len, timings))
+        for name, seconds in timings.items():
+            print(f"  {name:<{width}} {seconds:8.3f} с")
+    else:
+        employees = iter_employees(iter_employee_workdays())
+        export_stream(employees, make_writers(formats))
 
     print("Экспорт завершён.")
 
@@ -0,0 +1,274 @@
+# hours.py
+"""
+Подсчёт отработанных часов по отметкам IN/OUT.
+
+Правила пары IN/OUT:
+  - IN открывает интервал; повторный IN при открытом интервале игнорируется;
+  - OUT закрывает открытый интервал; OUT без IN в часы не засчитывается;
+  - промежуток между OUT и следующим IN — перерыв, он не учитывается;
+  - незакрытый IN в часы не идёт, пока не придёт OUT.
+
+Состояние дня хранится в WorkDayState, поэтому новая отметка обрабатывается
+за O(1): без перечитывания всех отметок дня. Если отметка пришла «задним
+числом» (раньше последней обработанной), день пересчитывается целиком.
+"""
+import argparse
+from array import array
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from db import get_connection
+import data_versions
+import partitions
+import rollups
+
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+@dataclass
+class DayState:
+    workday_id: int
+    first_in: Optional[str] = None
+    last_out: Optional[str] = None
+    open_since: Optional[str] = None
+    last_event: Optional[str] = None
+    worked_seconds: int = 0
+    punch_count: Optional[int] = 0
+
+    @property
+    def total_hours(self) -> float:
+        return round(self.worked_seconds / 3600, 2)
+
+
+def normalize_time(event_time: str) -> str:
+    #'YYYY-MM-DD HH:MM' и 'YYYY-MM-DDTHH:MM:SS' приводим к 'YYYY-MM-DD HH:MM:SS';
+    #некорректная дата или время — ValueError
+    parsed = datetime.fromisoformat(event_time)
+    if len(event_time) == 19 and event_time[10] == " ":
+        return event_time
+    return parsed.strftime(TIME_FORMAT)
+
+
+def apply_punch(state: DayState, event_time: str, event_type: str) -> bool:
+    """
+    Учесть отметку в состоянии дня.
+    Возвращает False, если отметка раньше последней учтённой — тогда
+    состояние не меняется и день нужно пересчитать через fold_day.
+    """
+    t = normalize_time(event_time)
+    if state.last_event is not None and t < state.last_event:
+        return False
+
+    state.punch_count += 1
+    state.last_event = t
+
+    if event_type == "IN":
+        if state.open_since is None:
+            state.open_since = t
+        if state.first_in is None:
+            state.first_in = t
+    elif event_type == "OUT":
+        if state.open_since is not None:
+            opened = datetime.fromisoformat(state.open_since)
+            closed = datetime.fromisoformat(t)
+            state.worked_seconds += int((closed - opened).total_seconds())
+            state.open_since = None
+        state.last_out = t
+    return True
+
+
+def fold_day(workday_id: int, events: Iterable[Tuple[str, str]]) -> DayState:
+    """Посчитать состояние дня с нуля по отметкам (event_time, event_type)."""
+    state = DayState(workday_id=workday_id)
+    for event_time, event_type in sorted(events, key=lambda e: normalize_time(e[0])):
+        apply_punch(state, event_time, event_type)
+    return state
+
+
+# ====== Работа с БД ======
+
+def load_states(cur, workday_ids: Iterable[int]) -> Dict[int, DayState]:
+    """Состояния дней; для дней без строки в WorkDayState — пустые (punch_count=None)."""
+    ids = list(set(workday_ids))
+    states: Dict[int, DayState] = {}
+    for i in range(0, len(ids), 500):
+        chunk = ids[i:i + 500]
+        cur.execute(f"""
+            SELECT * FROM WorkDayState
+            WHERE workday_id IN ({", ".join("?" * len(chunk))})
+        """, chunk)
+        for row in cur.fetchall():
+            states[row["workday_id"]] = DayState(
+                workday_id=row["workday_id"],
+                first_in=row["first_in"],
+                last_out=row["last_out"],
+                open_since=row["open_since"],
+                last_event=row["last_event"],
+                worked_seconds=row["worked_seconds"],
+                punch_count=row["punch_count"],
+            )
+    for workday_id in ids:
+        states.setdefault(workday_id, DayState(workday_id=workday_id, punch_count=None))
+    return states
+
+
+# Часы дня считаются по отметкам, если в WorkDays их нет или там то же значение,
+# что hours.py записал в прошлый раз (worked_seconds в WorkDayState, с точностью
+# до округления). Иначе часы введены вручную, и отметки их не переписывают.
+# Запрос выполняется до замены WorkDayState, чтобы сравнивать с прежним состоянием.
+_UPDATE_PUNCH_HOURS_SQL = """
+    UPDATE WorkDays SET total_hours = ?
+    WHERE workday_id = ?
+      AND (total_hours IS NULL
+           OR EXISTS (SELECT 1 FROM WorkDayState s
+                      WHERE s.workday_id = WorkDays.workday_id
+                        AND abs(WorkDays.total_hours - s.worked_seconds / 3600.0) < 0.006))
+"""
+
+
+def save_states(cur, states: Iterable[DayState], update_hours: bool = True) -> None:
+    """
+    Записать состояния дней и перенести изменения в сводные таблицы.
+    update_hours — обновить и WorkDays.total_hours (только у дней, часы которых
+    считаются по отметкам; введённые вручную остаются).
+    """
+    states = list(states)
+    ids = [s.workday_id for s in states]
+    before = rollups.snapshot(cur, ids)
+    if update_hours:
+        cur.executemany(_UPDATE_PUNCH_HOURS_SQL, [(s.total_hours, s.workday_id) for s in states])
+    cur.executemany("""
+        INSERT OR REPLACE INTO WorkDayState
+            (workday_id, first_in, last_out, open_since, last_event, worked_seconds, punch_count)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, [(s.workday_id, s.first_in, s.last_out, s.open_since,
+           s.last_event, s.worked_seconds, s.punch_count) for s in states])
+    after = rollups.snapshot(cur, ids)
+    rollups.apply_changes(cur, before, after)
+    data_versions.bump(cur, data_versions.REPORTS)
+
+
+def _events_for_workday(cur, workday_id: int) -> List[Tuple[str, str]]:
+    cur.execute(f"""
+        SELECT event_time, event_type FROM {partitions.source_for_workday(cur.connection, workday_id)}
+        WHERE workday_id = ?
+        ORDER BY event_time
+    """, (workday_id,))
+    return [(row["event_time"], row["event_type"]) for row in cur.fetchall()]
+
+
+def register_punches(cur, punches: Iterable[Tuple[int, str, str]]) -> Dict[int, DayState]:
+    """
+    Учесть новые отметки (workday_id, event_time, event_type), уже вставленные
+    в TimeEntries в текущей транзакции. Коммит делает вызывающий код.
+    """
+    by_day: Dict[int, List[Tuple[str, str]]] = {}
+    for workday_id, event_time, event_type in punches:
+        by_day.setdefault(workday_id, []).append((normalize_time(event_time), event_type))
+    if not by_day:
+        return {}
+
+    states = load_states(cur, by_day.keys())
+    for workday_id, events in by_day.items():
+        events.sort()
+        state = states[workday_id]
+        if state.punch_count is None:
+            # у дня ещё нет состояния (отметки внесены до hours.py) — считаем с нуля
+            states[workday_id] = fold_day(workday_id, _events_for_workday(cur, workday_id))
+            continue
+        for event_time, event_type in events:
+            if not apply_punch(state, event_time, event_type):
+                # отметка задним числом — пересчитываем день целиком
+                states[workday_id] = fold_day(workday_id, _events_for_workday(cur, workday_id))
+                break
+
+    save_states(cur, states.values())
+    return states
+
+
+def register_punch(cur, workday_id: int, event_time: str, event_type: str) -> DayState:
+    """Учесть одну новую отметку (см. register_punches)."""
+    return register_punches(cur, [(workday_id, event_time, event_type)])[workday_id]
+
+
+def recompute(start_date: Optional[str] = None,
+              end_date: Optional[str] = None,
+              batch_size: int = 1000,
+              conn=None) -> int:
+    """
+    Пересчитать часы по истории (например, после загрузки старых данных).
+    Дни без отметок и дни с введёнными вручную часами не трогаются
+    (состояние дня по отметкам при этом обновляется).
+    При помесячных разделах (partitions.py) период обрабатывается частями,
+    каждая фиксируется отдельно.
+    conn — своё соединение (например, у datagen), иначе — из пула.
+    Возвращает количество пересчитанных дней.
+    """
+    own = conn is None
+    if own:
+        conn = get_connection()
+    try:
+        count = 0
+        for chunk_start, chunk_end, source in partitions.chunks(conn, start_date, end_date):
+            count += _recompute_chunk(conn, source, chunk_start, chunk_end, batch_size)
+            conn.commit()
+    finally:
+        if own:
+            conn.close()
+    return count
+
+
+def _recompute_chunk(conn, source: str,
+                     start_date: Optional[str],
+                     end_date: Optional[str],
+                     batch_size: int) -> int:
+    where = ""
+    params: List = []
+    if start_date is not None and end_date is not None:
+        where = " WHERE w.work_date BETWEEN ? AND ?"
+        params += [start_date, end_date]
+    elif start_date is not None:
+        where = " WHERE w.work_date >= ?"
+        params.append(start_date)
+    elif end_date is not None:
+        where = " WHERE w.work_date <= ?"
+        params.append(end_date)
+
+    # сначала — id дней с отметками целиком, затем чтение и запись пачками:
+    # WorkDays не меняется, пока по тому же соединению открыт читающий курсор
+    cur = conn.cursor()
+    cur.execute(f"""
+        SELECT DISTINCT t.workday_id
+        FROM {source} t
+        JOIN WorkDays w ON w.workday_id = t.workday_id{where}
+        ORDER BY t.workday_id
+    """, params)
+    workday_ids = array("q", (row[0] for row in cur.fetchall()))
+
+    for i in range(0, len(workday_ids), batch_size):
+        batch = workday_ids[i:i + batch_size].tolist()
+        cur.execute(f"""
+            SELECT t.workday_id, t.event_time, t.event_type
+            FROM {source} t
+            WHERE t.workday_id IN ({", ".join("?" * len(batch))})
+        """, batch)
+        events: Dict[int, List[Tuple[str, str]]] = {wid: [] for wid in batch}
+        for workday_id, event_time, event_type in cur.fetchall():
+            events[workday_id].append((event_time, event_type))
+        save_states(cur, [fold_day(wid, day_events) for wid, day_events in events.items()])
+    return len(workday_ids)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Пересчёт отработанных часов по отметкам")
+    parser.add_argument("--from", dest="start_date", help="с даты (YYYY-MM-DD)")
+    parser.add_argument("--to", dest="end_date", help="по дату (YYYY-MM-DD)")
+    args = parser.parse_args()
+
+    count = recompute(args.start_date, args.end_date)
+    print(f"Пересчитано рабочих дней: {count}")
+
+
+if __name__ == "__main__":
+    main()
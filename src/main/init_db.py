@@ -1,7 +1,16 @@
+import argparse
 import sqlite3
 import hashlib
 import os
 
+import db
+import employee_search
+import hours
+import data_versions
+import report_cache
+import rollups
+from db import configure_connection
+
 DB_NAME = "worktime.db"
 
 
@@ -11,7 +20,7 @@ def hash_password(raw: str) -> str:
 
 def create_connection():
     conn = sqlite3.connect(DB_NAME)
-    conn.execute("PRAGMA foreign_keys = ON;")
+    configure_connection(conn)
     return conn
 
 
@@ -54,6 +63,55 @@ def create_tables(conn):
     );
     """)
 
+    # Состояние подсчёта часов по рабочему дню (ведёт hours.py)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS WorkDayState (
+        workday_id     INTEGER PRIMARY KEY,
+        first_in       DATETIME,
+        last_out       DATETIME,
+        open_since     DATETIME,
+        last_event     DATETIME,
+        worked_seconds INTEGER NOT NULL DEFAULT 0,
+        punch_count    INTEGER NOT NULL DEFAULT 0,
+        FOREIGN KEY (workday_id) REFERENCES WorkDays(workday_id)
+    );
+    """)
+
+    # Сводные таблицы для отчётов (ведёт rollups.py)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS EmployeeMonthStats (
+        employee_id    INTEGER NOT NULL,
+        month          TEXT NOT NULL,
+        hours          REAL NOT NULL DEFAULT 0,
+        punches        INTEGER NOT NULL DEFAULT 0,
+        late_days      INTEGER NOT NULL DEFAULT 0,
+        overtime_hours REAL NOT NULL DEFAULT 0,
+        PRIMARY KEY (employee_id, month)
+    );
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS DepartmentDayStats (
+        department     TEXT NOT NULL,
+        work_date      DATE NOT NULL,
+        hours          REAL NOT NULL DEFAULT 0,
+        punches        INTEGER NOT NULL DEFAULT 0,
+        late_days      INTEGER NOT NULL DEFAULT 0,
+        overtime_hours REAL NOT NULL DEFAULT 0,
+        PRIMARY KEY (department, work_date)
+    );
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS DepartmentMonthStats (
+        department     TEXT NOT NULL,
+        month          TEXT NOT NULL,
+        hours          REAL NOT NULL DEFAULT 0,
+        punches        INTEGER NOT NULL DEFAULT 0,
+        late_days      INTEGER NOT NULL DEFAULT 0,
+        overtime_hours REAL NOT NULL DEFAULT 0,
+        PRIMARY KEY (department, month)
+    );
+    """)
+
     # Типы отсутствия
     cursor.execute("""
     CREATE TABLE IF NOT EXISTS AbsenceType (
@@ -110,8 +168,92 @@ def create_tables(conn):
     );
     """)
 
+    # Счётчики изменений, по которым кэши процесса (отчёты, отсутствия) замечают записи;
+    # прежний построчный счётчик кэша отчётов (триггеры DataVersion) больше не нужен
+    for sql in report_cache.drop_legacy_schema() + data_versions.schema():
+        cursor.execute(sql)
+
+    # Полнотекстовый поиск сотрудников (нужна сборка SQLite с FTS5)
+    try:
+        for sql in employee_search.schema():
+            cursor.execute(sql)
+        employee_search.sync(conn)
+    except sqlite3.OperationalError as e:
+        print(f"Поиск сотрудников недоступен: {e}")
+
     conn.commit()
     print("Таблицы созданы.")
+    create_indexes(conn)
+
+
+# Индексы под горячие запросы:
+#  - поиск рабочего дня сотрудника на дату (mark_time_entry, ingest_punches);
+#  - табель за период по work_date BETWEEN (generate_timesheet);
+#  - отметки рабочего дня по времени (get_for_workday);
+#  - отсутствия сотрудника по дате начала (get_absences_for_employee);
+#  - фильтр табеля по отделу (generate_timesheet).
+INDEXES = [
+    "CREATE UNIQUE INDEX IF NOT EXISTS ux_workdays_employee_date ON WorkDays (employee_id, work_date);",
+    "CREATE INDEX IF NOT EXISTS ix_workdays_date ON WorkDays (work_date);",
+    "CREATE INDEX IF NOT EXISTS ix_timeentries_workday_time ON TimeEntries (workday_id, event_time);",
+    "CREATE INDEX IF NOT EXISTS ix_absences_employee_from ON Absences (employee_id, date_from);",
+    "CREATE INDEX IF NOT EXISTS ix_employee_department ON Employee (department);",
+    "CREATE INDEX IF NOT EXISTS ix_useraccounts_employee ON UserAccounts (employee_id);",
+]
+
+
+def find_duplicate_workdays(conn) -> list:
+    """Пары (employee_id, work_date), встречающиеся больше одного раза."""
+    cur = conn.execute("""
+        SELECT employee_id, work_date, COUNT(*) AS cnt
+        FROM WorkDays
+        GROUP BY employee_id, work_date
+        HAVING COUNT(*) > 1
+    """)
+    return cur.fetchall()
+
+
+def create_indexes(conn):
+    """Создать индексы (можно вызывать на существующей БД — повторно не создаются)."""
+    duplicates = find_duplicate_workdays(conn)
+    if duplicates:
+        raise ValueError(
+            f"В WorkDays есть {len(duplicates)} повторяющихся пар (employee_id, work_date), "
+            f"например {tuple(duplicates[0][:2])}. Объедините их перед созданием уникального индекса."
+        )
+
+    cursor = conn.cursor()
+    for sql in INDEXES:
+        cursor.execute(sql)
+    conn.commit()
+    print("Индексы созданы.")
+
+
+def analyze(conn):
+    """Обновить статистику планировщика запросов."""
+    conn.execute("ANALYZE;")
+    conn.commit()
+    print("Статистика (ANALYZE) обновлена.")
+
+
+def recompute_hours() -> int:
+    """
+    Досчитать состояния дней и часы по отметкам (hours.recompute) в БД DB_NAME.
+    Сводные таблицы строятся по состояниям дней, поэтому это делается до rollups.rebuild.
+    """
+    if db.DB_NAME != DB_NAME:
+        db.configure_pool(db_name=DB_NAME)
+    count = hours.recompute()
+    print(f"Часы пересчитаны: {count} дн.")
+    return count
+
+
+def upgrade(conn):
+    """Довести существующую БД до текущей схемы, не удаляя данные."""
+    create_tables(conn)
+    recompute_hours()
+    rollups.rebuild(conn)
+    analyze(conn)
 
 
 def insert_test_data(conn):
@@ -192,9 +334,9 @@ def insert_test_data(conn):
     INSERT INTO TimeEntries (workday_id, event_time, event_type, source)
     VALUES (?, ?, ?, ?);
     """, [
-        (1, "2025-12-01 09:01", "IN",  "терминал"),
-        (1, "2025-12-01 17:05", "OUT", "терминал"),
-        (2, "2025-12-02 09:03", "IN",  "web"),
+        (1, "2025-12-01 09:01:00", "IN",  "терминал"),
+        (1, "2025-12-01 17:05:00", "OUT", "терминал"),
+        (2, "2025-12-02 09:03:00", "IN",  "web"),
     ])
 
     conn.commit()
@@ -202,13 +344,34 @@ def insert_test_data(conn):
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Создание базы данных учёта рабочего времени")
+    parser.add_argument("--upgrade", action="store_true",
+                        help="не пересоздавать БД, а добавить недостающие таблицы и индексы и выполнить ANALYZE")
+    parser.add_argument("--analyze", action="store_true",
+                        help="только обновить статистику (ANALYZE)")
+    args = parser.parse_args()
+
+    if args.upgrade or args.analyze:
+        conn = create_connection()
+        if args.upgrade:
+            upgrade(conn)
+        else:
+            analyze(conn)
+        conn.close()
+        print(f"Готово. База данных {DB_NAME!r} обновлена.")
+        return
+
     # если файл БД уже существует – удаляем, чтобы не было старых ID
-    if os.path.exists(DB_NAME):
-        os.remove(DB_NAME)
+    # вместе с файлом журнала WAL, иначе SQLite применит его к новой БД
+    for path in (DB_NAME, DB_NAME + "-wal", DB_NAME + "-shm"):
+        if os.path.exists(path):
+            os.remove(path)
 
     conn = create_connection()
     create_tables(conn)
     insert_test_data(conn)
+    recompute_hours()
+    rollups.rebuild(conn)
     conn.close()
     print(f"Готово. База данных пересоздана в файле {DB_NAME!r}")
 
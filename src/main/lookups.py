@@ -0,0 +1,123 @@
+# lookups.py
+"""
+Кэш частых чтений: сотрудник по id, роли и типы отсутствий.
+
+EmployeeRepository.get_by_id читает сотрудника через кэш; update/delete
+сбрасывают запись после COMMIT (on_commit → employee_changed), как и
+остальные кэши; прочитанное внутри transaction() в кэш не попадает.
+Справочники Roles и AbsenceType приложение не меняет — их кэш сбрасывает
+только clear() (после правки справочников вручную; при смене БД — сам, через
+db.on_db_changed).
+Наружу отдаются копии, счётчики попаданий/промахов — stats().
+"""
+import threading
+from dataclasses import replace
+from typing import Callable, Optional
+
+from cache import LRUCache
+from db import get_connection, in_transaction, on_db_changed
+from mappers import columns, fetch_one
+from models import AbsenceType, Role
+
+EMPLOYEE_CACHE_SIZE = 4096     # сотрудников в кэше
+REFERENCE_CACHE_SIZE = 256     # записей справочника в кэше
+
+# employee_id -> Employee
+employees = LRUCache(EMPLOYEE_CACHE_SIZE)
+# role_id -> Role и ("name", name) -> Role
+roles = LRUCache(REFERENCE_CACHE_SIZE)
+# absence_type_id -> AbsenceType
+absence_types = LRUCache(REFERENCE_CACHE_SIZE)
+
+_lock = threading.Lock()
+# растёт при каждом сбросе сотрудника: прочитанное из БД до сброса в кэш не попадёт
+_epoch = 0
+
+
+def _read_through(cache: LRUCache, key, loader: Callable, guarded: bool):
+    value = cache.get(key)
+    if value is None:
+        epoch = _epoch
+        value = loader()
+        if value is None:
+            return None
+        # guarded: данные меняются приложением — не кэшируем прочитанное внутри
+        # transaction() (могут быть не зафиксированы) и после сброса
+        if not guarded:
+            cache.set(key, value)
+        elif not in_transaction():
+            with _lock:
+                if epoch == _epoch:
+                    cache.set(key, value)
+    return replace(value)
+
+
+# ====== Сотрудники ======
+
+def employee(employee_id: int, loader: Callable):
+    """Сотрудник из кэша или loader() (чтение из БД); копия либо None."""
+    return _read_through(employees, employee_id, loader, guarded=True)
+
+
+def employee_changed(employee_id: int) -> None:
+    """Сбросить сотрудника после изменения (вызывается через on_commit)."""
+    global _epoch
+    with _lock:
+        _epoch += 1
+        employees.invalidate(employee_id)
+
+
+# ====== Справочники ======
+
+def _load_role(where: str, value) -> Optional[Role]:
+    conn = get_connection()
+    try:
+        return fetch_one(conn, Role, f"SELECT {columns(Role)} FROM Roles WHERE {where} = ?", (value,))
+    finally:
+        conn.close()
+
+
+def role(role_id: int) -> Optional[Role]:
+    return _read_through(roles, role_id, lambda: _load_role("role_id", role_id), guarded=False)
+
+
+def role_by_name(name: str) -> Optional[Role]:
+    return _read_through(roles, ("name", name), lambda: _load_role("name", name), guarded=False)
+
+
+def _load_absence_type(absence_type_id: int) -> Optional[AbsenceType]:
+    conn = get_connection()
+    try:
+        return fetch_one(conn, AbsenceType,
+                         f"SELECT {columns(AbsenceType)} FROM AbsenceType WHERE absence_type_id = ?",
+                         (absence_type_id,))
+    finally:
+        conn.close()
+
+
+def absence_type(absence_type_id: int) -> Optional[AbsenceType]:
+    return _read_through(absence_types, absence_type_id,
+                         lambda: _load_absence_type(absence_type_id), guarded=False)
+
+
+# ====== Управление ======
+
+def clear() -> None:
+    """Сбросить все кэши (например, после смены БД или правки справочников)."""
+    global _epoch
+    with _lock:
+        _epoch += 1
+        employees.clear()
+    roles.clear()
+    absence_types.clear()
+
+
+on_db_changed(clear)
+
+
+def stats() -> dict:
+    return {
+        "employees": employees.stats(),
+        "roles": roles.stats(),
+        "absence_types": absence_types.stats(),
+    }
@@ -0,0 +1,195 @@
+# mappers.py
+"""
+Сборка моделей из строк БД без обращения к полям по имени.
+
+Запрос выбирает колонки в порядке полей модели (columns(Model)), курсор
+отдаёт обычные кортежи вместо sqlite3.Row, и модель строится позиционно:
+Model(*row). Если полю нужно преобразование (is_active -> bool), для модели
+один раз генерируется функция вида
+    def build(row): return UserAccount(row[0], row[1], row[2], row[3], _c4(row[4]))
+
+    python mappers.py --rows 200000   — замер времени и памяти против sqlite3.Row
+"""
+import argparse
+import sqlite3
+import time
+import tracemalloc
+from dataclasses import fields, make_dataclass
+from itertools import starmap
+from typing import Callable, Dict, Optional
+
+from models import AbsenceType, TimeEntry, UserAccount, WorkDay
+
+
+def _optional_bool(value):
+    return bool(value) if value is not None else None
+
+
+# модель -> {поле: преобразование значения из БД}
+CONVERTERS: Dict[type, Dict[str, Callable]] = {
+    UserAccount: {"is_active": _optional_bool},
+    AbsenceType: {"is_paid": _optional_bool},
+}
+
+
+class Mapper:
+    """Строит модели из кортежей, у которых колонки идут в порядке полей модели."""
+
+    __slots__ = ("model", "fields", "columns", "_build")
+
+    def __init__(self, model: type, converters: Optional[Dict[str, Callable]] = None):
+        self.model = model
+        self.fields = tuple(f.name for f in fields(model))
+        self.columns = ", ".join(self.fields)
+        self._build = self._generate(model, self.fields, converters) if converters else None
+
+    @staticmethod
+    def _generate(model: type, names, converters: Dict[str, Callable]) -> Callable:
+        namespace = {"Model": model}
+        args = []
+        for i, name in enumerate(names):
+            if name in converters:
+                namespace[f"_c{i}"] = converters[name]
+                args.append(f"_c{i}(row[{i}])")
+            else:
+                args.append(f"row[{i}]")
+        source = f"def build(row):\n    return Model({', '.join(args)})\n"
+        exec(source, namespace)
+        return namespace["build"]
+
+    def one(self, row):
+        if row is None:
+            return None
+        return self._build(row) if self._build is not None else self.model(*row)
+
+    def all(self, rows) -> list:
+        if self._build is not None:
+            return list(map(self._build, rows))
+        return list(starmap(self.model, rows))
+
+
+_mappers: Dict[type, Mapper] = {}
+
+
+def mapper(model: type) -> Mapper:
+    m = _mappers.get(model)
+    if m is None:
+        m = _mappers[model] = Mapper(model, CONVERTERS.get(model))
+    return m
+
+
+def columns(model: type, alias: Optional[str] = None) -> str:
+    """Список колонок для SELECT в порядке полей модели (с префиксом таблицы, если задан)."""
+    names = mapper(model).fields
+    if alias:
+        return ", ".join(f"{alias}.{name}" for name in names)
+    return ", ".join(names)
+
+
+def _tuple_cursor(conn, sql: str, params):
+    cur = conn.cursor()
+    cur.row_factory = None      # кортежи вместо sqlite3.Row
+    cur.execute(sql, params)
+    return cur
+
+
+def fetch_all(conn, model: type, sql: str, params=()) -> list:
+    """Выполнить запрос (колонки — columns(model)) и вернуть список моделей."""
+    return mapper(model).all(_tuple_cursor(conn, sql, params).fetchall())
+
+
+def fetch_one(conn, model: type, sql: str, params=()):
+    """То же для одной строки; None, если строк нет."""
+    return mapper(model).one(_tuple_cursor(conn, sql, params).fetchone())
+
+
+# ====== Замер ======
+
+def _legacy_model(model: type) -> type:
+    # та же модель, но как раньше — обычный @dataclass с __dict__ у каждого объекта
+    return make_dataclass(model.__name__ + "Dict", [(f.name, f.type) for f in fields(model)])
+
+
+def _measure(func, repeat: int = 3) -> tuple:
+    # время — лучшее из repeat запусков без tracemalloc (он замедляет аллокации в разы),
+    # память — отдельным запуском: сколько занимает возвращённый список моделей
+    elapsed = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        elapsed = min(elapsed, time.perf_counter() - started)
+    tracemalloc.start()
+    result = func()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return elapsed, current
+
+
+def benchmark(rows: int = 200_000) -> Dict[str, dict]:
+    """
+    Сравнить прежний способ (sqlite3.Row + именованные аргументы + @dataclass с __dict__)
+    с мапперами на больших результатах get_for_employee / get_for_workday.
+    Данные — во временной БД в памяти. Память — сколько занимают загруженные модели.
+    """
+    conn = sqlite3.connect(":memory:")
+    conn.executescript("""
+        CREATE TABLE WorkDays (workday_id INTEGER PRIMARY KEY, employee_id INTEGER,
+                               work_date DATE, planned_start TIME, total_hours REAL);
+        CREATE TABLE TimeEntries (time_entry_id INTEGER PRIMARY KEY, workday_id INTEGER,
+                                  event_time DATETIME, event_type TEXT, source TEXT);
+    """)
+    conn.executemany("INSERT INTO WorkDays VALUES (?, 1, ?, '09:00', 8.0)",
+                     ((i, f"{2000 + i // 366:04d}-{i % 12 + 1:02d}-{i % 28 + 1:02d}") for i in range(rows)))
+    conn.executemany("INSERT INTO TimeEntries VALUES (?, 1, ?, ?, 'терминал')",
+                     ((i, f"2025-01-01 {i // 3600 % 24:02d}:{i // 60 % 60:02d}:{i % 60:02d}",
+                       "IN" if i % 2 == 0 else "OUT") for i in range(rows)))
+    conn.commit()
+
+    cases = {
+        "WorkDayRepository.get_for_employee": (WorkDay, "WorkDays", "employee_id", "work_date"),
+        "TimeEntryRepository.get_for_workday": (TimeEntry, "TimeEntries", "workday_id", "event_time"),
+    }
+    results: Dict[str, dict] = {}
+    for name, (model, table, key, order) in cases.items():
+        legacy = _legacy_model(model)
+        names = mapper(model).fields
+
+        def old_way():
+            conn.row_factory = sqlite3.Row
+            try:
+                cur = conn.execute(f"SELECT * FROM {table} WHERE {key} = 1 ORDER BY {order}")
+                return [legacy(**{n: row[n] for n in names}) for row in cur.fetchall()]
+            finally:
+                conn.row_factory = None
+
+        def new_way():
+            return fetch_all(conn, model, f"SELECT {columns(model)} FROM {table} "
+                                          f"WHERE {key} = ? ORDER BY {order}", (1,))
+
+        old_time, old_mem = _measure(old_way)
+        new_time, new_mem = _measure(new_way)
+        results[name] = {
+            "rows": rows,
+            "old_s": old_time, "new_s": new_time,
+            "old_bytes": old_mem, "new_bytes": new_mem,
+        }
+    conn.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Замер мапперов против sqlite3.Row")
+    parser.add_argument("--rows", type=int, default=200_000)
+    args = parser.parse_args()
+
+    for name, r in benchmark(args.rows).items():
+        print(f"{name} ({r['rows']} строк)")
+        print(f"  время:  {r['old_s'] * 1000:8.1f} мс -> {r['new_s'] * 1000:8.1f} мс "
+              f"(x{r['old_s'] / r['new_s']:.1f})")
+        print(f"  память: {r['old_bytes'] / 2**20:8.1f} МБ -> {r['new_bytes'] / 2**20:8.1f} МБ "
+              f"(x{r['old_bytes'] / r['new_bytes']:.1f})")
+
+
+if __name__ == "__main__":
+    main()
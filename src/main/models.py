@@ -3,7 +3,7 @@ from dataclasses import dataclass
 from typing import Optional
 
 
-@dataclass
+@dataclass(slots=True)
 class Employee:
     employee_id: Optional[int]
     last_name: str
@@ -13,7 +13,7 @@ class Employee:
     department: Optional[str]
 
 
-@dataclass
+@dataclass(slots=True)
 class WorkDay:
     workday_id: Optional[int]
     employee_id: int
@@ -22,7 +22,7 @@ class WorkDay:
     total_hours: Optional[float]
 
 
-@dataclass
+@dataclass(slots=True)
 class TimeEntry:
     time_entry_id: Optional[int]
     workday_id: int
@@ -31,7 +31,7 @@ class TimeEntry:
     source: Optional[str]
 
 
-@dataclass
+@dataclass(slots=True)
 class AbsenceType:
     absence_type_id: Optional[int]
     name: str
@@ -39,7 +39,7 @@ class AbsenceType:
     description: Optional[str]
 
 
-@dataclass
+@dataclass(slots=True)
 class Absence:
     absence_id: Optional[int]
     employee_id: int
@@ -49,14 +49,14 @@ class Absence:
     status: Optional[str]
 
 
-@dataclass
+@dataclass(slots=True)
 class Role:
     role_id: Optional[int]
     name: str
     description: Optional[str]
 
 
-@dataclass
+@dataclass(slots=True)
 class UserAccount:
     user_id: Optional[int]
     employee_id: int
@@ -65,7 +65,7 @@ class UserAccount:
     is_active: Optional[bool]
 
 
-@dataclass
+@dataclass(slots=True)
 class UserRole:
     user_id: int
     role_id: int
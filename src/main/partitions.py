@@ -0,0 +1,536 @@
+# partitions.py
+"""
+Помесячное хранение отметок (TimeEntries) в отдельных файлах БД.
+
+Включается один раз командой
+    python partitions.py --db worktime.db enable
+После этого отметки месяца YYYY-MM лежат в файле <БД>.parts/te_YYYY_MM.db
+(таблица TimeEntries той же схемы), который подключается к соединению
+через ATTACH по требованию. Основной файл перестаёт расти с каждой отметкой,
+а VACUUM и резервная копия старых месяцев делаются по файлам.
+
+  - Месяц отметки — месяц её рабочего дня (WorkDays.work_date).
+  - Реестр разделов — таблица TimeEntryPartitions в основной БД.
+  - Основная таблица TimeEntries остаётся: в ней данные, не перенесённые
+    в разделы; запросы читают её вместе с разделами нужных месяцев.
+  - time_entry_id в разделе начинаются с month_key * 10^8, поэтому
+    не пересекаются между разделами и со старыми отметками.
+  - Число одновременно подключённых файлов ограничено SQLite (обычно 10),
+    поэтому запросы за длинный период выполняются частями — chunks().
+  - Старый месяц можно отключить: `archive 2023-12 --to archive/` переносит
+    файл в архив, и запросы его больше не видят; `restore` возвращает.
+
+Режим выбирается по наличию реестра в БД: процессы, запущенные до enable,
+продолжают писать в основную таблицу (эти отметки тоже читаются), поэтому
+включать разделы лучше при остановленном сервере.
+Коммит в WAL атомарен только в пределах одного файла: enable переносит месяц
+через INSERT OR IGNORE и его можно безопасно запустить повторно.
+"""
+import argparse
+import os
+import shutil
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import data_versions
+import db
+
+REGISTRY_TABLE = "TimeEntryPartitions"
+# шаг time_entry_id между месяцами: до 10^8 отметок в месяц
+ID_BLOCK = 10 ** 8
+# сколько разделов оставлять подключёнными после запроса за длинный период;
+# BEGIN IMMEDIATE блокирует все подключённые файлы, и внутри транзакции
+# отключить их уже нельзя — остальные места остаются для её разделов
+KEEP_ATTACHED = 2
+
+_REGISTRY_SQL = f"""
+    CREATE TABLE IF NOT EXISTS {REGISTRY_TABLE} (
+        month     TEXT PRIMARY KEY,       -- 'YYYY-MM'
+        path      TEXT NOT NULL,          -- относительно каталога основной БД или абсолютный
+        archived  INTEGER NOT NULL DEFAULT 0
+    )
+"""
+
+_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS {schema}.TimeEntries (
+        time_entry_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        workday_id    INTEGER NOT NULL,
+        event_time    DATETIME NOT NULL,
+        event_type    TEXT NOT NULL,
+        source        TEXT
+    )
+"""
+_INDEX_SQL = ("CREATE INDEX IF NOT EXISTS {schema}.ix_timeentries_workday_time "
+              "ON TimeEntries (workday_id, event_time)")
+
+
+class _Registry:
+    __slots__ = ("enabled", "months")
+
+    def __init__(self, enabled: bool, months: Dict[str, Tuple[str, bool]]):
+        self.enabled = enabled
+        self.months = months        # месяц -> (абсолютный путь, в архиве)
+
+
+# путь основной БД -> реестр
+_registries: Dict[str, _Registry] = {}
+_lock = threading.Lock()
+
+
+# ====== Реестр ======
+
+def _db_path(conn) -> str:
+    pool = getattr(conn, "_pool", None)
+    if pool is not None:
+        return os.path.abspath(pool.db_name)
+    return os.path.abspath(conn.execute("PRAGMA database_list").fetchone()[2])
+
+
+def _parts_dir(db_path: str) -> str:
+    return os.path.splitext(db_path)[0] + ".parts"
+
+
+def _load(conn) -> _Registry:
+    db_path = _db_path(conn)
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                          (REGISTRY_TABLE,)).fetchone()
+    months: Dict[str, Tuple[str, bool]] = {}
+    if exists:
+        base = os.path.dirname(db_path)
+        for month, path, archived in conn.execute(
+                f"SELECT month, path, archived FROM {REGISTRY_TABLE}").fetchall():
+            months[month] = (os.path.join(base, path), bool(archived))
+    registry = _Registry(exists is not None, months)
+    # внутри транзакции реестр может содержать ещё не зафиксированные строки
+    if not conn.in_transaction:
+        with _lock:
+            _registries[db_path] = registry
+    return registry
+
+
+def _registry(conn, reload: bool = False) -> _Registry:
+    registry = None if reload else _registries.get(_db_path(conn))
+    return registry if registry is not None else _load(conn)
+
+
+def forget() -> None:
+    """Сбросить реестры в памяти (после изменений из другого процесса)."""
+    with _lock:
+        _registries.clear()
+
+
+# реестры ключуются путём БД, но файл по тому же пути мог быть пересоздан
+db.on_db_changed(forget)
+
+
+def enabled(conn) -> bool:
+    return _registry(conn).enabled
+
+
+# ====== Подключение файлов ======
+
+def month_of(day: str) -> str:
+    """'YYYY-MM-DD...' -> 'YYYY-MM'."""
+    return day[:7]
+
+
+def _schema(month: str) -> str:
+    return "te_" + month.replace("-", "_")
+
+
+def _attached(conn) -> "OrderedDict[str, str]":
+    # схемы, подключённые к этому соединению, в порядке последнего использования
+    attached = getattr(conn, "_partitions", None)
+    if attached is None:
+        attached = conn._partitions = OrderedDict()
+    return attached
+
+
+def _attach(conn, month: str, path: str, pinned: Iterable[str] = ()) -> str:
+    schema = _schema(month)
+    attached = _attached(conn)
+    if schema in attached:
+        attached.move_to_end(schema)
+        return schema
+
+    limit = conn.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED)
+    if len(attached) >= limit:
+        # освобождаем место: DETACH не проходит, если схема участвует в транзакции
+        for old in list(attached):
+            if old in pinned:
+                continue
+            try:
+                conn.execute(f"DETACH DATABASE {old}")
+            except sqlite3.OperationalError:
+                continue
+            del attached[old]
+            if len(attached) < limit:
+                break
+        else:
+            raise RuntimeError(f"Нельзя подключить раздел {month}: подключено {len(attached)} файлов, "
+                               f"и они заняты текущей транзакцией (разбейте её по месяцам)")
+
+    conn.execute(f"ATTACH DATABASE ? AS {schema}", (path,))
+    attached[schema] = path
+    # режим журнала и синхронизация задаются для каждого файла отдельно, но внутри
+    # транзакции SQLite их менять не даёт: режим журнала хранится в файле
+    # и задан при создании раздела (_init_file), synchronous остаётся FULL
+    if not conn.in_transaction:
+        if db.JOURNAL_MODE:
+            conn.execute(f"PRAGMA {schema}.journal_mode = {db.JOURNAL_MODE}")
+        if db.SYNCHRONOUS:
+            conn.execute(f"PRAGMA {schema}.synchronous = {db.SYNCHRONOUS}")
+    return schema
+
+
+def _trim(conn, keep: int = KEEP_ATTACHED) -> None:
+    """Отключить давно не используемые разделы, оставив keep последних."""
+    attached = _attached(conn)
+    for schema in list(attached)[:max(len(attached) - keep, 0)]:
+        try:
+            conn.execute(f"DETACH DATABASE {schema}")
+        except sqlite3.OperationalError:
+            continue
+        del attached[schema]
+
+
+def _detach(conn, month: str) -> None:
+    schema = _schema(month)
+    attached = _attached(conn)
+    if schema in attached:
+        conn.execute(f"DETACH DATABASE {schema}")
+        del attached[schema]
+
+
+def _month_key(month: str) -> int:
+    return int(month[:4]) * 12 + int(month[5:7]) - 1
+
+
+def _init_file(path: str, month: str) -> None:
+    """
+    Создать файл раздела (таблица, индекс, начало time_entry_id) отдельным
+    соединением с профилем db.configure_connection. Файл готов и переведён
+    в WAL ещё до ATTACH, даже если раздел создаётся внутри transaction().
+    Повторный вызов ничего не меняет.
+    """
+    conn = sqlite3.connect(path)
+    try:
+        db.configure_connection(conn)
+        conn.execute(_TABLE_SQL.format(schema="main"))
+        conn.execute(_INDEX_SQL.format(schema="main"))
+        conn.execute("""
+            INSERT INTO sqlite_sequence (name, seq)
+            SELECT 'TimeEntries', ?
+            WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = 'TimeEntries')
+        """, (_month_key(month) * ID_BLOCK,))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _create(conn, month: str) -> str:
+    """Создать раздел месяца (файл, таблицу, запись в реестре). Возвращает путь."""
+    db_path = _db_path(conn)
+    os.makedirs(_parts_dir(db_path), exist_ok=True)
+    path = os.path.join(_parts_dir(db_path), _schema(month) + ".db")
+    _init_file(path, month)
+    _attach(conn, month, path)
+    conn.execute(f"INSERT OR IGNORE INTO {REGISTRY_TABLE} (month, path) VALUES (?, ?)",
+                 (month, os.path.relpath(path, os.path.dirname(db_path))))
+    return path
+
+
+# ====== Маршрутизация запросов ======
+
+def target(conn, month: str) -> str:
+    """Таблица для INSERT отметок месяца: TimeEntries или <раздел>.TimeEntries."""
+    registry = _registry(conn)
+    if not registry.enabled:
+        return "TimeEntries"
+    entry = registry.months.get(month)
+    if entry is None:
+        entry = _registry(conn, reload=True).months.get(month)
+    if entry is None:
+        outside_tx = not conn.in_transaction
+        path = _create(conn, month)
+        if outside_tx:
+            # новый раздел фиксируем сразу, чтобы его увидели другие соединения;
+            # внутри транзакции он зафиксируется (или откатится) вместе с ней
+            conn.commit()
+            _load(conn)
+        entry = (path, False)
+    path, archived = entry
+    if archived:
+        raise ValueError(f"Раздел отметок за {month} перенесён в архив — запись невозможна")
+    return _attach(conn, month, path) + ".TimeEntries"
+
+
+def source(conn, months: Iterable[str]) -> str:
+    """
+    Источник для SELECT по отметкам указанных месяцев: TimeEntries, если
+    разделы не включены, иначе подзапрос UNION ALL из основной таблицы
+    и разделов этих месяцев (архивные и несуществующие пропускаются).
+    """
+    registry = _registry(conn)
+    if not registry.enabled:
+        return "TimeEntries"
+    months = sorted(set(months))
+    if any(m not in registry.months for m in months):
+        registry = _registry(conn, reload=True)
+    active = [(m, registry.months[m][0]) for m in months
+              if m in registry.months and not registry.months[m][1]]
+    if not active:
+        return "main.TimeEntries"
+    pinned = {_schema(m) for m, _ in active}
+    parts = ["SELECT * FROM main.TimeEntries"]
+    for month, path in active:
+        parts.append(f"SELECT * FROM {_attach(conn, month, path, pinned)}.TimeEntries")
+    return "(" + " UNION ALL ".join(parts) + ")"
+
+
+def months_of_workdays(conn, workday_ids: Iterable[int]) -> Dict[int, str]:
+    """workday_id -> месяц рабочего дня."""
+    ids = list(set(workday_ids))
+    result: Dict[int, str] = {}
+    for i in range(0, len(ids), 500):
+        chunk = ids[i:i + 500]
+        for workday_id, work_date in conn.execute(f"""
+            SELECT workday_id, work_date FROM WorkDays
+            WHERE workday_id IN ({", ".join("?" * len(chunk))})
+        """, chunk).fetchall():
+            result[workday_id] = month_of(work_date)
+    return result
+
+
+def source_for_workday(conn, workday_id: int) -> str:
+    """Источник для SELECT по отметкам одного рабочего дня."""
+    if not enabled(conn):
+        return "TimeEntries"
+    return source(conn, months_of_workdays(conn, [workday_id]).values())
+
+
+def insert_entries(cur, rows: List[Tuple[int, str, str, Optional[str]]]) -> int:
+    """
+    Вставить отметки (workday_id, event_time, event_type, source) в таблицы
+    их месяцев. Возвращает количество вставленных строк; cur.lastrowid —
+    id последней вставленной отметки.
+    """
+    conn = cur.connection
+    if not enabled(conn):
+        groups = {None: rows}
+    else:
+        months = months_of_workdays(conn, (r[0] for r in rows))
+        groups: Dict[Optional[str], List] = {}
+        for row in rows:
+            groups.setdefault(months[row[0]], []).append(row)
+    count = 0
+    for month, group in groups.items():
+        # раздел подключается прямо перед вставкой: при нехватке мест
+        # target может отключить раздел, подключённый для предыдущей группы
+        table = "TimeEntries" if month is None else target(conn, month)
+        sql = f"""
+            INSERT INTO {table} (workday_id, event_time, event_type, source)
+            VALUES (?, ?, ?, ?)
+        """
+        if len(group) == 1:
+            cur.execute(sql, group[0])
+        else:
+            cur.executemany(sql, group)
+        count += cur.rowcount
+    # счётчик — после вставок: cur.lastrowid остаётся id последней отметки
+    data_versions.bump(cur, data_versions.REPORTS)
+    return count
+
+
+def _months_between(first: str, last: str) -> List[str]:
+    months = []
+    key, last_key = _month_key(first), _month_key(last)
+    while key <= last_key:
+        months.append(f"{key // 12:04d}-{key % 12 + 1:02d}")
+        key += 1
+    return months
+
+
+def chunks(conn,
+           start_date: Optional[str],
+           end_date: Optional[str]) -> Iterator[Tuple[Optional[str], Optional[str], str]]:
+    """
+    Разбить период рабочих дней на части, для каждой из которых хватает
+    подключённых файлов: (с даты, по дату, источник). Без разделов — одна
+    часть с исходными границами и TimeEntries. Вызывающий код ограничивает
+    запрос датами части (по WorkDays.work_date), иначе основная таблица
+    будет прочитана несколько раз.
+    """
+    if not enabled(conn):
+        yield start_date, end_date, "TimeEntries"
+        return
+    if start_date is None or end_date is None:
+        first, last = conn.execute("SELECT MIN(work_date), MAX(work_date) FROM WorkDays").fetchone()
+        if first is None:
+            return
+        start_date = start_date or first
+        end_date = end_date or last
+    if start_date > end_date:
+        return
+    months = _months_between(month_of(start_date), month_of(end_date))
+    # одно место оставляем под раздел для записи
+    size = max(conn.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED) - 1, 1)
+    try:
+        for i in range(0, len(months), size):
+            group = months[i:i + size]
+            lo = max(start_date, group[0] + "-01")
+            hi = min(end_date, group[-1] + "-31")
+            yield lo, hi, source(conn, group)
+    finally:
+        _trim(conn)
+
+
+# ====== Управление ======
+
+def enable(conn) -> Dict[str, int]:
+    """
+    Включить разделы и перенести в них отметки из основной таблицы.
+    Перед переносом досчитываются состояния дней (WorkDayState): личный
+    отчёт берёт количество отметок оттуда и не обращается к разделам.
+    WorkDays.total_hours при этом не меняются (в том числе введённые вручную);
+    пересчитать часы по отметкам — отдельный шаг `python hours.py`.
+    Возвращает {месяц: перенесено отметок}.
+    """
+    import hours
+
+    conn.execute(_REGISTRY_SQL)
+    conn.commit()
+    forget()
+
+    cur = conn.cursor()
+    missing = [r[0] for r in cur.execute("""
+        SELECT DISTINCT t.workday_id FROM main.TimeEntries t
+        LEFT JOIN WorkDayState s ON s.workday_id = t.workday_id
+        WHERE s.workday_id IS NULL
+    """).fetchall()]
+    for i in range(0, len(missing), 1000):
+        states = [hours.fold_day(wid, hours._events_for_workday(cur, wid)) for wid in missing[i:i + 1000]]
+        hours.save_states(cur, states, update_hours=False)
+        conn.commit()
+
+    moved: Dict[str, int] = {}
+    months = [r[0] for r in cur.execute("""
+        SELECT DISTINCT substr(w.work_date, 1, 7)
+        FROM main.TimeEntries t
+        JOIN WorkDays w ON w.workday_id = t.workday_id
+        ORDER BY 1
+    """).fetchall()]
+    for month in months:
+        table = target(conn, month)
+        bounds = (month + "-01", month + "-31")
+        cur.execute(f"""
+            INSERT OR IGNORE INTO {table} (time_entry_id, workday_id, event_time, event_type, source)
+            SELECT t.time_entry_id, t.workday_id, t.event_time, t.event_type, t.source
+            FROM main.TimeEntries t
+            JOIN WorkDays w ON w.workday_id = t.workday_id
+            WHERE w.work_date BETWEEN ? AND ?
+        """, bounds)
+        cur.execute("""
+            DELETE FROM main.TimeEntries
+            WHERE workday_id IN (SELECT workday_id FROM WorkDays WHERE work_date BETWEEN ? AND ?)
+        """, bounds)
+        moved[month] = cur.rowcount
+        conn.commit()
+    return moved
+
+
+def status(conn) -> List[Tuple[str, str, bool, Optional[int], Optional[int]]]:
+    """(месяц, путь, в архиве, отметок, размер файла в байтах) по всем разделам."""
+    registry = _registry(conn, reload=True)
+    result = []
+    for month in sorted(registry.months):
+        path, archived = registry.months[month]
+        size = os.path.getsize(path) if os.path.exists(path) else None
+        count = None
+        if not archived and size is not None:
+            count = conn.execute(f"SELECT COUNT(*) FROM {_attach(conn, month, path)}.TimeEntries").fetchone()[0]
+        result.append((month, path, archived, count, size))
+    return result
+
+
+def archive(conn, month: str, directory: str) -> str:
+    """Отключить раздел месяца и перенести его файл в directory. Возвращает новый путь."""
+    registry = _registry(conn, reload=True)
+    if month not in registry.months:
+        raise ValueError(f"Раздела за {month} нет")
+    path, archived = registry.months[month]
+    if archived:
+        raise ValueError(f"Раздел за {month} уже в архиве: {path}")
+
+    # переносим всё из WAL в основной файл раздела, чтобы файл был самодостаточным
+    schema = _attach(conn, month, path)
+    conn.execute(f"PRAGMA {schema}.wal_checkpoint(TRUNCATE)")
+    conn.execute(f"PRAGMA {schema}.journal_mode = DELETE")
+    _detach(conn, month)
+
+    os.makedirs(directory, exist_ok=True)
+    destination = os.path.abspath(os.path.join(directory, os.path.basename(path)))
+    shutil.move(path, destination)
+    conn.execute(f"UPDATE {REGISTRY_TABLE} SET archived = 1, path = ? WHERE month = ?",
+                 (destination, month))
+    conn.commit()
+    forget()
+    return destination
+
+
+def restore(conn, month: str) -> str:
+    """Вернуть раздел месяца из архива. Возвращает путь."""
+    registry = _registry(conn, reload=True)
+    if month not in registry.months or not registry.months[month][1]:
+        raise ValueError(f"Раздела за {month} нет в архиве")
+    archived_path = registry.months[month][0]
+    db_path = _db_path(conn)
+    os.makedirs(_parts_dir(db_path), exist_ok=True)
+    path = os.path.join(_parts_dir(db_path), os.path.basename(archived_path))
+    shutil.move(archived_path, path)
+    conn.execute(f"UPDATE {REGISTRY_TABLE} SET archived = 0, path = ? WHERE month = ?",
+                 (os.path.relpath(path, os.path.dirname(db_path)), month))
+    conn.commit()
+    forget()
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Помесячные разделы отметок (TimeEntries)")
+    parser.add_argument("--db", default=db.DB_NAME)
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("enable", help="включить разделы и перенести в них отметки")
+    sub.add_parser("list", help="список разделов")
+    p_archive = sub.add_parser("archive", help="перенести раздел месяца в архив")
+    p_archive.add_argument("month", help="YYYY-MM")
+    p_archive.add_argument("--to", default="archive", help="каталог архива")
+    p_restore = sub.add_parser("restore", help="вернуть раздел месяца из архива")
+    p_restore.add_argument("month", help="YYYY-MM")
+    args = parser.parse_args()
+
+    db.configure_pool(db_name=args.db)
+    conn = db.get_connection()
+    try:
+        if args.command == "enable":
+            moved = enable(conn)
+            for month, count in moved.items():
+                print(f"  {month}: {count}")
+            print(f"Разделы включены, перенесено отметок: {sum(moved.values())}. "
+                  f"Место в основной БД освободит VACUUM.")
+        elif args.command == "list":
+            for month, path, archived, count, size in status(conn):
+                state = "архив" if archived else f"{count} отметок"
+                size_text = f"{size / 2**20:.1f} МБ" if size is not None else "файла нет"
+                print(f"  {month}  {state:<16} {size_text:>10}  {path}")
+        elif args.command == "archive":
+            print(f"Раздел {args.month} перенесён: {archive(conn, args.month, args.to)}")
+        elif args.command == "restore":
+            print(f"Раздел {args.month} возвращён: {restore(conn, args.month)}")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+# pivot.py
+"""
+Табель за месяц в классическом виде: строка — сотрудник, колонка — день месяца.
+
+Матрица плотная и хранится в массивах array (без объекта на ячейку):
+  hours    — часы, строка за строкой, NaN — рабочего дня нет;
+  absences — код отсутствия ячейки: 0 — нет, i — ABSENCE_CODES-код codes[i - 1].
+Рабочие дни месяца читаются одним проходом по курсору, и в том же проходе
+считаются итоги по строкам (часы, дни) и по колонкам (часы за день).
+В ячейке показываются часы, а если сотрудник не работал — код отсутствия
+(учитываются только согласованные отсутствия). Рабочий день без подсчитанных
+часов (total_hours NULL) показывается как 0, но при отсутствии в этот день —
+кодом отсутствия и считается неявкой, а не отработанным днём.
+
+    python pivot.py 2024-03 --department "Отдел 1" --csv tabel.csv
+"""
+import argparse
+import calendar
+import csv
+import time
+from array import array
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional
+
+import absence_index
+import lookups
+from db import get_connection
+
+FETCH_SIZE = 5000
+
+# буквенные коды табеля по названию типа отсутствия; остальные — первые буквы названия
+ABSENCE_CODES = {
+    "Отпуск": "ОТ",
+    "Больничный": "Б",
+    "Командировка": "К",
+    "Отгул": "ДО",
+}
+# какие отсутствия попадают в табель
+ABSENCE_STATUSES = ("Approved",)
+
+NAN = float("nan")
+
+
+@dataclass
+class MonthPivot:
+    """Табель сотрудники × дни. Ячейка (row, day) — индекс row * days + day - 1."""
+    month: str
+    days: int
+    employee_ids: array             # 'q'
+    departments: List[str]
+    names: List[str]
+    hours: array                    # 'd', NaN — нет рабочего дня
+    absences: array                 # 'B', 0 — нет отсутствия
+    codes: List[str]
+    row_hours: array                # 'd', часы сотрудника за месяц
+    row_days: array                 # 'i', отработанные дни
+    row_absent: array               # 'i', дни отсутствия без работы
+    day_hours: array                # 'd', часы всех сотрудников за день
+
+    def __len__(self) -> int:
+        return len(self.employee_ids)
+
+    @property
+    def total_hours(self) -> float:
+        return sum(self.day_hours)
+
+    def cell(self, row: int, day: int) -> str:
+        """Текст ячейки: часы, иначе код отсутствия, иначе пусто."""
+        i = row * self.days + day - 1
+        value = self.hours[i]
+        if value == value:          # не NaN
+            return _number(value)
+        code = self.absences[i]
+        return self.codes[code - 1] if code else ""
+
+    def header(self) -> List[str]:
+        return ["Отдел", "ФИО"] + [str(d) for d in range(1, self.days + 1)] + ["Дней", "Неявок", "Часов"]
+
+    def rows(self) -> Iterator[List[str]]:
+        """Строки табеля по сотрудникам и последняя строка «Итого» с суммами по дням."""
+        for row in range(len(self)):
+            yield ([self.departments[row], self.names[row]]
+                   + [self.cell(row, day) for day in range(1, self.days + 1)]
+                   + [str(self.row_days[row]), str(self.row_absent[row]), _number(self.row_hours[row])])
+        yield (["", "Итого"] + [_number(h) for h in self.day_hours]
+               + [str(sum(self.row_days)), str(sum(self.row_absent)), _number(self.total_hours)])
+
+
+def _number(value: float) -> str:
+    value = round(value, 2)
+    return str(int(value)) if value == int(value) else str(value)
+
+
+def _code_for(name: str) -> str:
+    return ABSENCE_CODES.get(name) or name[:2].upper()
+
+
+def build(month: str, department: Optional[str] = None, fetch_size: int = FETCH_SIZE) -> MonthPivot:
+    """Собрать табель за месяц 'YYYY-MM' (по отделу или по всей организации)."""
+    year, mon = int(month[:4]), int(month[5:7])
+    days = calendar.monthrange(year, mon)[1]
+    start, end = f"{month}-01", f"{month}-{days:02d}"
+
+    dept_filter = " WHERE e.department = ?" if department is not None else ""
+    dept_params = [department] if department is not None else []
+
+    conn = get_connection()
+    try:
+        cur = conn.cursor()
+        cur.row_factory = None
+
+        # строки — все сотрудники (в том числе без рабочих дней за месяц)
+        cur.execute(f"""
+            SELECT e.employee_id,
+                   IFNULL(e.department, ''),
+                   e.last_name || ' ' || e.first_name || ' ' || IFNULL(e.middle_name, '') AS full_name
+            FROM Employee e{dept_filter}
+            ORDER BY 2, 3
+        """, dept_params)
+        employee_ids = array("q")
+        departments: List[str] = []
+        names: List[str] = []
+        row_of: Dict[int, int] = {}
+        for employee_id, dept, name in cur.fetchall():
+            row_of[employee_id] = len(employee_ids)
+            employee_ids.append(employee_id)
+            departments.append(dept)
+            names.append(name.strip())
+
+        n = len(employee_ids)
+        hours = array("d", [NAN]) * (n * days)
+        absences = array("B", bytes(n * days))
+        row_hours = array("d", bytes(8 * n))
+        row_days = array("i", bytes(4 * n))
+        row_absent = array("i", bytes(4 * n))
+        day_hours = array("d", bytes(8 * days))
+
+        # один проход по рабочим дням месяца: ячейки и итоги
+        # (соединение с Employee идёт по покрывающему индексу сотрудника и быстрее,
+        # чем диапазон по ix_workdays_date, даже без фильтра по отделу)
+        cur.execute(f"""
+            SELECT w.employee_id, CAST(substr(w.work_date, 9, 2) AS INTEGER) - 1, w.total_hours
+            FROM WorkDays w
+            JOIN Employee e ON e.employee_id = w.employee_id
+            WHERE w.work_date BETWEEN ? AND ?{dept_filter.replace(" WHERE", " AND")}
+        """, [start, end] + dept_params)
+        # ячейка -> строка для дней без часов: решаются после отсутствий
+        no_hours: Dict[int, int] = {}
+        while True:
+            chunk = cur.fetchmany(fetch_size)
+            if not chunk:
+                break
+            for employee_id, day, value in chunk:
+                row = row_of[employee_id]
+                i = row * days + day
+                if hours[i] == hours[i] or i in no_hours:
+                    continue        # дубликат дня — учитываем один раз
+                if value is None:
+                    no_hours[i] = row
+                    continue
+                hours[i] = value
+                row_hours[row] += value
+                row_days[row] += 1
+                day_hours[day] += value
+    finally:
+        conn.close()
+
+    # отсутствия, пересекающие месяц, — из интервального индекса; тип — из справочника
+    codes: List[str] = []
+    code_index: Dict[str, int] = {}
+    for absence in absence_index.index.between(start, end, ABSENCE_STATUSES):
+        row = row_of.get(absence.employee_id)
+        absence_type = lookups.absence_type(absence.absence_type_id)
+        if row is None or absence_type is None:
+            continue                # другой отдел или неизвестный тип
+        type_name = absence_type.name
+        date_from, date_to = absence.date_from, absence.date_to
+        code = code_index.get(type_name)
+        if code is None:
+            codes.append(_code_for(type_name))
+            code = code_index[type_name] = len(codes)
+        first = 1 if date_from < start else int(date_from[8:10])
+        last = days if date_to > end else int(date_to[8:10])
+        for day in range(first, last + 1):
+            i = row * days + day - 1
+            if not absences[i]:
+                absences[i] = code
+                if hours[i] != hours[i]:    # не работал (или часов нет)
+                    row_absent[row] += 1
+
+    # день без часов и без отсутствия — отработанный день с нулём часов
+    for i, row in no_hours.items():
+        if not absences[i]:
+            hours[i] = 0.0
+            row_days[row] += 1
+
+    return MonthPivot(month, days, employee_ids, departments, names, hours, absences, codes,
+                      row_hours, row_days, row_absent, day_hours)
+
+
+def export_csv(pivot: MonthPivot, filename: str) -> int:
+    """Записать табель в CSV (разделитель ';', как export_timesheet_to_csv). Возвращает число строк."""
+    count = 0
+    with open(filename, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f, delimiter=';')
+        writer.writerow(pivot.header())
+        for row in pivot.rows():
+            writer.writerow(row)
+            count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Табель за месяц: сотрудники × дни")
+    parser.add_argument("month", help="месяц YYYY-MM")
+    parser.add_argument("--department", help="только этот отдел")
+    parser.add_argument("--csv", help="записать табель в CSV-файл")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    pivot = build(args.month, args.department)
+    elapsed = time.perf_counter() - started
+    print(f"Табель {pivot.month}: сотрудников {len(pivot)}, дней {pivot.days}, "
+          f"часов {_number(pivot.total_hours)} — построен за {elapsed * 1000:.0f} мс")
+    if args.csv:
+        count = export_csv(pivot, args.csv)
+        print(f"Записано строк: {count} -> {args.csv}")
+
+
+if __name__ == "__main__":
+    main()
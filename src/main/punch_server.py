@@ -0,0 +1,272 @@
+# punch_server.py
+"""
+Сетевой приём отметок от терминалов (asyncio, TCP).
+
+Протокол — одна JSON-строка на запрос, одна JSON-строка на ответ,
+ответы приходят в том же порядке, что и запросы (можно слать пачкой,
+не дожидаясь ответов):
+
+  -> {"id": 17, "employee_id": 3, "event_type": "IN",
+      "event_time": "2025-12-01 09:00:00", "source": "terminal-2"}
+  <- {"id": 17, "status": "ok"}
+
+  event_time можно не передавать — тогда берётся время сервера.
+  При ошибке: {"id": 17, "status": "error", "error": "..."}.
+  Если очередь переполнена дольше ENQUEUE_TIMEOUT: {"id": 17, "status": "busy"}.
+
+  -> {"cmd": "stats"}
+  <- {"status": "ok", "queued": ..., "max_queue": ..., "committed": ..., "batches": ...}
+
+Все отметки пишет один писатель: он забирает из очереди всё, что накопилось
+(до MAX_BATCH штук), и записывает пачку одной транзакцией через
+services.ingest_punches. Ответ «ok» отправляется только после коммита,
+а коммит пачки идёт с synchronous=FULL (WRITER_SYNCHRONOUS): подтверждённая
+отметка переживает и отключение питания. Общий профиль (NORMAL в WAL) этого
+не гарантирует; fsync один на пачку, поэтому под нагрузкой он дёшев.
+"""
+import argparse
+import asyncio
+import json
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+import hours
+from services import ingest_punches
+
+HOST = "127.0.0.1"
+PORT = 8765
+MAX_BATCH = 500          # максимум отметок в одной транзакции
+MAX_QUEUE = 10000        # максимум отметок, ожидающих записи
+ENQUEUE_TIMEOUT = 5.0    # сколько ждать места в очереди, прежде чем ответить busy
+LINGER = 0.002           # сколько подождать попутчиков для пачки, секунд
+WRITER_SYNCHRONOUS = "FULL"   # «ok» — только после записи на диск
+
+Punch = Tuple[int, str, str, Optional[str]]
+
+
+def parse_punch(message: dict) -> Punch:
+    """Проверить запрос терминала и превратить его в кортеж для ingest_punches."""
+    employee_id = message.get("employee_id")
+    if not isinstance(employee_id, int) or isinstance(employee_id, bool):
+        raise ValueError("employee_id должен быть целым числом")
+
+    event_type = message.get("event_type")
+    if event_type not in ("IN", "OUT"):
+        raise ValueError("event_type должен быть 'IN' или 'OUT'")
+
+    event_time = message.get("event_time")
+    if event_time is None:
+        event_time = datetime.now().strftime(hours.TIME_FORMAT)
+    elif not isinstance(event_time, str):
+        raise ValueError("event_time должен быть строкой 'YYYY-MM-DD HH:MM:SS'")
+    else:
+        try:
+            event_time = hours.normalize_time(event_time)
+            datetime.strptime(event_time, hours.TIME_FORMAT)
+        except ValueError:
+            raise ValueError(f"event_time {event_time!r}: ожидается 'YYYY-MM-DD HH:MM:SS'") from None
+
+    source = message.get("source")
+    if source is not None and not isinstance(source, str):
+        raise ValueError("source должен быть строкой")
+
+    return employee_id, event_time, event_type, source
+
+
+class PunchServer:
+
+    def __init__(self,
+                 max_batch: int = MAX_BATCH,
+                 max_queue: int = MAX_QUEUE,
+                 enqueue_timeout: float = ENQUEUE_TIMEOUT,
+                 linger: float = LINGER):
+        self.max_batch = max_batch
+        self.max_queue = max_queue
+        self.enqueue_timeout = enqueue_timeout
+        self.linger = linger
+        self.committed = 0
+        self.batches = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._writer_task: Optional[asyncio.Task] = None
+        # один поток-писатель: все транзакции идут последовательно, без борьбы за блокировку
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="punch-writer")
+
+    # ---------- запись ----------
+
+    @classmethod
+    def _write_batch(cls, punches: List[Punch]) -> List[Optional[str]]:
+        """Записать пачку; вернуть для каждой отметки None или текст ошибки."""
+        try:
+            ingest_punches(punches, synchronous=WRITER_SYNCHRONOUS)
+            return [None] * len(punches)
+        except Exception as e:
+            if len(punches) == 1:
+                return [str(e)]
+        # пачка не прошла целиком — делим пополам, пока не найдём виноватые
+        middle = len(punches) // 2
+        return cls._write_batch(punches[:middle]) + cls._write_batch(punches[middle:])
+
+    async def _writer(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            if self.linger and self._queue.qsize() < self.max_batch:
+                await asyncio.sleep(self.linger)
+            while len(batch) < self.max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+
+            punches = [punch for punch, _ in batch]
+            try:
+                errors = await loop.run_in_executor(self._executor, self._write_batch, punches)
+            except Exception as e:
+                errors = [str(e)] * len(batch)
+
+            self.batches += 1
+            for (_, future), error in zip(batch, errors):
+                if error is None:
+                    self.committed += 1
+                if not future.done():
+                    future.set_result(error)
+
+    async def enqueue(self, punch: Punch) -> "asyncio.Future":
+        """
+        Поставить отметку в очередь; вернуть future, который завершится после коммита
+        (результат — текст ошибки или None). Если очередь полна, ждёт место
+        до enqueue_timeout и бросает asyncio.TimeoutError.
+        """
+        future = asyncio.get_running_loop().create_future()
+        await asyncio.wait_for(self._queue.put((punch, future)), self.enqueue_timeout)
+        return future
+
+    # ---------- соединения ----------
+
+    async def _process_line(self, line: bytes) -> "asyncio.Future":
+        """Разобрать строку и поставить отметку в очередь; вернуть future с ответом."""
+        loop = asyncio.get_running_loop()
+
+        def reply(response: dict) -> "asyncio.Future":
+            future = loop.create_future()
+            future.set_result(response)
+            return future
+
+        try:
+            message = json.loads(line)
+            if not isinstance(message, dict):
+                raise ValueError("ожидается JSON-объект")
+        except ValueError as e:
+            return reply({"status": "error", "error": f"некорректный JSON: {e}"})
+
+        if message.get("cmd") == "stats":
+            return reply({"status": "ok", **self.stats()})
+
+        response = {"id": message.get("id")}
+        try:
+            punch = parse_punch(message)
+        except ValueError as e:
+            return reply({**response, "status": "error", "error": str(e)})
+
+        try:
+            committed = await self.enqueue(punch)
+        except asyncio.TimeoutError:
+            return reply({**response, "status": "busy"})
+
+        async def wait_commit() -> dict:
+            error = await committed
+            if error is not None:
+                return {**response, "status": "error", "error": error}
+            return {**response, "status": "ok"}
+
+        return asyncio.ensure_future(wait_commit())
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        pending: deque = deque()
+        has_pending = asyncio.Event()
+        done_reading = False
+
+        async def send_responses():
+            while True:
+                while not pending:
+                    if done_reading:
+                        return
+                    has_pending.clear()
+                    await has_pending.wait()
+                response = await pending.popleft()
+                writer.write(json.dumps(response, ensure_ascii=False).encode() + b"\n")
+                await writer.drain()
+
+        sender = asyncio.create_task(send_responses())
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                # пока очередь полна, следующая строка не читается — терминал
+                # упирается в TCP-окно и сам притормаживает
+                pending.append(await self._process_line(line))
+                has_pending.set()
+        except ConnectionError:
+            pass
+        finally:
+            done_reading = True
+            has_pending.set()
+            try:
+                await sender
+            except ConnectionError:
+                pass
+            writer.close()
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "max_queue": self.max_queue,
+            "committed": self.committed,
+            "batches": self.batches,
+        }
+
+    async def start(self, host: str = HOST, port: int = PORT) -> asyncio.AbstractServer:
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._writer_task = asyncio.create_task(self._writer())
+        return await asyncio.start_server(self._handle_client, host, port)
+
+    async def stop(self) -> None:
+        if self._writer_task is not None:
+            self._writer_task.cancel()
+            try:
+                await self._writer_task
+            except asyncio.CancelledError:
+                pass
+        self._executor.shutdown(wait=True)
+
+
+async def serve(host: str, port: int, **options) -> None:
+    server = PunchServer(**options)
+    tcp_server = await server.start(host, port)
+    print(f"Приём отметок на {host}:{port}")
+    try:
+        async with tcp_server:
+            await tcp_server.serve_forever()
+    finally:
+        await server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сервер приёма отметок от терминалов")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH)
+    parser.add_argument("--max-queue", type=int, default=MAX_QUEUE)
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args.host, args.port,
+                          max_batch=args.max_batch, max_queue=args.max_queue))
+    except KeyboardInterrupt:
+        print("Сервер остановлен.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+# report_cache.py
+"""
+Кэш готовых отчётов (табель, личный отчёт) по параметрам.
+
+Запись действительна, пока не изменились данные: пути записи в Employee,
+WorkDays, WorkDayState и TimeEntries увеличивают счётчик
+data_versions.REPORTS в своей транзакции, и запись, сохранённая при другом
+значении, считается промахом.
+
+Значение счётчика и путь БД входят в ключ записи; при промахе записи прежних
+версий (и других БД) удаляются, а при смене БД кэш очищается целиком.
+Счётчик читается до построения отчёта, поэтому отчёт, захвативший более
+свежие данные, просто будет перестроен при следующем обращении — устаревший
+отчёт из кэша не вернётся. Внутри transaction() кэш не используется
+(данные могут быть не зафиксированы), отчёты больше MAX_ROWS строк не
+кэшируются. Если в БД ещё нет DataVersions (не выполнен init_db --upgrade),
+отчёты строятся без кэша.
+
+cached — для отчётов-списков, cached_iter — для генераторов (iter_timesheet):
+строки отдаются по мере чтения и попадают в кэш, только если отчёт дочитан.
+"""
+from typing import Callable, Hashable, Iterator, List, Optional
+
+import data_versions
+from cache import LRUCache
+from db import get_pool, in_transaction, on_db_changed
+
+REPORT_CACHE_SIZE = 64      # отчётов в кэше
+MAX_ROWS = 100_000          # отчёты длиннее не кэшируем, чтобы не держать их в памяти
+
+# таблицы прежней схемы: счётчик DataVersion вели построчные триггеры на них
+_LEGACY_TRACKED_TABLES = ("Employee", "WorkDays", "WorkDayState", "TimeEntries")
+
+# (отчёт, параметры, версия данных, путь БД) -> строки
+reports = LRUCache(REPORT_CACHE_SIZE)
+
+
+def drop_legacy_schema() -> List[str]:
+    """Удалить таблицу DataVersion и её триггеры из прежних версий (init_db.create_tables)."""
+    statements = []
+    for table in _LEGACY_TRACKED_TABLES:
+        for event in ("insert", "update", "delete"):
+            statements.append(f"DROP TRIGGER IF EXISTS trg_{table.lower()}_{event}_version;")
+    statements.append("DROP TABLE IF EXISTS DataVersion;")
+    return statements
+
+
+def data_version() -> Optional[int]:
+    """Текущая версия данных отчётов; None, если счётчиков в БД нет."""
+    return data_versions.read(data_versions.REPORTS)
+
+
+def _key(report: str, params: tuple) -> Optional[Hashable]:
+    """Ключ записи; None — кэш не используется."""
+    if in_transaction():
+        return None
+    # путь БД — на случай смены БД, пока другой поток строит отчёт
+    db_name = get_pool().db_name
+    version = data_version()
+    if version is None:
+        return None
+    return report, params, version, db_name
+
+
+def _forget_other_versions(key: Hashable) -> None:
+    # данные изменились — отчёты прежних версий больше не понадобятся
+    reports.invalidate_where(lambda k, _: k[2:] != key[2:])
+
+
+def cached(report: str, params: tuple, loader: Callable[[], list]) -> list:
+    """Отчёт report с параметрами params из кэша или loader(); возвращается копия списка."""
+    key = _key(report, params)
+    if key is None:
+        return loader()
+    entry = reports.get(key)
+    if entry is not None:
+        return list(entry)
+
+    _forget_other_versions(key)
+    rows = loader()
+    if len(rows) <= MAX_ROWS:
+        reports.set(key, tuple(rows))
+    return rows
+
+
+def cached_iter(report: str, params: tuple, loader: Callable[[], Iterator]) -> Iterator:
+    """
+    То же для отчёта-генератора: при попадании строки идут из кэша, иначе — из
+    loader() по мере чтения. В кэш попадает только дочитанный до конца отчёт
+    не длиннее MAX_ROWS строк; при закрытии генератора закрывается и loader().
+    """
+    key = _key(report, params)
+    if key is None:
+        yield from loader()
+        return
+    entry = reports.get(key)
+    if entry is not None:
+        yield from entry
+        return
+
+    _forget_other_versions(key)
+    rows: Optional[list] = []
+    source = loader()
+    try:
+        for row in source:
+            if rows is not None:
+                rows.append(row)
+                if len(rows) > MAX_ROWS:
+                    rows = None         # длинный отчёт дальше только отдаём
+            yield row
+    finally:
+        close = getattr(source, "close", None)
+        if close is not None:
+            close()
+    if rows is not None:
+        reports.set(key, tuple(rows))
+
+
+def clear() -> None:
+    reports.clear()
+
+
+# версия данных своя у каждой БД: отчёты другой БД могли бы совпасть по версии
+on_db_changed(clear)
+
+
+def stats() -> dict:
+    return reports.stats()
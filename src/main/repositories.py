@@ -1,248 +1,471 @@
 # repositories.py
-from typing import List, Optional
-from db import get_connection
+import sqlite3
+from dataclasses import dataclass, replace
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from db import get_connection, on_commit, retry_on_busy
+import absence_index
+import data_versions
+import employee_search
+import hours
+import lookups
+import partitions
+import rollups
+import sessions
+from mappers import columns, fetch_all, fetch_one
 from models import (
     Employee, WorkDay, TimeEntry, Absence, Role, UserAccount, UserRole
 )
+
+# сколько пар (employee_id, work_date) подставлять в один запрос IN (VALUES ...)
+_KEY_CHUNK = 400
+
+# колонки в порядке полей моделей — строки читаются кортежами и передаются позиционно
+_EMPLOYEE_COLUMNS = columns(Employee)
+_WORKDAY_COLUMNS = columns(WorkDay)
+_TIME_ENTRY_COLUMNS = columns(TimeEntry)
+_ABSENCE_COLUMNS = columns(Absence)
+_USER_ACCOUNT_COLUMNS = columns(UserAccount)
+
+# размер страницы по умолчанию для get_page / iter_*
+PAGE_SIZE = 500
+
+
+@dataclass(slots=True)
+class Page:
+    """
+    Страница списка. next_cursor — ключ последней строки страницы: его передают
+    в after, чтобы получить следующую; None — страниц больше нет.
+    """
+    items: list
+    next_cursor: Optional[tuple]
+
+
+def _fetch_page(model: type, table: str, cols: str, keys: Tuple[str, ...],
+                where: str, params: tuple, limit: int, after: Optional[tuple]) -> Page:
+    # keyset-пагинация: WHERE (ключи) > (курсор) ORDER BY ключи LIMIT —
+    # поиск по индексу, поэтому страница читается за одно и то же время на любой глубине
+    if limit < 1:
+        raise ValueError("limit must be >= 1")
+    key_list = ", ".join(keys)
+    conditions = [where] if where else []
+    args = list(params)
+    if after is not None:
+        conditions.append(f"({key_list}) > ({', '.join('?' * len(keys))})")
+        args += after
+    sql = f"SELECT {cols} FROM {table}"
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    sql += f" ORDER BY {key_list} LIMIT ?"
+    args.append(limit + 1)          # лишняя строка — признак, что есть следующая страница
+
+    conn = get_connection()
+    try:
+        items = fetch_all(conn, model, sql, args)
+    finally:
+        conn.close()
+    next_cursor = None
+    if len(items) > limit:
+        del items[limit:]
+        next_cursor = tuple(getattr(items[-1], key) for key in keys)
+    return Page(items, next_cursor)
+
+
+def _search_passes(conn, passes: List[Tuple[str, tuple]], limit: int) -> List[Employee]:
+    # результаты проходов поиска по порядку, без повторов, не больше limit
+    found: List[Employee] = []
+    seen = set()
+    for sql, params in passes:
+        for employee in fetch_all(conn, Employee, sql, params):
+            if employee.employee_id not in seen and len(found) < limit:
+                seen.add(employee.employee_id)
+                found.append(employee)
+        if len(found) >= limit:
+            break
+    return found
+
+
+def _iter_pages(get_page: Callable[[int, Optional[tuple]], Page], page_size: int) -> Iterator:
+    after = None
+    while True:
+        page = get_page(page_size, after)
+        yield from page.items
+        if page.next_cursor is None:
+            return
+        after = page.next_cursor
+
+
 class EmployeeRepository:
 
     @staticmethod
+    @retry_on_busy
     def create(employee: Employee) -> int:
         #Добавить сотрудника. Возвращает новый employee_id
         conn = get_connection()
-        cur = conn.cursor()
-        cur.execute("""
-            INSERT INTO Employee (last_name, first_name, middle_name, position, department)
-            VALUES (?, ?, ?, ?, ?)
-        """, (employee.last_name,
-              employee.first_name,
-              employee.middle_name,
-              employee.position,
-              employee.department))
-        conn.commit()
-        new_id = cur.lastrowid
-        conn.close()
+        try:
+            cur = conn.cursor()
+            cur.execute("""
+                INSERT INTO Employee (last_name, first_name, middle_name, position, department)
+                VALUES (?, ?, ?, ?, ?)
+            """, (employee.last_name,
+                  employee.first_name,
+                  employee.middle_name,
+                  employee.position,
+                  employee.department))
+            new_id = cur.lastrowid
+            data_versions.bump(cur, data_versions.REPORTS)
+            conn.commit()
+        finally:
+            conn.close()
         return new_id
 
     @staticmethod
     def get_by_id(employee_id: int) -> Optional[Employee]:
+        #Через кэш lookups: повторные чтения одного сотрудника не ходят в БД
+        return lookups.employee(employee_id, lambda: EmployeeRepository._fetch_by_id(employee_id))
+
+    @staticmethod
+    def _fetch_by_id(employee_id: int) -> Optional[Employee]:
         conn = get_connection()
-        cur = conn.cursor()
-        cur.execute("SELECT * FROM Employee WHERE employee_id = ?", (employee_id,))
-        row = cur.fetchone()
-        conn.close()
-        if row is None:
-            return None
-        return Employee(
-            employee_id=row["employee_id"],
-            last_name=row["last_name"],
-            first_name=row["first_name"],
-            middle_name=row["middle_name"],
-            position=row["position"],
-            department=row["department"],
-        )
+        try:
+            return fetch_one(conn, Employee,
+                             f"SELECT {_EMPLOYEE_COLUMNS} FROM Employee WHERE employee_id = ?", (employee_id,))
+        finally:
+            conn.close()
 
     @staticmethod
     def get_all() -> List[Employee]:
         conn = get_connection()
-        cur = conn.cursor()
-        cur.execute("SELECT * FROM Employee")
-        rows = cur.fetchall()
-        conn.close()
-        return [
-            Employee(
-                employee_id=row["employee_id"],
-                last_name=row["last_name"],
-                first_name=row["first_name"],
-                middle_name=row["middle_name"],
-                position=row["position"],
-                department=row["department"],
-            )
-            for row in rows
-        ]
+        try:
+            return fetch_all(conn, Employee, f"SELECT {_EMPLOYEE_COLUMNS} FROM Employee")
+        finally:
+            conn.close()
+
+    @staticmethod
+    def get_page(limit: int = PAGE_SIZE, after: Optional[tuple] = None) -> Page:
+        #Страница сотрудников по employee_id; after — (employee_id,) последнего на прошлой странице
+        return _fetch_page(Employee, "Employee", _EMPLOYEE_COLUMNS, ("employee_id",),
+                           "", (), limit, after)
+
+    @staticmethod
+    def iter_all(page_size: int = PAGE_SIZE) -> Iterator[Employee]:
+        #Все сотрудники постранично, без загрузки всего списка в память
+        return _iter_pages(EmployeeRepository.get_page, page_size)
+
+    @staticmethod
+    def search(text: str, limit: int = employee_search.SEARCH_LIMIT) -> List[Employee]:
+        #Поиск по началу слов ФИО, должности и отдела (индекс FTS5 EmployeeSearch;
+        #если SQLite без FTS5 — перебором Employee через LIKE)
+        query = employee_search.match_query(text)
+        if query is None:
+            return []
+        conn = get_connection()
+        try:
+            # сначала совпадения в ФИО, затем — в должности и отделе
+            try:
+                sql = f"""
+                    SELECT {_EMPLOYEE_COLUMNS} FROM Employee
+                    WHERE employee_id IN (SELECT rowid FROM EmployeeSearch WHERE EmployeeSearch MATCH ? LIMIT ?)
+                    ORDER BY last_name, first_name, middle_name
+                """
+                return _search_passes(conn, [(sql, (employee_search.name_query(query), limit)),
+                                             (sql, (query, limit))], limit)
+            except sqlite3.OperationalError as e:
+                if not employee_search.unavailable(e):
+                    raise
+            passes = []
+            for cols in (employee_search.NAME_COLUMNS, employee_search.COLUMNS):
+                where, params = employee_search.like_condition(conn, text, cols)
+                passes.append((f"""
+                    SELECT {_EMPLOYEE_COLUMNS} FROM Employee WHERE {where}
+                    ORDER BY last_name, first_name, middle_name LIMIT ?
+                """, (*params, limit)))
+            return _search_passes(conn, passes, limit)
+        finally:
+            conn.close()
 
     @staticmethod
+    @retry_on_busy
     def update(employee: Employee) -> None:
         #Обновить данные сотрудника по его employee_id
         if employee.employee_id is None:
             raise ValueError("employee_id is required for update")
 
         conn = get_connection()
-        cur = conn.cursor()
-        cur.execute("""
-            UPDATE Employee
-            SET last_name = ?, first_name = ?, middle_name = ?,
-                position = ?, department = ?
-            WHERE employee_id = ?
-        """, (employee.last_name,
-              employee.first_name,
-              employee.middle_name,
-              employee.position,
-              employee.department,
-              employee.employee_id))
-        conn.commit()
-        conn.close()
+        try:
+            cur = conn.cursor()
+            row = cur.execute("SELECT department FROM Employee WHERE employee_id = ?",
+                              (employee.employee_id,)).fetchone()
+            # смена отдела: дни сотрудника переезжают в сводках отделов вместе с ним
+            moved = row is not None and (row[0] or "") != (employee.department or "")
+            if moved:
+                before = rollups.snapshot_employee(cur, employee.employee_id)
+            cur.execute("""
+                UPDATE Employee
+                SET last_name = ?, first_name = ?, middle_name = ?,
+                    position = ?, department = ?
+                WHERE employee_id = ?
+            """, (employee.last_name,
+                  employee.first_name,
+                  employee.middle_name,
+                  employee.position,
+                  employee.department,
+                  employee.employee_id))
+            if moved:
+                rollups.apply_changes(cur, before, rollups.snapshot_employee(cur, employee.employee_id))
+            data_versions.bump(cur, data_versions.REPORTS)
+            conn.commit()
+        finally:
+            conn.close()
+        on_commit(lambda: lookups.employee_changed(employee.employee_id))
 
     @staticmethod
+    @retry_on_busy
     def delete(employee_id: int) -> None:
         conn = get_connection()
-        cur = conn.cursor()
-        cur.execute("DELETE FROM Employee WHERE employee_id = ?", (employee_id,))
-        conn.commit()
-        conn.close()
+        try:
+            cur = conn.cursor()
+            cur.execute("DELETE FROM Employee WHERE employee_id = ?", (employee_id,))
+            data_versions.bump(cur, data_versions.REPORTS)
+            conn.commit()
+        finally:
+            conn.close()
+        on_commit(lambda: lookups.employee_changed(employee_id))
 class WorkDayRepository:
 
     @staticmethod
+    @retry_on_busy
     def create(workday: WorkDay) -> int:
         conn = get_connection()
-        cur = conn.cursor()
-        cur.execute("""
-            INSERT INTO WorkDays (employee_id, work_date, planned_start, total_hours)
-            VALUES (?, ?, ?, ?)
-        """, (workday.employee_id,
-              workday.work_date,
-              workday.planned_start,
-              workday.total_hours))
-        conn.commit()
-        new_id = cur.lastrowid
-        conn.close()
+        try:
+            cur = conn.cursor()
+            cur.execute("""
+                INSERT INTO WorkDays (employee_id, work_date, planned_start, total_hours)
+                VALUES (?, ?, ?, ?)
+            """, (workday.employee_id,
+                  workday.work_date,
+                  workday.planned_start,
+                  workday.total_hours))
+            new_id = cur.lastrowid
+            data_versions.bump(cur, data_versions.REPORTS)
+            conn.commit()
+        finally:
+            conn.close()
         return new_id
 
     @staticmethod
     def get_for_employee(employee_id: int) -> list[WorkDay]:
         conn = get_connection()
-        cur = conn.cursor()
-        cur.execute("""
-            SELECT * FROM WorkDays
-            WHERE employee_id = ?
-            ORDER BY work_date
-        """, (employee_id,))
-        rows = cur.fetchall()
-        conn.close()
-        return [
-            WorkDay(
-                workday_id=row["workday_id"],
-                employee_id=row["employee_id"],
-                work_date=row["work_date"],
-                planned_start=row["planned_start"],
-                total_hours=row["total_hours"],
-            )
-            for row in rows
-        ]
+        try:
+            return fetch_all(conn, WorkDay, f"""
+                SELECT {_WORKDAY_COLUMNS} FROM WorkDays
+                WHERE employee_id = ?
+                ORDER BY work_date
+            """, (employee_id,))
+        finally:
+            conn.close()
+
+    @staticmethod
+    def get_page_for_employee(employee_id: int,
+                              limit: int = PAGE_SIZE,
+                              after: Optional[tuple] = None) -> Page:
+        #Страница рабочих дней сотрудника по дате; after — (work_date, workday_id)
+        return _fetch_page(WorkDay, "WorkDays", _WORKDAY_COLUMNS, ("work_date", "workday_id"),
+                           "employee_id = ?", (employee_id,), limit, after)
+
+    @staticmethod
+    def iter_for_employee(employee_id: int, page_size: int = PAGE_SIZE) -> Iterator[WorkDay]:
+        return _iter_pages(
+            lambda limit, after: WorkDayRepository.get_page_for_employee(employee_id, limit, after),
+            page_size)
+
+
+    @staticmethod
+    def get_or_create_ids(keys: Iterable[Tuple[int, str]]) -> Dict[Tuple[int, str], int]:
+        #Найти или создать рабочие дни для пар (employee_id, work_date) одним пакетом.
+        #Возвращает словарь (employee_id, work_date) -> workday_id.
+        #Ключи собираются до повторов retry_on_busy: генератор второй раз не прочитать
+        return WorkDayRepository._get_or_create_ids(set(keys))
+
+    @staticmethod
+    @retry_on_busy
+    def _get_or_create_ids(wanted: Set[Tuple[int, str]]) -> Dict[Tuple[int, str], int]:
+        result: Dict[Tuple[int, str], int] = {}
+        if not wanted:
+            return result
+
+        conn = get_connection()
+        try:
+            cur = conn.cursor()
+            WorkDayRepository._fetch_ids(cur, wanted, result)
+            missing = [key for key in wanted if key not in result]
+            if missing:
+                cur.executemany("""
+                    INSERT INTO WorkDays (employee_id, work_date, planned_start, total_hours)
+                    VALUES (?, ?, NULL, NULL)
+                """, missing)
+                WorkDayRepository._fetch_ids(cur, missing, result)
+                data_versions.bump(cur, data_versions.REPORTS)
+            conn.commit()
+        finally:
+            conn.close()
+        return result
+
+    @staticmethod
+    def _fetch_ids(cur, keys, result: Dict[Tuple[int, str], int]) -> None:
+        keys = list(keys)
+        for i in range(0, len(keys), _KEY_CHUNK):
+            chunk = keys[i:i + _KEY_CHUNK]
+            values = ", ".join(["(?, ?)"] * len(chunk))
+            params = [x for key in chunk for x in key]
+            cur.execute(f"""
+                SELECT workday_id, employee_id, work_date FROM WorkDays
+                WHERE (employee_id, work_date) IN (VALUES {values})
+            """, params)
+            for row in cur.fetchall():
+                result.setdefault((row["employee_id"], row["work_date"]), row["workday_id"])
 
 
 class TimeEntryRepository:
 
     @staticmethod
+    @retry_on_busy
     def create(entry: TimeEntry) -> int:
         conn = get_connection()
-        cur = conn.cursor()
-        cur.execute("""
-            INSERT INTO TimeEntries (workday_id, event_time, event_type, source)
-            VALUES (?, ?, ?, ?)
-        """, (entry.workday_id,
-              entry.event_time,
-              entry.event_type,
-              entry.source))
-        conn.commit()
-        new_id = cur.lastrowid
-        conn.close()
+        try:
+            cur = conn.cursor()
+            partitions.insert_entries(cur, [(entry.workday_id,
+                                             entry.event_time,
+                                             entry.event_type,
+                                             entry.source)])
+            new_id = cur.lastrowid
+            hours.register_punch(cur, entry.workday_id, entry.event_time, entry.event_type)
+            conn.commit()
+        finally:
+            conn.close()
         return new_id
 
+    @staticmethod
+    def create_many(entries: Iterable[TimeEntry]) -> int:
+        #Добавить пачку отметок одной транзакцией. Возвращает количество вставленных строк.
+        #Список собирается до повторов retry_on_busy (см. get_or_create_ids)
+        return TimeEntryRepository._create_many(list(entries))
+
+    @staticmethod
+    @retry_on_busy
+    def _create_many(entries: List[TimeEntry]) -> int:
+        conn = get_connection()
+        try:
+            cur = conn.cursor()
+            count = partitions.insert_entries(
+                cur, [(e.workday_id, e.event_time, e.event_type, e.source) for e in entries])
+            hours.register_punches(cur, [(e.workday_id, e.event_time, e.event_type) for e in entries])
+            conn.commit()
+        finally:
+            conn.close()
+        return count
+
     @staticmethod
     def get_for_workday(workday_id: int) -> list[TimeEntry]:
         conn = get_connection()
-        cur = conn.cursor()
-        cur.execute("""
-            SELECT * FROM TimeEntries
-            WHERE workday_id = ?
-            ORDER BY event_time
-        """, (workday_id,))
-        rows = cur.fetchall()
-        conn.close()
-        return [
-            TimeEntry(
-                time_entry_id=row["time_entry_id"],
-                workday_id=row["workday_id"],
-                event_time=row["event_time"],
-                event_type=row["event_type"],
-                source=row["source"],
-            )
-            for row in rows
-        ]
+        try:
+            return fetch_all(conn, TimeEntry, f"""
+                SELECT {_TIME_ENTRY_COLUMNS} FROM {partitions.source_for_workday(conn, workday_id)}
+                WHERE workday_id = ?
+                ORDER BY event_time
+            """, (workday_id,))
+        finally:
+            conn.close()
 # ---------- Absence CRUD ----------
 
 class AbsenceRepository:
 
     @staticmethod
+    @retry_on_busy
     def create(absence: Absence) -> int:
 
         #Создать запись об отсутствии.
         #Возвращает новый absence_id.
 
         conn = get_connection()
-        cur = conn.cursor()
-        cur.execute("""
-            INSERT INTO Absences (employee_id, absence_type_id, date_from, date_to, status)
-            VALUES (?, ?, ?, ?, ?)
-        """, (
-            absence.employee_id,
-            absence.absence_type_id,
-            absence.date_from,
-            absence.date_to,
-            absence.status,
-        ))
-        conn.commit()
-        new_id = cur.lastrowid
-        conn.close()
+        try:
+            cur = conn.cursor()
+            cur.execute("""
+                INSERT INTO Absences (employee_id, absence_type_id, date_from, date_to, status)
+                VALUES (?, ?, ?, ?, ?)
+            """, (
+                absence.employee_id,
+                absence.absence_type_id,
+                absence.date_from,
+                absence.date_to,
+                absence.status,
+            ))
+            new_id = cur.lastrowid
+            version = data_versions.bump(cur, data_versions.ABSENCES)
+            conn.commit()
+        finally:
+            conn.close()
+        created = replace(absence, absence_id=new_id)
+        on_commit(lambda: absence_index.on_created(created, version))
         return new_id
 
     @staticmethod
     def get_for_employee(employee_id: int) -> List[Absence]:
         #Получить все отсутствия конкретного сотрудника.
         conn = get_connection()
-        cur = conn.cursor()
-        cur.execute("""
-            SELECT * FROM Absences
-            WHERE employee_id = ?
-            ORDER BY date_from
-        """, (employee_id,))
-        rows = cur.fetchall()
-        conn.close()
+        try:
+            return fetch_all(conn, Absence, f"""
+                SELECT {_ABSENCE_COLUMNS} FROM Absences
+                WHERE employee_id = ?
+                ORDER BY date_from
+            """, (employee_id,))
+        finally:
+            conn.close()
 
-        return [
-            Absence(
-                absence_id=row["absence_id"],
-                employee_id=row["employee_id"],
-                absence_type_id=row["absence_type_id"],
-                date_from=row["date_from"],
-                date_to=row["date_to"],
-                status=row["status"],
-            )
-            for row in rows
-        ]
+    @staticmethod
+    def get_page_for_employee(employee_id: int,
+                              limit: int = PAGE_SIZE,
+                              after: Optional[tuple] = None) -> Page:
+        #Страница отсутствий сотрудника по дате начала; after — (date_from, absence_id)
+        return _fetch_page(Absence, "Absences", _ABSENCE_COLUMNS, ("date_from", "absence_id"),
+                           "employee_id = ?", (employee_id,), limit, after)
+
+    @staticmethod
+    def iter_for_employee(employee_id: int, page_size: int = PAGE_SIZE) -> Iterator[Absence]:
+        return _iter_pages(
+            lambda limit, after: AbsenceRepository.get_page_for_employee(employee_id, limit, after),
+            page_size)
 
     @staticmethod
+    @retry_on_busy
     def update_status(absence_id: int, new_status: str) -> None:
         #Обновить статус отсутствия (например, Requested → Approved).
         conn = get_connection()
-        cur = conn.cursor()
-        cur.execute("""
-            UPDATE Absences
-            SET status = ?
-            WHERE absence_id = ?
-        """, (new_status, absence_id))
-        conn.commit()
-        conn.close()
+        try:
+            cur = conn.cursor()
+            cur.execute("""
+                UPDATE Absences
+                SET status = ?
+                WHERE absence_id = ?
+            """, (new_status, absence_id))
+            version = data_versions.bump(cur, data_versions.ABSENCES)
+            conn.commit()
+        finally:
+            conn.close()
+        on_commit(lambda: absence_index.on_status_changed(absence_id, new_status, version))
 
     @staticmethod
+    @retry_on_busy
     def delete(absence_id: int) -> None:
         #Удалить запись об отсутствии.
         conn = get_connection()
-        cur = conn.cursor()
-        cur.execute("DELETE FROM Absences WHERE absence_id = ?", (absence_id,))
-        conn.commit()
-        conn.close()
+        try:
+            cur = conn.cursor()
+            cur.execute("DELETE FROM Absences WHERE absence_id = ?", (absence_id,))
+            version = data_versions.bump(cur, data_versions.ABSENCES)
+            conn.commit()
+        finally:
+            conn.close()
+        on_commit(lambda: absence_index.on_deleted(absence_id, version))
 
 
 # ---------- UserAccount CRUD ----------
@@ -250,156 +473,166 @@ class AbsenceRepository:
 class UserAccountRepository:
 
     @staticmethod
+    @retry_on_busy
     def create(account: UserAccount) -> int:
 
         #Создаём учётную запись пользователя.
         #Возвращает новый user_id.
 
         conn = get_connection()
-        cur = conn.cursor()
-        cur.execute("""
-            INSERT INTO UserAccounts (employee_id, login, password_hash, is_active)
-            VALUES (?, ?, ?, ?)
-        """, (
-            account.employee_id,
-            account.login,
-            account.password_hash,
-            int(account.is_active) if account.is_active is not None else 1,
-        ))
-        conn.commit()
-        new_id = cur.lastrowid
-        conn.close()
+        try:
+            cur = conn.cursor()
+            cur.execute("""
+                INSERT INTO UserAccounts (employee_id, login, password_hash, is_active)
+                VALUES (?, ?, ?, ?)
+            """, (
+                account.employee_id,
+                account.login,
+                account.password_hash,
+                int(account.is_active) if account.is_active is not None else 1,
+            ))
+            conn.commit()
+            new_id = cur.lastrowid
+        finally:
+            conn.close()
         return new_id
 
     @staticmethod
     def get_by_id(user_id: int) -> Optional[UserAccount]:
         conn = get_connection()
-        cur = conn.cursor()
-        cur.execute("SELECT * FROM UserAccounts WHERE user_id = ?", (user_id,))
-        row = cur.fetchone()
-        conn.close()
-        if row is None:
-            return None
-        return UserAccount(
-            user_id=row["user_id"],
-            employee_id=row["employee_id"],
-            login=row["login"],
-            password_hash=row["password_hash"],
-            is_active=bool(row["is_active"]) if row["is_active"] is not None else None,
-        )
+        try:
+            return fetch_one(conn, UserAccount,
+                             f"SELECT {_USER_ACCOUNT_COLUMNS} FROM UserAccounts WHERE user_id = ?", (user_id,))
+        finally:
+            conn.close()
 
     @staticmethod
     def get_by_login(login: str) -> Optional[UserAccount]:
         conn = get_connection()
-        cur = conn.cursor()
-        cur.execute("SELECT * FROM UserAccounts WHERE login = ?", (login,))
-        row = cur.fetchone()
-        conn.close()
-        if row is None:
-            return None
-        return UserAccount(
-            user_id=row["user_id"],
-            employee_id=row["employee_id"],
-            login=row["login"],
-            password_hash=row["password_hash"],
-            is_active=bool(row["is_active"]) if row["is_active"] is not None else None,
-        )
+        try:
+            return fetch_one(conn, UserAccount,
+                             f"SELECT {_USER_ACCOUNT_COLUMNS} FROM UserAccounts WHERE login = ?", (login,))
+        finally:
+            conn.close()
 
     @staticmethod
     def get_all() -> List[UserAccount]:
         conn = get_connection()
-        cur = conn.cursor()
-        cur.execute("SELECT * FROM UserAccounts")
-        rows = cur.fetchall()
-        conn.close()
+        try:
+            return fetch_all(conn, UserAccount, f"SELECT {_USER_ACCOUNT_COLUMNS} FROM UserAccounts")
+        finally:
+            conn.close()
 
-        return [
-            UserAccount(
-                user_id=row["user_id"],
-                employee_id=row["employee_id"],
-                login=row["login"],
-                password_hash=row["password_hash"],
-                is_active=bool(row["is_active"]) if row["is_active"] is not None else None,
-            )
-            for row in rows
-        ]
+    @staticmethod
+    def get_page(limit: int = PAGE_SIZE, after: Optional[tuple] = None) -> Page:
+        #Страница учётных записей по user_id; after — (user_id,)
+        return _fetch_page(UserAccount, "UserAccounts", _USER_ACCOUNT_COLUMNS, ("user_id",),
+                           "", (), limit, after)
 
     @staticmethod
+    def iter_all(page_size: int = PAGE_SIZE) -> Iterator[UserAccount]:
+        return _iter_pages(UserAccountRepository.get_page, page_size)
+
+    @staticmethod
+    @retry_on_busy
     def update(account: UserAccount) -> None:
         #Обновить данные учётной записи
         if account.user_id is None:
             raise ValueError("user_id is required for update")
 
         conn = get_connection()
-        cur = conn.cursor()
-        cur.execute("""
-            UPDATE UserAccounts
-            SET employee_id = ?, login = ?, password_hash = ?, is_active = ?
-            WHERE user_id = ?
-        """, (
-            account.employee_id,
-            account.login,
-            account.password_hash,
-            int(account.is_active) if account.is_active is not None else 1,
-            account.user_id,
-        ))
-        conn.commit()
-        conn.close()
+        try:
+            cur = conn.cursor()
+            cur.execute("""
+                UPDATE UserAccounts
+                SET employee_id = ?, login = ?, password_hash = ?, is_active = ?
+                WHERE user_id = ?
+            """, (
+                account.employee_id,
+                account.login,
+                account.password_hash,
+                int(account.is_active) if account.is_active is not None else 1,
+                account.user_id,
+            ))
+            conn.commit()
+        finally:
+            conn.close()
+        # пароль или блокировка могли измениться — завершаем сессии пользователя
+        user_id = account.user_id
+        on_commit(lambda: sessions.invalidate_user(user_id, revoke_sessions=True))
 
     @staticmethod
+    @retry_on_busy
     def delete(user_id: int) -> None:
         #Удалить учётную запись.
         conn = get_connection()
-        cur = conn.cursor()
-        # сначала удалим все связи ролей этого пользователя
-        cur.execute("DELETE FROM UserRoles WHERE user_id = ?", (user_id,))
-        cur.execute("DELETE FROM UserAccounts WHERE user_id = ?", (user_id,))
-        conn.commit()
-        conn.close()
+        try:
+            cur = conn.cursor()
+            # сначала удалим все связи ролей этого пользователя
+            cur.execute("DELETE FROM UserRoles WHERE user_id = ?", (user_id,))
+            cur.execute("DELETE FROM UserAccounts WHERE user_id = ?", (user_id,))
+            conn.commit()
+        finally:
+            conn.close()
+        on_commit(lambda: sessions.invalidate_user(user_id, revoke_sessions=True))
 
 
 
 class UserRoleRepository:
 
     @staticmethod
+    @retry_on_busy
     def add_role_to_user(user_id: int, role_id: int) -> None:
         #Назначить пользователю роль (создать запись в UserRoles)
         conn = get_connection()
-        cur = conn.cursor()
-        cur.execute("""
-            INSERT OR IGNORE INTO UserRoles (user_id, role_id)
-            VALUES (?, ?)
-        """, (user_id, role_id))
-        conn.commit()
-        conn.close()
+        try:
+            cur = conn.cursor()
+            cur.execute("""
+                INSERT OR IGNORE INTO UserRoles (user_id, role_id)
+                VALUES (?, ?)
+            """, (user_id, role_id))
+            conn.commit()
+        finally:
+            conn.close()
+        on_commit(lambda: sessions.invalidate_user(user_id))
 
     @staticmethod
+    @retry_on_busy
     def remove_role_from_user(user_id: int, role_id: int) -> None:
         #Убрать у пользователя конкретную роль.
         conn = get_connection()
-        cur = conn.cursor()
-        cur.execute("""
-            DELETE FROM UserRoles
-            WHERE user_id = ? AND role_id = ?
-        """, (user_id, role_id))
-        conn.commit()
-        conn.close()
+        try:
+            cur = conn.cursor()
+            cur.execute("""
+                DELETE FROM UserRoles
+                WHERE user_id = ? AND role_id = ?
+            """, (user_id, role_id))
+            conn.commit()
+        finally:
+            conn.close()
+        on_commit(lambda: sessions.invalidate_user(user_id))
 
     @staticmethod
     def get_role_ids_for_user(user_id: int) -> List[int]:
         #Получить список ID ролей, назначенных пользователю
         conn = get_connection()
-        cur = conn.cursor()
-        cur.execute("SELECT role_id FROM UserRoles WHERE user_id = ?", (user_id,))
-        rows = cur.fetchall()
-        conn.close()
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT role_id FROM UserRoles WHERE user_id = ?", (user_id,))
+            rows = cur.fetchall()
+        finally:
+            conn.close()
         return [row["role_id"] for row in rows]
 
     @staticmethod
+    @retry_on_busy
     def delete_all_for_user(user_id: int) -> None:
         #Удалить все роли пользователя (очистить UserRoles для него)
         conn = get_connection()
-        cur = conn.cursor()
-        cur.execute("DELETE FROM UserRoles WHERE user_id = ?", (user_id,))
-        conn.commit()
-        conn.close()
+        try:
+            cur = conn.cursor()
+            cur.execute("DELETE FROM UserRoles WHERE user_id = ?", (user_id,))
+            conn.commit()
+        finally:
+            conn.close()
+        on_commit(lambda: sessions.invalidate_user(user_id))
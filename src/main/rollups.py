@@ -0,0 +1,144 @@
+# rollups.py
+"""
+Сводные таблицы для отчётов:
+  EmployeeMonthStats   — сотрудник за месяц;
+  DepartmentDayStats   — отдел за день;
+  DepartmentMonthStats — отдел за месяц.
+
+В каждой: часы, количество отметок, дни с опозданием и переработка.
+Таблицы обновляются приращениями: hours.save_states снимает показатели
+рабочих дней до и после изменения и передаёт разницу в apply_changes.
+Отдел дня — текущий отдел сотрудника (как и в rebuild()), поэтому при смене
+отдела EmployeeRepository.update в той же транзакции переносит в новый
+отдел все дни сотрудника (snapshot_employee до и после). Ручные правки
+WorkDays в обход hours.py исправляет rebuild().
+"""
+from dataclasses import dataclass
+from typing import Dict, Iterable, Tuple
+
+# норма часов в день; всё, что сверху — переработка
+NORM_HOURS = 8.0
+
+ROLLUP_TABLES = {
+    "EmployeeMonthStats": ("employee_id", "month"),
+    "DepartmentDayStats": ("department", "work_date"),
+    "DepartmentMonthStats": ("department", "month"),
+}
+
+# Показатели одного рабочего дня. Отметки и время прихода берутся из
+# WorkDayState: дни, внесённые до hours.py, попадут в сводку после
+# hours.recompute().
+_DAY_METRICS_SQL = f"""
+    SELECT w.workday_id,
+           w.employee_id,
+           IFNULL(e.department, '') AS department,
+           w.work_date,
+           substr(w.work_date, 1, 7) AS month,
+           IFNULL(w.total_hours, 0) AS hours,
+           IFNULL(s.punch_count, 0) AS punches,
+           CASE WHEN w.planned_start IS NOT NULL
+                 AND substr(s.first_in, 12, 5) > substr(w.planned_start, 1, 5)
+                THEN 1 ELSE 0 END AS late,
+           MAX(IFNULL(w.total_hours, 0) - {NORM_HOURS}, 0) AS overtime
+    FROM WorkDays w
+    JOIN Employee e ON e.employee_id = w.employee_id
+    LEFT JOIN WorkDayState s ON s.workday_id = w.workday_id
+"""
+
+
+@dataclass
+class DayMetrics:
+    employee_id: int
+    department: str
+    work_date: str
+    month: str
+    hours: float
+    punches: int
+    late: int
+    overtime: float
+
+
+def snapshot(cur, workday_ids: Iterable[int]) -> Dict[int, DayMetrics]:
+    """Текущие показатели указанных рабочих дней."""
+    ids = list(workday_ids)
+    result: Dict[int, DayMetrics] = {}
+    for i in range(0, len(ids), 500):
+        chunk = ids[i:i + 500]
+        cur.execute(_DAY_METRICS_SQL + f"""
+            WHERE w.workday_id IN ({", ".join("?" * len(chunk))})
+        """, chunk)
+        for row in cur.fetchall():
+            result[row[0]] = DayMetrics(*row[1:])
+    return result
+
+
+def snapshot_employee(cur, employee_id: int) -> Dict[int, DayMetrics]:
+    """Показатели всех рабочих дней сотрудника."""
+    cur.execute(_DAY_METRICS_SQL + " WHERE w.employee_id = ?", (employee_id,))
+    return {row[0]: DayMetrics(*row[1:]) for row in cur.fetchall()}
+
+
+def _add(deltas: Dict[Tuple, list], key: Tuple, values: Tuple, sign: int) -> None:
+    acc = deltas.setdefault(key, [0.0, 0, 0, 0.0])
+    for i, v in enumerate(values):
+        acc[i] += sign * v
+
+
+def apply_changes(cur,
+                  before: Dict[int, DayMetrics],
+                  after: Dict[int, DayMetrics]) -> None:
+    """Перенести в сводные таблицы разницу показателей дней (после минус до)."""
+    deltas: Dict[str, Dict[Tuple, list]] = {name: {} for name in ROLLUP_TABLES}
+    for metrics_by_day, sign in ((before, -1), (after, 1)):
+        for m in metrics_by_day.values():
+            values = (m.hours, m.punches, m.late, m.overtime)
+            _add(deltas["EmployeeMonthStats"], (m.employee_id, m.month), values, sign)
+            _add(deltas["DepartmentDayStats"], (m.department, m.work_date), values, sign)
+            _add(deltas["DepartmentMonthStats"], (m.department, m.month), values, sign)
+
+    for table, (key1, key2) in ROLLUP_TABLES.items():
+        params = [
+            (k[0], k[1], *d)
+            for k, d in deltas[table].items()
+            if any(d)
+        ]
+        if not params:
+            continue
+        cur.executemany(f"""
+            INSERT INTO {table} ({key1}, {key2}, hours, punches, late_days, overtime_hours)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT ({key1}, {key2}) DO UPDATE SET
+                hours = hours + excluded.hours,
+                punches = punches + excluded.punches,
+                late_days = late_days + excluded.late_days,
+                overtime_hours = overtime_hours + excluded.overtime_hours
+        """, params)
+
+
+def rebuild(conn) -> None:
+    """Пересобрать сводные таблицы с нуля по WorkDays/TimeEntries."""
+    cur = conn.cursor()
+    for table, (key1, key2) in ROLLUP_TABLES.items():
+        cur.execute(f"DELETE FROM {table}")
+        cur.execute(f"""
+            INSERT INTO {table} ({key1}, {key2}, hours, punches, late_days, overtime_hours)
+            SELECT {key1}, {key2}, SUM(hours), SUM(punches), SUM(late), SUM(overtime)
+            FROM ({_DAY_METRICS_SQL})
+            GROUP BY {key1}, {key2}
+        """)
+    conn.commit()
+
+
+def main():
+    from db import get_connection
+
+    conn = get_connection()
+    try:
+        rebuild(conn)
+    finally:
+        conn.close()
+    print("Сводные таблицы пересобраны.")
+
+
+if __name__ == "__main__":
+    main()
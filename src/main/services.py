@@ -1,9 +1,14 @@
-from typing import List, Tuple, Optional
+from typing import Iterable, Iterator, List, Tuple, Optional
 import hashlib
 from datetime import datetime
 import csv
 
-from db import get_connection
+from db import get_connection, retry_on_busy, transaction
+import absence_index
+import hours
+import lookups
+import partitions
+import report_cache
 from models import Employee, WorkDay, TimeEntry, Absence, Role
 
 
@@ -23,10 +28,12 @@ def get_workday_with_entries(workday_id: int) -> Tuple[WorkDay, List[TimeEntry]]
     from repositories import TimeEntryRepository
 
     conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM WorkDays WHERE workday_id = ?", (workday_id,))
-    row = cur.fetchone()
-    conn.close()
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT * FROM WorkDays WHERE workday_id = ?", (workday_id,))
+        row = cur.fetchone()
+    finally:
+        conn.close()
     if row is None:
         raise ValueError("Рабочий день не найден")
 
@@ -43,52 +50,22 @@ def get_workday_with_entries(workday_id: int) -> Tuple[WorkDay, List[TimeEntry]]
 
 
 def get_absences_for_employee(employee_id: int) -> List[Tuple[Absence, str]]:
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("""
-        SELECT a.*, t.name AS type_name
-        FROM Absences a
-        JOIN AbsenceType t ON a.absence_type_id = t.absence_type_id
-        WHERE a.employee_id = ?
-        ORDER BY a.date_from
-    """, (employee_id,))
-    rows = cur.fetchall()
-    conn.close()
-
+    # отсутствия — из интервального индекса (зафиксированные, по date_from),
+    # название типа — из кэша справочника вместо JOIN AbsenceType
     result: List[Tuple[Absence, str]] = []
-    for row in rows:
-        abs_obj = Absence(
-            absence_id=row["absence_id"],
-            employee_id=row["employee_id"],
-            absence_type_id=row["absence_type_id"],
-            date_from=row["date_from"],
-            date_to=row["date_to"],
-            status=row["status"],
-        )
-        result.append((abs_obj, row["type_name"]))
+    for abs_obj in absence_index.index.for_employee(employee_id, "0000-01-01", "9999-12-31"):
+        absence_type = lookups.absence_type(abs_obj.absence_type_id)
+        if absence_type is not None:
+            result.append((abs_obj, absence_type.name))
     return result
 
 
 def get_roles_for_user(user_id: int) -> List[Role]:
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("""
-        SELECT r.role_id, r.name, r.description
-        FROM Roles r
-        JOIN UserRoles ur ON ur.role_id = r.role_id
-        WHERE ur.user_id = ?
-    """, (user_id,))
-    rows = cur.fetchall()
-    conn.close()
+    from repositories import UserRoleRepository
 
-    return [
-        Role(
-            role_id=row["role_id"],
-            name=row["name"],
-            description=row["description"],
-        )
-        for row in rows
-    ]
+    # из БД — только id ролей пользователя, сами роли — из кэша справочника
+    roles = (lookups.role(role_id) for role_id in UserRoleRepository.get_role_ids_for_user(user_id))
+    return [role for role in roles if role is not None]
 
 
 # ====== Авторизация ======
@@ -102,11 +79,13 @@ def authenticate(login: str, password: str):
     Авторизация по логину и паролю.
     Возвращает (UserAccount, список Role) или None.
     """
-    from repositories import UserAccountRepository  # локальный импорт
+    from sessions import load_user_by_login  # локальный импорт
 
-    account = UserAccountRepository.get_by_login(login)
-    if account is None:
+    # учётная запись и роли берутся из кэша сессий, при промахе — из БД
+    cached = load_user_by_login(login)
+    if cached is None:
         return None
+    account, roles = cached
 
     if account.is_active is not None and not account.is_active:
         return None
@@ -114,77 +93,222 @@ def authenticate(login: str, password: str):
     if account.password_hash != hash_password(password):
         return None
 
-    roles = get_roles_for_user(account.user_id)
     return account, roles
 
 
 # ====== Функции по use-case диаграмме ======
 
+@retry_on_busy
 def mark_time_entry(employee_id: int, event_type: str, source: str = "manual") -> None:
     """
     Отметить приход/уход сотрудника.
     event_type: 'IN' или 'OUT'.
     """
     conn = get_connection()
-    cur = conn.cursor()
-
-    today = datetime.now().date().isoformat()
+    try:
+        cur = conn.cursor()
 
-    # Ищем/создаём рабочий день на сегодня
-    cur.execute("""
-        SELECT workday_id FROM WorkDays
-        WHERE employee_id = ? AND work_date = ?
-    """, (employee_id, today))
-    row = cur.fetchone()
+        today = datetime.now().date().isoformat()
 
-    if row:
-        workday_id = row["workday_id"]
-    else:
+        # Ищем/создаём рабочий день на сегодня
         cur.execute("""
-            INSERT INTO WorkDays (employee_id, work_date, planned_start, total_hours)
-            VALUES (?, ?, ?, ?)
-        """, (employee_id, today, None, None))
-        workday_id = cur.lastrowid
+            SELECT workday_id FROM WorkDays
+            WHERE employee_id = ? AND work_date = ?
+        """, (employee_id, today))
+        row = cur.fetchone()
+
+        if row:
+            workday_id = row["workday_id"]
+        else:
+            cur.execute("""
+                INSERT INTO WorkDays (employee_id, work_date, planned_start, total_hours)
+                VALUES (?, ?, ?, ?)
+            """, (employee_id, today, None, None))
+            workday_id = cur.lastrowid
+
+        now_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        partitions.insert_entries(cur, [(workday_id, now_str, event_type, source)])
 
-    now_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    cur.execute("""
-        INSERT INTO TimeEntries (workday_id, event_time, event_type, source)
-        VALUES (?, ?, ?, ?)
-    """, (workday_id, now_str, event_type, source))
+        # пересчитываем часы дня по новой отметке (в той же транзакции)
+        hours.register_punch(cur, workday_id, now_str, event_type)
 
-    conn.commit()
-    conn.close()
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def ingest_punches(punches: Iterable[Tuple[int, str, str, Optional[str]]],
+                   synchronous: Optional[str] = None) -> int:
+    """
+    Пакетная загрузка отметок с терминалов.
+    punches: кортежи (employee_id, event_time 'YYYY-MM-DD HH:MM:SS', event_type, source).
+    Рабочие дни находятся/создаются одним пакетом; дни и отметки
+    фиксируются одной транзакцией (synchronous — см. db.transaction).
+    Возвращает количество записанных отметок.
+    """
+    # список собирается до повторов: retry_on_busy вызывает функцию заново,
+    # а генератор к тому времени уже прочитан
+    return _ingest_punches(list(punches), synchronous)
+
+
+@retry_on_busy
+def _ingest_punches(punches: List[Tuple[int, str, str, Optional[str]]],
+                    synchronous: Optional[str]) -> int:
+    from repositories import WorkDayRepository, TimeEntryRepository
+
+    if not punches:
+        return 0
+
+    with transaction(synchronous=synchronous):
+        workday_ids = WorkDayRepository.get_or_create_ids(
+            (employee_id, event_time[:10]) for employee_id, event_time, _, _ in punches
+        )
+        entries = [
+            TimeEntry(
+                time_entry_id=None,
+                workday_id=workday_ids[(employee_id, event_time[:10])],
+                event_time=event_time,
+                event_type=event_type,
+                source=source,
+            )
+            for employee_id, event_time, event_type, source in punches
+        ]
+        return TimeEntryRepository.create_many(entries)
 
 
 def get_personal_report(employee_id: int) -> List[Tuple[str, float, int]]:
-    """Личный отчёт: (дата, часы, количество отметок)."""
+    """Личный отчёт: (дата, часы, количество отметок). Повторные вызовы — из report_cache."""
+    return report_cache.cached("personal", (employee_id,), lambda: _load_personal_report(employee_id))
+
+
+def _load_personal_report(employee_id: int) -> List[Tuple[str, float, int]]:
     conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("""
-        SELECT w.work_date,
-               IFNULL(w.total_hours, 0) AS total_hours,
-               COUNT(t.time_entry_id) AS events_count
-        FROM WorkDays w
-        LEFT JOIN TimeEntries t ON t.workday_id = w.workday_id
-        WHERE w.employee_id = ?
-        GROUP BY w.work_date, w.total_hours
-        ORDER BY w.work_date;
-    """, (employee_id,))
-    rows = cur.fetchall()
-    conn.close()
+    try:
+        cur = conn.cursor()
+        # количество отметок берём из WorkDayState (ведёт hours.py);
+        # для старых дней без состояния — считаем по TimeEntries через индекс
+        # (дни в помесячных разделах всегда имеют состояние, см. partitions.enable)
+        cur.execute("""
+            SELECT w.work_date,
+                   IFNULL(w.total_hours, 0) AS total_hours,
+                   COALESCE(s.punch_count,
+                            (SELECT COUNT(*) FROM TimeEntries t
+                             WHERE t.workday_id = w.workday_id)) AS events_count
+            FROM WorkDays w
+            LEFT JOIN WorkDayState s ON s.workday_id = w.workday_id
+            WHERE w.employee_id = ?
+            ORDER BY w.work_date;
+        """, (employee_id,))
+        rows = cur.fetchall()
+    finally:
+        conn.close()
     return [(row["work_date"], row["total_hours"], row["events_count"]) for row in rows]
 
 
-def generate_timesheet(start_date: str,
-                       end_date: str,
-                       department: Optional[str] = None) -> List[Tuple[str, str, str, float]]:
+def get_monthly_report(employee_id: int) -> List[Tuple[str, float, int, int, float]]:
+    """Помесячный отчёт сотрудника: (месяц, часы, отметки, дней с опозданием, переработка)."""
+    conn = get_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT month, hours, punches, late_days, overtime_hours
+            FROM EmployeeMonthStats
+            WHERE employee_id = ?
+            ORDER BY month;
+        """, (employee_id,))
+        rows = cur.fetchall()
+    finally:
+        conn.close()
+    return [
+        (row["month"], round(row["hours"], 2), row["punches"],
+         row["late_days"], round(row["overtime_hours"], 2))
+        for row in rows
+    ]
+
+
+def get_monthly_timesheet(month: str,
+                          department: Optional[str] = None) -> List[Tuple[str, str, float, int, int, float]]:
     """
-    Сформировать табель: (отдел, ФИО, дата, часы).
-    Если department=None — по всей организации.
+    Сводный табель за месяц 'YYYY-MM':
+    (отдел, ФИО, часы, отметки, дней с опозданием, переработка).
+    Читается из EmployeeMonthStats, без агрегации сырых отметок.
     """
     conn = get_connection()
-    cur = conn.cursor()
+    try:
+        cur = conn.cursor()
+
+        sql = """
+            SELECT e.department AS department,
+                   e.last_name || ' ' || e.first_name || ' ' || IFNULL(e.middle_name, '') AS full_name,
+                   m.hours, m.punches, m.late_days, m.overtime_hours
+            FROM EmployeeMonthStats m
+            JOIN Employee e ON e.employee_id = m.employee_id
+            WHERE m.month = ?
+        """
+        params: List = [month]
+
+        if department is not None:
+            sql += " AND e.department = ?"
+            params.append(department)
+
+        sql += " ORDER BY department, full_name;"
+
+        cur.execute(sql, params)
+        rows = cur.fetchall()
+    finally:
+        conn.close()
+    return [
+        (row["department"], row["full_name"], round(row["hours"], 2), row["punches"],
+         row["late_days"], round(row["overtime_hours"], 2))
+        for row in rows
+    ]
+
 
+def get_department_summary(start_month: str,
+                           end_month: str) -> List[Tuple[str, str, float, int, int, float]]:
+    """Итоги по отделам: (отдел, месяц, часы, отметки, дней с опозданием, переработка)."""
+    conn = get_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT department, month, hours, punches, late_days, overtime_hours
+            FROM DepartmentMonthStats
+            WHERE month BETWEEN ? AND ?
+            ORDER BY department, month;
+        """, (start_month, end_month))
+        rows = cur.fetchall()
+    finally:
+        conn.close()
+    return [
+        (row["department"], row["month"], round(row["hours"], 2), row["punches"],
+         row["late_days"], round(row["overtime_hours"], 2))
+        for row in rows
+    ]
+
+
+# сколько строк табеля читать из курсора за один раз
+TIMESHEET_CHUNK_SIZE = 1000
+
+
+def iter_timesheet(start_date: str,
+                   end_date: str,
+                   department: Optional[str] = None,
+                   chunk_size: int = TIMESHEET_CHUNK_SIZE) -> Iterator[Tuple[str, str, str, float]]:
+    """
+    Табель построчно: (отдел, ФИО, дата, часы).
+    Строки читаются из курсора порциями по chunk_size; соединение занято, пока
+    генератор не исчерпан или не закрыт. Дочитанный табель до
+    report_cache.MAX_ROWS строк запоминается, и повторный табель с теми же
+    параметрами, пока данные не менялись, идёт из report_cache без запроса.
+    """
+    return report_cache.cached_iter("timesheet", (start_date, end_date, department),
+                                    lambda: _read_timesheet(start_date, end_date, department, chunk_size))
+
+
+def _read_timesheet(start_date: str,
+                    end_date: str,
+                    department: Optional[str],
+                    chunk_size: int) -> Iterator[Tuple[str, str, str, float]]:
     sql = """
         SELECT e.department AS department,
                e.last_name || ' ' || e.first_name || ' ' || IFNULL(e.middle_name, '') AS full_name,
@@ -202,51 +326,83 @@ def generate_timesheet(start_date: str,
 
     sql += " ORDER BY department, full_name, w.work_date;"
 
-    cur.execute(sql, params)
-    rows = cur.fetchall()
-    conn.close()
+    conn = get_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute(sql, params)
+        while True:
+            rows = cur.fetchmany(chunk_size)
+            if not rows:
+                break
+            for row in rows:
+                yield row["department"], row["full_name"], row["work_date"], row["hours"]
+    finally:
+        conn.close()
 
-    return [
-        (row["department"], row["full_name"], row["work_date"], row["hours"])
-        for row in rows
-    ]
+
+def generate_timesheet(start_date: str,
+                       end_date: str,
+                       department: Optional[str] = None) -> List[Tuple[str, str, str, float]]:
+    """
+    Сформировать табель: (отдел, ФИО, дата, часы).
+    Если department=None — по всей организации.
+    Повторный табель с теми же параметрами, пока данные не менялись, берётся
+    из report_cache. Для больших периодов используйте iter_timesheet.
+    """
+    return report_cache.cached("timesheet", (start_date, end_date, department),
+                               lambda: list(_read_timesheet(start_date, end_date, department,
+                                                            TIMESHEET_CHUNK_SIZE)))
 
 
-def export_timesheet_to_csv(filename: str, rows: List[Tuple[str, str, str, float]]) -> None:
-    """Экспорт табеля в CSV (откроется в Excel)."""
+def export_timesheet_to_csv(filename: str, rows: Iterable[Tuple[str, str, str, float]]) -> int:
+    """
+    Экспорт табеля в CSV (откроется в Excel).
+    rows может быть генератором (iter_timesheet) — строки пишутся по мере чтения.
+    Возвращает количество записанных строк.
+    """
     headers = ["Отдел", "ФИО", "Дата", "Часы"]
+    count = 0
     with open(filename, "w", newline="", encoding="utf-8") as f:
         writer = csv.writer(f, delimiter=';')
         writer.writerow(headers)
-        writer.writerows(rows)
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    return count
+
+
+def find_employees(text: str, limit: int = 20) -> List[Employee]:
+    """Сотрудники по части ФИО, должности или отдела («иван пет» — Иванов Пётр …)."""
+    from repositories import EmployeeRepository
+    return EmployeeRepository.search(text, limit)
 
 
 def get_department_of_employee(employee_id: int) -> Optional[str]:
     """Получить отдел сотрудника (для руководителя)."""
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT department FROM Employee WHERE employee_id = ?", (employee_id,))
-    row = cur.fetchone()
-    conn.close()
-    return row["department"] if row else None
+    from repositories import EmployeeRepository
 
+    employee = EmployeeRepository.get_by_id(employee_id)
+    return employee.department if employee else None
 
+
+@retry_on_busy
 def update_employee_data(employee_id: int,
                          position: Optional[str],
                          department: Optional[str]) -> None:
-    """HR: обновить должность/отдел сотрудника."""
+    """HR: обновить должность/отдел сотрудника (чтение и запись — одна транзакция)."""
     from repositories import EmployeeRepository
 
-    emp = EmployeeRepository.get_by_id(employee_id)
-    if emp is None:
-        raise ValueError("Сотрудник не найден")
+    with transaction():
+        emp = EmployeeRepository.get_by_id(employee_id)
+        if emp is None:
+            raise ValueError("Сотрудник не найден")
 
-    if position:
-        emp.position = position
-    if department:
-        emp.department = department
+        if position:
+            emp.position = position
+        if department:
+            emp.department = department
 
-    EmployeeRepository.update(emp)
+        EmployeeRepository.update(emp)
 
 
 def create_employee(last_name: str,
@@ -272,11 +428,15 @@ def create_employee(last_name: str,
     return new_id
 
 
+@retry_on_busy
 def create_user_with_role(employee_id: int,
                           login: str,
                           password: str,
                           role_name: str) -> None:
-    """Админ: создать нового пользователя (UserAccounts + UserRoles) для уже существующего сотрудника."""
+    """
+    Админ: создать нового пользователя (UserAccounts + UserRoles) для уже существующего сотрудника.
+    Все проверки и вставки идут одной транзакцией: при ошибке ничего не создаётся.
+    """
     from models import UserAccount
     from repositories import (
         UserAccountRepository,
@@ -284,36 +444,33 @@ def create_user_with_role(employee_id: int,
         EmployeeRepository,
     )
 
-    # 1) Проверяем, что сотрудник существует
-    emp = EmployeeRepository.get_by_id(employee_id)
-    if emp is None:
-        raise ValueError(f"Сотрудник с ID={employee_id} не найден. Сначала добавьте сотрудника в Employee.")
-
-    # 2) Проверяем уникальность логина
-    existing = UserAccountRepository.get_by_login(login)
-    if existing is not None:
-        raise ValueError(f"Логин '{login}' уже используется.")
-
-    # 3) Находим роль
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT role_id FROM Roles WHERE name = ?", (role_name,))
-    row = cur.fetchone()
-    conn.close()
-    if row is None:
-        raise ValueError(f"Роль '{role_name}' не найдена. Используйте: Employee, HR, Manager, Admin.")
-
-    role_id = row["role_id"]
-
-    # 4) Создаём учётную запись
-    account = UserAccount(
-        user_id=None,
-        employee_id=employee_id,
-        login=login,
-        password_hash=hash_password(password),
-        is_active=True,
-    )
-    new_id = UserAccountRepository.create(account)
+    with transaction():
+        # 1) Проверяем, что сотрудник существует
+        emp = EmployeeRepository.get_by_id(employee_id)
+        if emp is None:
+            raise ValueError(f"Сотрудник с ID={employee_id} не найден. Сначала добавьте сотрудника в Employee.")
+
+        # 2) Проверяем уникальность логина
+        existing = UserAccountRepository.get_by_login(login)
+        if existing is not None:
+            raise ValueError(f"Логин '{login}' уже используется.")
+
+        # 3) Находим роль
+        role = lookups.role_by_name(role_name)
+        if role is None:
+            raise ValueError(f"Роль '{role_name}' не найдена. Используйте: Employee, HR, Manager, Admin.")
+
+        role_id = role.role_id
+
+        # 4) Создаём учётную запись
+        account = UserAccount(
+            user_id=None,
+            employee_id=employee_id,
+            login=login,
+            password_hash=hash_password(password),
+            is_active=True,
+        )
+        new_id = UserAccountRepository.create(account)
 
-    # 5) Привязываем роль
-    UserRoleRepository.add_role_to_user(new_id, role_id)
+        # 5) Привязываем роль
+        UserRoleRepository.add_role_to_user(new_id, role_id)
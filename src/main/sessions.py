@@ -0,0 +1,183 @@
+# sessions.py
+"""
+Сессии пользователей и кэш учётных записей.
+
+После входа пользователь получает непрозрачный токен; по токену
+get_session возвращает (UserAccount, роли) из кэша в памяти, не обращаясь к БД.
+Кэш сбрасывается репозиториями при изменении учётной записи или ролей,
+а при смене БД (db.on_db_changed) — вместе со всеми сессиями.
+"""
+import secrets
+import threading
+import time
+from dataclasses import dataclass, replace
+from typing import Dict, List, Optional, Tuple
+
+from cache import LRUCache
+from db import in_transaction, on_db_changed
+from models import Role, UserAccount
+
+SESSION_TTL = 8 * 3600       # срок жизни сессии без обращений, секунд
+AUTH_CACHE_SIZE = 1024       # сколько пользователей держать в кэше
+AUTH_CACHE_TTL = 300.0       # страховочный срок жизни записи кэша, секунд
+
+# user_id -> (UserAccount, [Role])
+auth_cache = LRUCache(AUTH_CACHE_SIZE, AUTH_CACHE_TTL)
+# login -> user_id, чтобы вход не ходил в БД за учётной записью
+_login_index: Dict[str, int] = {}
+_login_lock = threading.Lock()
+# растёт при каждом сбросе: данные, прочитанные из БД до сброса, в кэш не попадут
+_epoch = 0
+
+
+@dataclass
+class Session:
+    token: str
+    user_id: int
+    expires_at: float
+
+
+_sessions: Dict[str, Session] = {}
+_sessions_lock = threading.Lock()
+
+
+# ====== Кэш учётных записей ======
+
+def _copy(entry: Tuple[UserAccount, List[Role]]) -> Tuple[UserAccount, List[Role]]:
+    # отдаём копии, чтобы вызывающий код не мог испортить кэш
+    account, roles = entry
+    return replace(account), [replace(r) for r in roles]
+
+
+def _remember(account: UserAccount, roles: List[Role], epoch: int) -> None:
+    if in_transaction():
+        # внутри transaction() прочитаны, возможно, ещё не зафиксированные данные
+        return
+    with _login_lock:
+        if epoch != _epoch:
+            return
+        auth_cache.set(account.user_id, (account, roles))
+        _login_index[account.login] = account.user_id
+
+
+def load_user(user_id: int) -> Optional[Tuple[UserAccount, List[Role]]]:
+    """(UserAccount, роли) по user_id — из кэша или из БД."""
+    entry = auth_cache.get(user_id)
+    if entry is None:
+        from repositories import UserAccountRepository
+        from services import get_roles_for_user
+
+        epoch = _epoch
+        account = UserAccountRepository.get_by_id(user_id)
+        if account is None:
+            return None
+        entry = (account, get_roles_for_user(account.user_id))
+        _remember(*entry, epoch)
+    return _copy(entry)
+
+
+def load_user_by_login(login: str) -> Optional[Tuple[UserAccount, List[Role]]]:
+    """(UserAccount, роли) по логину — из кэша или из БД."""
+    with _login_lock:
+        user_id = _login_index.get(login)
+    if user_id is not None:
+        entry = auth_cache.get(user_id)
+        if entry is not None and entry[0].login == login:
+            return _copy(entry)
+
+    from repositories import UserAccountRepository
+    from services import get_roles_for_user
+
+    epoch = _epoch
+    account = UserAccountRepository.get_by_login(login)
+    if account is None:
+        return None
+    entry = (account, get_roles_for_user(account.user_id))
+    _remember(*entry, epoch)
+    return _copy(entry)
+
+
+def invalidate_user(user_id: int, revoke_sessions: bool = False) -> None:
+    """
+    Сбросить кэш пользователя (вызывается репозиториями после изменений).
+    revoke_sessions=True дополнительно завершает все его сессии —
+    например, после смены пароля, блокировки или удаления учётной записи.
+    """
+    global _epoch
+    with _login_lock:
+        _epoch += 1
+        auth_cache.invalidate(user_id)
+        for login in [k for k, v in _login_index.items() if v == user_id]:
+            del _login_index[login]
+    if revoke_sessions:
+        with _sessions_lock:
+            for token in [t for t, s in _sessions.items() if s.user_id == user_id]:
+                del _sessions[token]
+
+
+# ====== Сессии ======
+
+def login(login_name: str, password: str) -> Optional[str]:
+    """Проверить логин/пароль и открыть сессию. Возвращает токен или None."""
+    from services import authenticate
+
+    auth_result = authenticate(login_name, password)
+    if auth_result is None:
+        return None
+    account, _ = auth_result
+
+    token = secrets.token_urlsafe(32)
+    with _sessions_lock:
+        _sessions[token] = Session(token, account.user_id, time.monotonic() + SESSION_TTL)
+    return token
+
+
+def get_session(token: str) -> Optional[Tuple[UserAccount, List[Role]]]:
+    """(UserAccount, роли) по токену или None, если сессия истекла/не существует."""
+    now = time.monotonic()
+    with _sessions_lock:
+        session = _sessions.get(token)
+        if session is None:
+            return None
+        if session.expires_at <= now:
+            del _sessions[token]
+            return None
+        session.expires_at = now + SESSION_TTL
+
+    entry = load_user(session.user_id)
+    if entry is None or (entry[0].is_active is not None and not entry[0].is_active):
+        logout(token)
+        return None
+    return entry
+
+
+def logout(token: str) -> None:
+    with _sessions_lock:
+        _sessions.pop(token, None)
+
+
+def clear() -> None:
+    """
+    Сбросить кэш учётных записей и все сессии. Вызывается при смене БД:
+    user_id сессий относятся к прежней БД.
+    """
+    global _epoch
+    with _login_lock:
+        _epoch += 1
+        auth_cache.clear()
+        _login_index.clear()
+    with _sessions_lock:
+        _sessions.clear()
+
+
+on_db_changed(clear)
+
+
+def purge_expired() -> int:
+    """Удалить истёкшие сессии. Возвращает, сколько удалено."""
+    now = time.monotonic()
+    with _sessions_lock:
+        expired = [t for t, s in _sessions.items() if s.expires_at <= now]
+        for token in expired:
+            del _sessions[token]
+    return len(expired)
@@ -0,0 +1,148 @@
+import random
+import sqlite3
+from datetime import date, timedelta
+
+import absence_index
+import data_versions
+import db
+from models import Absence, Employee
+from repositories import AbsenceRepository, EmployeeRepository
+
+STATUSES = ["Approved", "Requested", "Rejected"]
+
+
+def _fill(seed: int = 3) -> list:
+    rng = random.Random(seed)
+    employees = [EmployeeRepository.create(Employee(None, f"Сотрудник{i}", "Иван", None, None, "ИТ"))
+                 for i in range(8)]
+    with db.get_connection() as conn:
+        for _ in range(300):
+            start = date(2025, 1, 1) + timedelta(days=rng.randint(0, 360))
+            conn.execute("""
+                INSERT INTO Absences (employee_id, absence_type_id, date_from, date_to, status)
+                VALUES (?, 1, ?, ?, ?)
+            """, (rng.choice(employees), start.isoformat(),
+                  (start + timedelta(days=rng.choice([0, 0, 1, 4, 13, 40]))).isoformat(),
+                  rng.choice(STATUSES)))
+        conn.commit()
+    absence_index.reload()          # строки вставлены в обход репозитория
+    return employees
+
+
+def _expected(start: str, end: str, employee_id=None, statuses=None) -> list:
+    """Перебор всех строк Absences."""
+    with db.get_connection() as conn:
+        rows = conn.execute("""
+            SELECT absence_id, employee_id, absence_type_id, date_from, date_to, status FROM Absences
+        """).fetchall()
+    return sorted((Absence(*row) for row in rows
+                   if row[3] <= end and row[4] >= start
+                   and (employee_id is None or row[1] == employee_id)
+                   and (statuses is None or row[5] in statuses)),
+                  key=lambda a: (a.date_from, a.absence_id))
+
+
+def _ids(absences) -> list:
+    return [a.absence_id for a in absences]
+
+
+def _check_all(employees, days) -> None:
+    index = absence_index.index
+    for day in days:
+        assert index.on_day(day) == _expected(day, day), day
+        assert index.absent_employees(day, ["Approved"]) == sorted(
+            {a.employee_id for a in _expected(day, day, statuses=["Approved"])})
+        for employee_id in employees:
+            assert sorted(_ids(index.for_employee(employee_id, day))) == sorted(
+                _ids(_expected(day, day, employee_id)))
+            assert index.is_absent(employee_id, day, ["Requested"]) == bool(
+                _expected(day, day, employee_id, ["Requested"]))
+
+
+def test_queries_match_full_scan(temp_db):
+    employees = _fill()
+    rng = random.Random(5)
+    days = [(date(2024, 12, 25) + timedelta(days=rng.randint(0, 420))).isoformat() for _ in range(25)]
+    _check_all(employees, days)
+
+    index = absence_index.index
+    for _ in range(25):
+        start = date(2024, 12, 25) + timedelta(days=rng.randint(0, 420))
+        end = (start + timedelta(days=rng.randint(0, 60))).isoformat()
+        start = start.isoformat()
+        assert index.between(start, end) == _expected(start, end)
+        assert _ids(index.between(start, end, ["Approved", "Rejected"])) == _ids(
+            _expected(start, end, statuses=["Approved", "Rejected"]))
+        employee_id = rng.choice(employees)
+        assert sorted(_ids(index.for_employee(employee_id, start, end))) == sorted(
+            _ids(_expected(start, end, employee_id)))
+    # date и строка 'YYYY-MM-DD' равнозначны
+    assert index.on_day(date(2025, 6, 1)) == index.on_day("2025-06-01")
+
+
+def test_repository_changes_are_applied_without_reload(temp_db, monkeypatch):
+    employees = _fill()
+    index = absence_index.index
+    assert index.on_day("2025-03-03") is not None          # индекс загружен
+
+    def no_reload():
+        raise AssertionError("изменения через репозиторий не должны перечитывать индекс")
+
+    monkeypatch.setattr(index, "reload", no_reload)
+    created = AbsenceRepository.create(Absence(None, employees[0], 2, "2026-02-02", "2026-02-10", "Requested"))
+    assert _ids(index.for_employee(employees[0], "2026-02-05")) == [created]
+    assert index.absent_employees("2026-02-10") == [employees[0]]
+
+    AbsenceRepository.update_status(created, "Approved")
+    assert index.is_absent(employees[0], "2026-02-03", ["Approved"])
+
+    old = index.on_day("2025-07-07")[0].absence_id
+    AbsenceRepository.delete(old)
+    AbsenceRepository.delete(created)
+    assert index.on_day("2026-02-05") == []
+    _check_all(employees, ["2025-07-07", "2026-02-05", "2025-11-30"])
+
+    # откаченная транзакция в индекс не попадает
+    try:
+        with db.transaction():
+            AbsenceRepository.create(Absence(None, employees[1], 1, "2026-05-01", "2026-05-01", "Approved"))
+            raise KeyError("откат")
+    except KeyError:
+        pass
+    assert index.on_day("2026-05-01") == []
+
+
+def test_changes_from_another_process_are_seen(temp_db):
+    employees = _fill()
+    index = absence_index.index
+    before = index.on_day("2026-03-03")
+    assert before == []
+
+    # «другой процесс»: своё соединение, запись со счётчиком, как в репозитории
+    conn = sqlite3.connect(temp_db)
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            INSERT INTO Absences (employee_id, absence_type_id, date_from, date_to, status)
+            VALUES (?, 1, '2026-03-01', '2026-03-05', 'Approved')
+        """, (employees[2],))
+        other = cur.lastrowid
+        data_versions.bump(cur, data_versions.ABSENCES)
+        conn.commit()
+    finally:
+        conn.close()
+    assert _ids(index.on_day("2026-03-03")) == [other]
+
+    # своё изменение после чужого: счётчик не по порядку — индекс перечитывается
+    conn = sqlite3.connect(temp_db)
+    try:
+        cur = conn.cursor()
+        cur.execute("UPDATE Absences SET status = 'Rejected' WHERE absence_id = ?", (other,))
+        data_versions.bump(cur, data_versions.ABSENCES)
+        conn.commit()
+    finally:
+        conn.close()
+    created = AbsenceRepository.create(Absence(None, employees[3], 1, "2026-03-02", "2026-03-02", "Approved"))
+    assert [(a.absence_id, a.status) for a in index.on_day("2026-03-02")] == [
+        (other, "Rejected"), (created, "Approved")]
+    _check_all(employees, ["2026-03-02", "2025-05-05"])
@@ -0,0 +1,171 @@
+import sqlite3
+
+import data_versions
+import db
+import init_db
+import lookups
+import report_cache
+import services
+import sessions
+from models import Employee
+from repositories import EmployeeRepository
+
+
+def _employee(last_name: str) -> int:
+    return EmployeeRepository.create(Employee(None, last_name, "Иван", None, "Инженер", "ИТ"))
+
+
+def test_employee_cache_follows_updates(temp_db):
+    employee_id = _employee("Иванов")
+    assert EmployeeRepository.get_by_id(employee_id).department == "ИТ"
+    hits = lookups.employees.stats()["hits"]
+    assert EmployeeRepository.get_by_id(employee_id).department == "ИТ"
+    assert lookups.employees.stats()["hits"] == hits + 1
+
+    services.update_employee_data(employee_id, None, "Склад")
+    assert EmployeeRepository.get_by_id(employee_id).department == "Склад"
+
+
+def test_employee_cache_is_reset_on_commit(temp_db):
+    employee_id = _employee("Иванов")
+    EmployeeRepository.get_by_id(employee_id)
+
+    with db.transaction():
+        EmployeeRepository.update(Employee(employee_id, "Иванов", "Иван", None, "Инженер", "Склад"))
+        # до COMMIT другие видят прежнего сотрудника — и кэш его не теряет
+        assert lookups.employees.get(employee_id).department == "ИТ"
+    assert lookups.employees.get(employee_id) is None
+    assert EmployeeRepository.get_by_id(employee_id).department == "Склад"
+
+    try:
+        with db.transaction():
+            EmployeeRepository.delete(employee_id)
+            raise KeyError("откат")
+    except KeyError:
+        pass
+    # откат: кэш и БД совпадают, сбрасывать нечего
+    assert lookups.employees.get(employee_id).department == "Склад"
+    EmployeeRepository.delete(employee_id)
+    assert EmployeeRepository.get_by_id(employee_id) is None
+def test_caches_are_reset_when_database_changes(temp_db, make_db):
+    first = _employee("Иванов")
+    services.create_user_with_role(first, "ivanov", "secret", "Employee")
+    token = sessions.login("ivanov", "secret")
+    assert sessions.get_session(token)[0].login == "ivanov"
+    assert EmployeeRepository.get_by_id(first).last_name == "Иванов"
+
+    # та же схема, тот же employee_id, но другая БД
+    make_db()
+    second = _employee("Петров")
+    assert second == first
+    assert EmployeeRepository.get_by_id(second).last_name == "Петров"
+    assert sessions.get_session(token) is None
+    assert sessions.login("ivanov", "secret") is None
+
+    db.configure_pool(db_name=temp_db)
+    assert EmployeeRepository.get_by_id(first).last_name == "Иванов"
+
+
+def test_report_cache_follows_data_and_database(temp_db, make_db):
+    employee_id = _employee("Иванов")
+    services.ingest_punches([(employee_id, "2025-11-03 09:00:00", "IN", "test"),
+                             (employee_id, "2025-11-03 17:00:00", "OUT", "test")])
+    timesheet = services.generate_timesheet("2025-11-01", "2025-11-30")
+    assert [row[3] for row in timesheet] == [8.0]
+    hits = report_cache.stats()["hits"]
+    assert services.generate_timesheet("2025-11-01", "2025-11-30") == timesheet
+    assert report_cache.stats()["hits"] == hits + 1
+
+    # новая отметка меняет версию данных: отчёт строится заново
+    services.ingest_punches([(employee_id, "2025-11-03 18:00:00", "IN", "test"),
+                             (employee_id, "2025-11-03 19:30:00", "OUT", "test")])
+    assert [row[3] for row in services.generate_timesheet("2025-11-01", "2025-11-30")] == [9.5]
+
+    # в другой БД та же версия данных, но отчёт из прежней БД не возвращается
+    make_db()
+    other = _employee("Петров")
+    services.ingest_punches([(other, "2025-11-03 09:00:00", "IN", "test"),
+                             (other, "2025-11-03 10:00:00", "OUT", "test")])
+    assert [row[3] for row in services.generate_timesheet("2025-11-01", "2025-11-30")] == [1.0]
+
+
+def _timesheet(department=None) -> list:
+    return list(services.iter_timesheet("2025-11-01", "2025-11-30", department))
+
+
+def test_streamed_timesheet_is_served_from_cache(temp_db):
+    employee_id = _employee("Иванов")
+    services.ingest_punches([(employee_id, f"2025-11-{day:02d} 09:00:00", "IN", "test") for day in (3, 4, 5)]
+                            + [(employee_id, f"2025-11-{day:02d} 17:00:00", "OUT", "test") for day in (3, 4, 5)])
+    first = _timesheet("ИТ")
+    assert [row[3] for row in first] == [8.0] * 3
+
+    # повтор — из кэша, тем же потоком строк
+    hits = report_cache.stats()["hits"]
+    assert _timesheet("ИТ") == first
+    assert services.generate_timesheet("2025-11-01", "2025-11-30", "ИТ") == first
+    assert report_cache.stats()["hits"] == hits + 2
+
+    # недочитанный табель в кэш не попадает
+    report_cache.clear()
+    rows = services.iter_timesheet("2025-11-01", "2025-11-30", "ИТ")
+    assert next(rows) == first[0]
+    rows.close()
+    assert len(report_cache.reports) == 0
+    # длинный тоже, но строки отдаются все
+    report_cache.MAX_ROWS, old_max = 2, report_cache.MAX_ROWS
+    try:
+        assert _timesheet("ИТ") == first
+    finally:
+        report_cache.MAX_ROWS = old_max
+    assert len(report_cache.reports) == 0
+
+    # смена отдела сотрудника меняет табель
+    _timesheet("ИТ")
+    services.update_employee_data(employee_id, None, "Склад")
+    assert _timesheet("ИТ") == [] and len(_timesheet("Склад")) == 3
+
+
+def test_report_version_is_bumped_per_statement_not_per_row(temp_db):
+    version = report_cache.data_version()
+    employee_id = _employee("Иванов")
+    assert report_cache.data_version() == version + 1
+    # 200 отметок одной пачкой — несколько увеличений счётчика, а не по одному на строку
+    services.ingest_punches([(employee_id, f"2025-11-{day:02d} {hour:02d}:00:00", "IN" if hour % 2 else "OUT", "t")
+                             for day in range(1, 21) for hour in range(9, 19)])
+    assert 0 < report_cache.data_version() - version - 1 <= 5
+
+    with db.get_connection() as conn:
+        triggers = conn.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' "
+                                "AND name LIKE 'trg_%_version'").fetchall()
+        tables = conn.execute("SELECT name FROM sqlite_master WHERE name = 'DataVersion'").fetchall()
+    assert triggers == [] and tables == []
+
+
+def test_report_cache_sees_other_processes_and_upgrades_old_schema(temp_db):
+    employee_id = _employee("Иванов")
+    services.ingest_punches([(employee_id, "2025-11-03 09:00:00", "IN", "test"),
+                             (employee_id, "2025-11-03 17:00:00", "OUT", "test")])
+    assert [row[3] for row in _timesheet()] == [8.0]
+
+    # другой процесс меняет часы и отмечает изменение счётчиком
+    conn = sqlite3.connect(temp_db)
+    try:
+        cur = conn.cursor()
+        cur.execute("UPDATE WorkDays SET total_hours = 7.5")
+        data_versions.bump(cur, data_versions.REPORTS)
+        conn.commit()
+
+        # прежняя схема: построчные триггеры DataVersion; upgrade их убирает
+        cur.executescript("""
+            CREATE TABLE DataVersion (id INTEGER PRIMARY KEY CHECK (id = 1), version INTEGER NOT NULL);
+            INSERT INTO DataVersion VALUES (1, 0);
+            CREATE TRIGGER trg_workdays_update_version AFTER UPDATE ON WorkDays
+            BEGIN UPDATE DataVersion SET version = version + 1 WHERE id = 1; END;
+        """)
+        init_db.create_tables(conn)
+        assert conn.execute("SELECT COUNT(*) FROM sqlite_master "
+                            "WHERE name IN ('DataVersion', 'trg_workdays_update_version')").fetchone()[0] == 0
+    finally:
+        conn.close()
+    assert [row[3] for row in _timesheet()] == [7.5]
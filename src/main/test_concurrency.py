@@ -0,0 +1,149 @@
+import os
+import sqlite3
+import threading
+
+import pytest
+
+import db
+import partitions
+import services
+from models import Employee, TimeEntry
+from repositories import EmployeeRepository, TimeEntryRepository, WorkDayRepository
+
+
+@pytest.fixture
+def pooled_db(seeded_db):
+    # пул побольше: каждый поток держит своё соединение
+    db.configure_pool(size=16, db_name=seeded_db)
+    return seeded_db
+
+
+def _punches(employee_id: int, day: int, count: int):
+    return [
+        (employee_id, f"2025-11-{day:02d} {8 + i // 60:02d}:{i % 60:02d}:00",
+         "IN" if i % 2 == 0 else "OUT", f"terminal-{employee_id}")
+        for i in range(count)
+    ]
+
+
+def test_long_reader_does_not_block_writer(pooled_db):
+    services.ingest_punches(_punches(1, 1, 200))
+
+    reader_started = threading.Event()
+    release_reader = threading.Event()
+    reader_done = threading.Event()
+    errors = []
+
+    def slow_reader():
+        # держим открытую читающую транзакцию, пока основной поток не допишет
+        try:
+            rows = services.iter_timesheet("2025-01-01", "2025-12-31", chunk_size=1)
+            next(rows)
+            reader_started.set()
+            release_reader.wait(30)
+            list(rows)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            reader_done.set()
+
+    reader = threading.Thread(target=slow_reader)
+    reader.start()
+    assert reader_started.wait(5)
+
+    try:
+        # если бы запись ждала читателя, она упёрлась бы в busy_timeout и упала:
+        # читатель отпускает транзакцию только после release_reader
+        services.ingest_punches(_punches(2, 2, 50))
+        services.mark_time_entry(3, "IN", source="test")
+        assert not reader_done.is_set(), "читатель должен ещё держать транзакцию"
+    finally:
+        release_reader.set()
+
+    reader.join()
+    assert not errors
+
+
+def test_concurrent_readers_and_writers(pooled_db):
+    writers, readers, batches, batch_size = 4, 4, 10, 20
+    errors = []
+    stop = threading.Event()
+
+    def writer(employee_id: int):
+        try:
+            for day in range(1, batches + 1):
+                services.ingest_punches(_punches(employee_id, day, batch_size))
+        except Exception as e:
+            errors.append(e)
+
+    def reader():
+        try:
+            while not stop.is_set():
+                services.generate_timesheet("2025-01-01", "2025-12-31")
+                services.get_personal_report(1)
+        except Exception as e:
+            errors.append(e)
+
+    reader_threads = [threading.Thread(target=reader) for _ in range(readers)]
+    writer_threads = [threading.Thread(target=writer, args=(i + 1,)) for i in range(writers)]
+    for t in reader_threads + writer_threads:
+        t.start()
+    for t in writer_threads:
+        t.join()
+    stop.set()
+    for t in reader_threads:
+        t.join()
+
+    assert not errors, errors
+
+    conn = db.get_connection()
+    try:
+        mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+        count = conn.execute("SELECT COUNT(*) FROM TimeEntries").fetchone()[0]
+    finally:
+        conn.close()
+    assert mode.lower() == "wal"
+    # 3 отметки из тестовых данных + всё, что записали писатели
+    assert count == 3 + writers * batches * batch_size
+    assert os.path.exists(pooled_db + "-wal")
+
+
+def _busy_once(monkeypatch, owner, name: str) -> list:
+    """Первый вызов owner.name падает с «database is locked», остальные проходят."""
+    original = getattr(owner, name)
+    calls = []
+
+    def flaky(*args, **kwargs):
+        calls.append(1)
+        if len(calls) == 1:
+            raise sqlite3.OperationalError("database is locked")
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(owner, name, staticmethod(flaky) if isinstance(owner, type) else flaky)
+    monkeypatch.setattr(db, "WRITE_RETRY_DELAY", 0.001)
+    return calls
+
+
+def test_retry_after_busy_keeps_generator_input(temp_db, monkeypatch):
+    employee_id = EmployeeRepository.create(Employee(None, "Иванов", "Иван", None, None, "ИТ"))
+
+    calls = _busy_once(monkeypatch, partitions, "insert_entries")
+    assert services.ingest_punches(p for p in _punches(employee_id, 1, 4)) == 4
+    assert len(calls) == 2
+
+    calls = _busy_once(monkeypatch, WorkDayRepository, "_fetch_ids")
+    keys = [(employee_id, "2025-11-02"), (employee_id, "2025-11-03")]
+    ids = WorkDayRepository.get_or_create_ids(key for key in keys)
+    assert sorted(ids) == keys and len(calls) > 1
+
+    calls = _busy_once(monkeypatch, partitions, "insert_entries")
+    workday_id = ids[keys[0]]
+    entries = (TimeEntry(None, workday_id, f"2025-11-02 {t}", kind, "test")
+               for t, kind in (("09:00:00", "IN"), ("17:00:00", "OUT")))
+    assert TimeEntryRepository.create_many(entries) == 2
+    assert len(calls) == 2
+
+    with db.get_connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM TimeEntries").fetchone()[0] == 6
+        assert conn.execute("SELECT total_hours FROM WorkDays WHERE workday_id = ?",
+                            (workday_id,)).fetchone()[0] == 8.0
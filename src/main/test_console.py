@@ -0,0 +1,67 @@
+import console
+
+
+class _Answers:
+    def __init__(self, *answers):
+        self.answers = list(answers)
+        self.prompts = []
+
+    def __call__(self, prompt):
+        self.prompts.append(prompt)
+        return self.answers.pop(0)
+
+
+def _rows(count: int, closed: list):
+    try:
+        for i in range(count):
+            yield i, f"Сотрудник {i}"
+    finally:
+        closed.append(True)
+
+
+def _body(out: str) -> list:
+    return out.splitlines()[2:]        # без заголовка и черты
+
+
+def test_pages_ask_before_each_next_page(capsys):
+    ask = _Answers("", "")
+    closed = []
+    printed = console.print_table(["ID", "ФИО"], _rows(7, closed), page_size=3, sample_size=2, ask=ask)
+    assert printed == 7
+    assert ask.prompts == [console.MORE_PROMPT] * 2
+    assert [line.split()[0] for line in _body(capsys.readouterr().out)] == [str(i) for i in range(7)]
+    assert closed == [True]
+
+    # ровно одна страница — вопроса нет
+    ask = _Answers()
+    assert console.print_table(["ID", "ФИО"], _rows(3, []), page_size=3, ask=ask) == 3
+    assert ask.prompts == []
+    # без page_size — без остановок
+    assert console.print_table(["ID", "ФИО"], _rows(50, []), ask=ask) == 50
+    assert ask.prompts == []
+
+
+def test_quit_stops_output_and_closes_rows(capsys):
+    closed = []
+    rows = _rows(1000, closed)
+    printed = console.print_table(["ID", "ФИО"], rows, page_size=4, ask=_Answers("", " Q "))
+    assert printed == 8
+    assert len(_body(capsys.readouterr().out)) == 8
+    # генератор закрыт, не дочитан
+    assert closed == [True]
+    assert next(rows, None) is None
+
+
+def test_widths_come_from_sample_and_long_values_are_cut(capsys):
+    rows = [(1, "Иванов", None), (22, "Очень длинная фамилия сотрудника", 7.5)]
+    console.print_table(["ID", "ФИО", "Часы"], iter(rows), sample_size=1)
+    header, rule, first, second = capsys.readouterr().out.splitlines()
+    # ширина по первой строке и заголовкам: ID, «Иванов», «Часы»
+    assert rule == "  ".join("-" * w for w in (2, 6, 4))
+    assert header.split() == ["ID", "ФИО", "Часы"]
+    assert first.rstrip() == "1   Иванов"
+    assert second == "22  Очень…  7.5 "
+
+    assert console.column_widths(["A", "Б"], [("x" * 100, None)], max_width=10) == [10, 1]
+    console.print_table(["A", "B"], [(1,)], widths=[3, 3])
+    assert capsys.readouterr().out.splitlines()[-1] == "1".ljust(3 + 2 + 3)
@@ -0,0 +1,65 @@
+import sqlite3
+
+import datagen
+import db
+import hours
+import rollups
+
+TABLES = ("Employee", "WorkDays", "TimeEntries", "Absences", "UserAccounts")
+
+
+def _dump(path: str, sql: str) -> list:
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute(sql).fetchall()
+    finally:
+        conn.close()
+
+
+def _count(path: str, table: str) -> int:
+    return _dump(path, f"SELECT COUNT(*) FROM {table}")[0][0]
+
+
+def test_generated_data_matches_application_rules(temp_db, tmp_path):
+    path = str(tmp_path / "bench.db")
+    counts = datagen.generate(path, employees=12, departments=3, days=40, start_date="2025-01-01",
+                              punches_per_day=4, absence_rate=0.05, seed=2)
+    assert counts["Employee"] == 12 and counts["UserAccounts"] == 12
+    assert counts["Absences"] > 0 and counts["WorkDays"] > 0
+    assert counts["TimeEntries"] == counts["WorkDays"] * 4
+    # плюс демо-данные insert_test_data
+    for table in TABLES:
+        assert _count(path, table) >= counts[table], table
+    assert _dump(path, "SELECT COUNT(*) FROM WorkDays WHERE strftime('%w', work_date) IN ('0', '6')") == [(0,)]
+
+    first = _dump(path, "SELECT MIN(employee_id) FROM Employee WHERE department GLOB 'Отдел [0-9]*'")[0][0]
+    generated_days = f"SELECT workday_id FROM WorkDays WHERE employee_id >= {first}"
+    states = f"SELECT * FROM WorkDayState WHERE workday_id IN ({generated_days}) ORDER BY workday_id"
+    days = f"SELECT workday_id, total_hours FROM WorkDays WHERE employee_id >= {first} ORDER BY workday_id"
+    stats = {table: f"SELECT * FROM {table} ORDER BY 1, 2" for table in rollups.ROLLUP_TABLES}
+    generated = {"states": _dump(path, states), "days": _dump(path, days),
+                 **{table: _dump(path, sql) for table, sql in stats.items()}}
+
+    # часы и состояние дня, посчитанные при генерации, совпадают с hours.recompute,
+    # сводки — с rollups.rebuild
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute(f"UPDATE WorkDays SET total_hours = NULL WHERE employee_id >= {first}")
+        conn.execute(f"DELETE FROM WorkDayState WHERE workday_id IN ({generated_days})")
+        conn.commit()
+    finally:
+        conn.close()
+    db.configure_pool(db_name=path)
+    assert hours.recompute() == _dump(path, "SELECT COUNT(DISTINCT workday_id) FROM TimeEntries")[0][0]
+    with db.get_connection() as conn:
+        rollups.rebuild(conn)
+    assert _dump(path, states) == generated["states"]
+    assert _dump(path, days) == generated["days"]
+    for table, sql in stats.items():
+        assert _dump(path, sql) == generated[table], table
+
+    # тот же seed — те же данные
+    again = str(tmp_path / "again.db")
+    assert datagen.generate(again, employees=12, departments=3, days=40, start_date="2025-01-01",
+                            punches_per_day=4, absence_rate=0.05, seed=2) == counts
+    assert _dump(again, "SELECT * FROM TimeEntries") == _dump(path, "SELECT * FROM TimeEntries")
@@ -0,0 +1,144 @@
+import csv
+import json
+import os
+import xml.etree.ElementTree as ET
+
+import db
+import export
+import services
+
+
+def _prepare(monkeypatch, tmp_path, db_path: str):
+    # писатели по умолчанию пишут в out/ относительно текущего каталога
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(export, "DB_NAME", db_path)
+    export.ensure_out_dir()
+
+
+def _employees() -> list:
+    return export.build_nested_structure(export.iter_employee_workdays())
+
+
+def _read(path) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _export_files(names) -> dict:
+    return {name: _read(export.FORMATS[name]().path) for name in names}
+
+
+def test_formats_match_whole_document_serialization(seeded_db, monkeypatch, tmp_path):
+    _prepare(monkeypatch, tmp_path, seeded_db)
+    employees = _employees()
+    assert len(employees) == 4 and employees[0]["workdays"]
+
+    export.export_stream(iter(employees), export.make_writers(["json", "xml"]))
+    # потоковая запись даёт тот же документ, что сериализация списка целиком
+    with open(export.JSON_PATH, encoding="utf-8") as f:
+        assert f.read() == json.dumps(employees, ensure_ascii=False, indent=4)
+    root = ET.parse(export.XML_PATH).getroot()
+    assert [e.findtext("last_name") for e in root] == [e["last_name"] for e in employees]
+    assert [len(e.find("workdays")) for e in root] == [len(e["workdays"]) for e in employees]
+
+    if export.yaml is not None:
+        export.export_yaml(employees)
+        with open(export.YAML_PATH, encoding="utf-8") as f:
+            assert export.yaml.safe_load(f) == employees
+
+
+def test_csv_format_matches_timesheet_csv(seeded_db, monkeypatch, tmp_path):
+    _prepare(monkeypatch, tmp_path, seeded_db)
+    export.export_csv(_employees())
+    with open(export.CSV_PATH, encoding="utf-8-sig", newline="") as f:
+        exported = sorted(
+            (r["department"], r["workday_date"], float(r["workday_total_hours"].lstrip("'")))
+            for r in csv.DictReader(f, delimiter=";") if r["workday_id"]
+        )
+
+    timesheet = tmp_path / "tabel.csv"
+    count = services.export_timesheet_to_csv(str(timesheet),
+                                             services.iter_timesheet("2000-01-01", "2100-01-01"))
+    with open(timesheet, encoding="utf-8", newline="") as f:
+        rows = list(csv.reader(f, delimiter=";"))[1:]
+    assert count == len(rows) == len(exported) == 4
+    assert exported == sorted((r[0], r[2], float(r[3])) for r in rows)
+
+
+def test_parallel_output_matches_serial(seeded_db, monkeypatch, tmp_path):
+    _prepare(monkeypatch, tmp_path, seeded_db)
+    names = export.available_formats()
+    export.export_stream(export.iter_employees(export.iter_employee_workdays()),
+                         export.make_writers(names))
+    serial = _export_files(names)
+
+    for mode in ("thread", "process"):
+        for path in export.OUT_DIR.iterdir():
+            os.remove(path)
+        # пачки по одному сотруднику и очередь на одну пачку: раздача упирается в рабочих
+        timings = export.export_parallel(names, mode=mode, batch_size=1, queue_size=1)
+        assert set(timings) == set(names) | {"total"}
+        assert _export_files(names) == serial, mode
+
+
+def test_parallel_export_fails_when_worker_dies(seeded_db, monkeypatch, tmp_path):
+    _prepare(monkeypatch, tmp_path, seeded_db)
+    monkeypatch.setattr(export, "WORKER_POLL", 0.05)
+    run_writer = export._run_writer
+
+    def dying_writer(name, batches, results):
+        if name == "xml":
+            os._exit(3)               # процесс убит, итог не отправлен
+        run_writer(name, batches, results)
+
+    monkeypatch.setattr(export, "_run_writer", dying_writer)
+    for queue_size in (1, 8):        # падение замечается и при раздаче, и при ожидании итогов
+        try:
+            export.export_parallel(["json", "xml"], mode="process", batch_size=1, queue_size=queue_size)
+        except RuntimeError as e:
+            assert "xml" in str(e) and "3" in str(e)
+        else:
+            raise AssertionError("смерть рабочего должна приводить к ошибке, а не к зависанию")
+
+
+def test_columnar_round_trip(seeded_db, monkeypatch, tmp_path):
+    if not export.ColumnarWriter.available:
+        return                               # без NumPy формат недоступен
+    np = export.np
+    _prepare(monkeypatch, tmp_path, seeded_db)
+    with db.get_connection() as conn:
+        conn.executemany("INSERT INTO WorkDays (employee_id, work_date, planned_start, total_hours) "
+                         "VALUES (?, ?, ?, ?)",
+                         [(4, "2025-12-03", None, 7.3), (4, "1969-12-31", "08:30", None)])
+        conn.commit()
+    employees = _employees()
+    rows = [(e, wd) for e in employees for wd in e["workdays"]]
+
+    # колонки сбрасываются на диск по 2 строки
+    monkeypatch.setattr(export.ColumnarWriter, "CHUNK_ROWS", 2)
+    path = tmp_path / "snapshot"
+    export.export_stream(iter(employees), [export.ColumnarWriter(path)])
+    assert sorted(p.name for p in path.iterdir()) == sorted(
+        [f"{name}.npy" for name in export.ColumnarWriter.COLUMNS] + ["meta.json"])
+
+    for mmap in (True, False):
+        snapshot = export.load_columnar(path, mmap=mmap)
+        assert len(snapshot) == len(rows) == 6
+        assert snapshot["total_hours"].dtype == np.float64
+        assert snapshot["employee_id"].tolist() == [e["employee_id"] for e, _ in rows]
+        assert snapshot["workday_id"].tolist() == [wd["id"] for _, wd in rows]
+        assert [str(d) for d in snapshot.dates()] == [wd["date"] for _, wd in rows]
+        assert snapshot.decode("department").tolist() == [e["department"] for e, _ in rows]
+        assert snapshot.decode("name")[0] == "Иванов Иван Иванович"
+        assert snapshot["planned_start"].tolist() == [
+            int(wd["planned_start"][:2]) * 60 + int(wd["planned_start"][3:]) if wd["planned_start"] else -1
+            for _, wd in rows]
+        hours = snapshot["total_hours"]
+        # float64 хранит часы ровно такими, как в БД
+        assert [None if np.isnan(h) else h for h in hours.tolist()] == [wd["total_hours"] for _, wd in rows]
+        assert snapshot.code_of("department", "Нет такого") == -1
+
+    # повторная выгрузка в тот же каталог заменяет снимок целиком
+    export.export_stream(iter(employees[:1]), [export.ColumnarWriter(path)])
+    assert len(export.load_columnar(path)) == len(employees[0]["workdays"])
+    assert not list(path.glob("*.part"))
@@ -0,0 +1,71 @@
+import db
+import hours
+from models import Employee, TimeEntry, WorkDay
+from repositories import EmployeeRepository, TimeEntryRepository, WorkDayRepository
+
+
+def _workday(total_hours=None) -> int:
+    employee_id = EmployeeRepository.create(Employee(None, "Иванов", "Иван", None, "Инженер", "ИТ"))
+    return WorkDayRepository.create(WorkDay(None, employee_id, "2025-11-03", "09:00", total_hours))
+
+
+def _punch(workday_id: int, time: str, event_type: str) -> None:
+    TimeEntryRepository.create(TimeEntry(None, workday_id, f"2025-11-03 {time}", event_type, "test"))
+
+
+def _stored_hours(workday_id: int):
+    with db.get_connection() as conn:
+        return conn.execute("SELECT total_hours FROM WorkDays WHERE workday_id = ?",
+                            (workday_id,)).fetchone()[0]
+
+
+def test_pairs_in_out_with_breaks_and_unmatched_punches():
+    state = hours.fold_day(1, [
+        ("2025-11-03 08:30:00", "OUT"),    # OUT без IN — не считается
+        ("2025-11-03 09:00:00", "IN"),
+        ("2025-11-03 09:30:00", "IN"),     # повторный IN при открытом интервале
+        ("2025-11-03 13:00:00", "OUT"),
+        ("2025-11-03 14:00:00", "IN"),     # обеденный перерыв 13:00–14:00
+        ("2025-11-03 18:00:00", "OUT"),
+        ("2025-11-03 19:00:00", "IN"),     # незакрытый IN
+    ])
+    assert state.total_hours == 8.0
+    assert state.punch_count == 7
+    assert state.first_in == "2025-11-03 09:00:00"
+    assert state.open_since == "2025-11-03 19:00:00"
+
+
+def test_incremental_hours_and_backdated_punch(temp_db):
+    workday_id = _workday()
+    _punch(workday_id, "09:00:00", "IN")
+    _punch(workday_id, "12:00:00", "OUT")
+    assert _stored_hours(workday_id) == 3.0
+    _punch(workday_id, "13:00:00", "IN")
+    _punch(workday_id, "17:30:00", "OUT")
+    assert _stored_hours(workday_id) == 7.5
+
+    # пропущенный уход на обед пришёл задним числом: день пересчитан целиком
+    _punch(workday_id, "11:00:00", "OUT")
+    assert _stored_hours(workday_id) == 6.5
+
+    assert hours.recompute() == 1
+    assert _stored_hours(workday_id) == 6.5
+
+
+def test_manual_hours_are_not_overwritten(temp_db):
+    workday_id = _workday(total_hours=7.5)
+    _punch(workday_id, "09:00:00", "IN")
+    _punch(workday_id, "10:00:00", "OUT")
+    _punch(workday_id, "08:00:00", "IN")    # задним числом — пересчёт дня
+    assert _stored_hours(workday_id) == 7.5
+
+    hours.recompute()
+    assert _stored_hours(workday_id) == 7.5
+
+    # часы, посчитанные по отметкам, и дальше обновляются отметками
+    punched = _workday()
+    _punch(punched, "09:00:00", "IN")
+    _punch(punched, "10:00:00", "OUT")
+    _punch(punched, "11:00:00", "IN")
+    _punch(punched, "12:30:00", "OUT")
+    assert _stored_hours(punched) == 2.5
@@ -0,0 +1,99 @@
+import os
+import re
+import sys
+
+import db
+import init_db
+
+
+def _run_main(*args: str) -> None:
+    old_argv = sys.argv
+    sys.argv = ["init_db.py", *args]
+    try:
+        init_db.main()
+    finally:
+        sys.argv = old_argv
+
+
+def _index_names(conn) -> set:
+    return {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+
+
+def _expected_indexes() -> set:
+    return {re.search(r"EXISTS (\w+)", sql).group(1) for sql in init_db.INDEXES}
+
+
+def _employee_month(conn, employee_id: int):
+    return tuple(conn.execute("""
+        SELECT hours, punches, late_days FROM EmployeeMonthStats
+        WHERE employee_id = ? AND month = '2025-12'
+    """, (employee_id,)).fetchone())
+
+
+def test_create_indexes(temp_db):
+    with db.get_connection() as conn:
+        assert _expected_indexes() <= _index_names(conn)
+        init_db.create_indexes(conn)            # повторный вызов ничего не ломает
+
+        plan = " ".join(r[3] for r in conn.execute("""
+            EXPLAIN QUERY PLAN
+            SELECT workday_id FROM WorkDays WHERE work_date BETWEEN '2025-11-01' AND '2025-11-30'
+        """))
+        assert "ix_workdays_date" in plan
+
+        # без уникального индекса повторы (employee_id, work_date) возможны — create_indexes их находит
+        conn.execute("DROP INDEX ux_workdays_employee_date")
+        conn.execute("INSERT INTO Employee (last_name, first_name) VALUES ('Иванов', 'Иван')")
+        conn.executemany("INSERT INTO WorkDays (employee_id, work_date) VALUES (1, '2025-11-03')",
+                         [(), ()])
+        conn.commit()
+        assert [tuple(r) for r in init_db.find_duplicate_workdays(conn)] == [(1, "2025-11-03", 2)]
+        try:
+            init_db.create_indexes(conn)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("уникальный индекс нельзя создать поверх повторов")
+        assert "ux_workdays_employee_date" not in _index_names(conn)
+
+
+def test_main_recreates_database_with_hours_and_rollups(temp_db):
+    init_db.DB_NAME = os.path.join(os.path.dirname(temp_db), "fresh.db")
+    _run_main()
+
+    with db.get_connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM Employee").fetchone()[0] == 4
+        assert [r[0] for r in conn.execute("SELECT event_time FROM TimeEntries ORDER BY event_time")] == [
+            "2025-12-01 09:01:00", "2025-12-01 17:05:00", "2025-12-02 09:03:00"]
+        # состояния дней посчитаны до сводок: отметки и опоздания в них учтены
+        assert conn.execute("SELECT COUNT(*) FROM WorkDayState").fetchone()[0] == 2
+        assert _employee_month(conn, 1) == (15.5, 3, 2)
+
+
+def test_upgrade_restores_derived_data(seeded_db):
+    with db.get_connection() as conn:
+        # БД из старой версии: ни индекса, ни состояний дней, ни сводок
+        conn.execute("DROP INDEX ix_workdays_date")
+        conn.execute("DELETE FROM WorkDayState")
+        conn.execute("DELETE FROM EmployeeMonthStats")
+        conn.commit()
+
+    _run_main("--upgrade")
+
+    with db.get_connection() as conn:
+        assert _expected_indexes() <= _index_names(conn)
+        assert conn.execute("SELECT COUNT(*) FROM WorkDayState").fetchone()[0] == 2
+        assert _employee_month(conn, 1) == (15.5, 3, 2)
+        assert conn.execute("SELECT COUNT(*) FROM Employee").fetchone()[0] == 4
+        assert conn.execute("SELECT COUNT(*) FROM sqlite_stat1").fetchone()[0] > 0
+
+
+def test_analyze_only_collects_statistics(seeded_db):
+    with db.get_connection() as conn:
+        assert conn.execute("SELECT name FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchone() is None
+
+    _run_main("--analyze")
+
+    with db.get_connection() as conn:
+        tables = {r[0] for r in conn.execute("SELECT DISTINCT tbl FROM sqlite_stat1")}
+        assert {"WorkDays", "TimeEntries"} <= tables
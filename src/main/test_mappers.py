@@ -0,0 +1,81 @@
+from dataclasses import fields, replace
+
+import db
+import mappers
+from models import Absence, AbsenceType, Employee, Role, TimeEntry, UserAccount, UserRole, WorkDay
+from repositories import (
+    AbsenceRepository, EmployeeRepository, TimeEntryRepository, UserAccountRepository, WorkDayRepository,
+)
+
+TABLES = {
+    Employee: "Employee", WorkDay: "WorkDays", TimeEntry: "TimeEntries", AbsenceType: "AbsenceType",
+    Absence: "Absences", Role: "Roles", UserAccount: "UserAccounts", UserRole: "UserRoles",
+}
+
+
+def _by_name(model, row):
+    # прежний способ: sqlite3.Row и именованные аргументы
+    return model(**{name: row[name] for name in row.keys()})
+
+
+def test_positional_mapping_matches_columns_by_name(seeded_db):
+    with db.get_connection() as conn:
+        conn.execute("INSERT INTO WorkDays (employee_id, work_date, planned_start, total_hours) "
+                     "VALUES (1, '2025-11-04', NULL, NULL)")
+        conn.execute("UPDATE UserAccounts SET is_active = NULL WHERE login = 'petrov'")
+        conn.execute("INSERT INTO Absences (employee_id, absence_type_id, date_from, date_to, status) "
+                     "VALUES (2, 1, '2025-12-01', '2025-12-02', NULL)")
+        conn.commit()
+        for model, table in TABLES.items():
+            names = [f.name for f in fields(model)]
+            # поля модели — колонки таблицы, но порядок колонок в таблице не важен
+            assert set(names) == {r[1] for r in conn.execute(f"PRAGMA table_info({table})")}, table
+            assert mappers.columns(model) == ", ".join(names)
+            assert mappers.columns(model, "t") == ", ".join(f"t.{name}" for name in names)
+
+            by_name = [_by_name(model, row) for row in conn.execute(f"SELECT * FROM {table}")]
+            assert by_name, table
+            positional = mappers.fetch_all(conn, model, f"SELECT {mappers.columns(model)} FROM {table}")
+            converters = mappers.CONVERTERS.get(model, {})
+            assert positional == [
+                replace(m, **{n: c(getattr(m, n)) for n, c in converters.items()}) for m in by_name], table
+
+        accounts = {a.login: a.is_active
+                    for a in mappers.fetch_all(conn, UserAccount, f"SELECT {mappers.columns(UserAccount)} "
+                                                                  f"FROM UserAccounts")}
+        assert accounts["ivanov"] is True and accounts["petrov"] is None
+        assert mappers.fetch_one(conn, Role, f"SELECT {mappers.columns(Role)} FROM Roles WHERE 0") is None
+        # колонки в другом порядке, чем у таблицы
+        assert mappers.fetch_one(conn, Role, "SELECT role_id, name, description FROM Roles WHERE name = ?",
+                                 ("HR",)).name == "HR"
+
+
+def test_slotted_models_round_trip_through_repositories(temp_db):
+    employee = Employee(None, "Иванов", "Иван", None, "Инженер", "ИТ")
+    employee_id = EmployeeRepository.create(employee)
+    assert EmployeeRepository.get_by_id(employee_id) == replace(employee, employee_id=employee_id)
+
+    workday_id = WorkDayRepository.create(WorkDay(None, employee_id, "2025-11-03", "09:00", 7.75))
+    assert WorkDayRepository.get_for_employee(employee_id) == [
+        WorkDay(workday_id, employee_id, "2025-11-03", "09:00", 7.75)]
+    TimeEntryRepository.create(TimeEntry(None, workday_id, "2025-11-03 09:01:30", "IN", "терминал"))
+    [entry] = TimeEntryRepository.get_for_workday(workday_id)
+    assert (entry.workday_id, entry.event_time, entry.event_type, entry.source) == (
+        workday_id, "2025-11-03 09:01:30", "IN", "терминал")
+
+    absence = Absence(None, employee_id, 2, "2025-12-01", "2025-12-05", "Requested")
+    absence_id = AbsenceRepository.create(absence)
+    assert AbsenceRepository.get_for_employee(employee_id) == [replace(absence, absence_id=absence_id)]
+
+    account = UserAccount(None, employee_id, "ivanov", "hash", True)
+    user_id = UserAccountRepository.create(account)
+    assert UserAccountRepository.get_by_login("ivanov") == replace(account, user_id=user_id)
+
+    # slots: у моделей нет __dict__, опечатка в имени поля — ошибка, а не новый атрибут
+    assert not hasattr(entry, "__dict__")
+    try:
+        entry.evnt_type = "OUT"
+    except AttributeError:
+        pass
+    else:
+        raise AssertionError("модель со slots не должна принимать чужие атрибуты")
@@ -0,0 +1,58 @@
+from models import Absence, Employee, WorkDay
+from repositories import AbsenceRepository, EmployeeRepository, WorkDayRepository
+
+
+def _employees(count: int) -> list:
+    return [EmployeeRepository.create(Employee(None, f"Сотрудник{i}", "Иван", None, None, "ИТ"))
+            for i in range(count)]
+
+
+def test_pages_cover_all_rows_once(temp_db):
+    ids = _employees(7)
+    page = EmployeeRepository.get_page(limit=3)
+    assert [e.employee_id for e in page.items] == ids[:3]
+    assert page.next_cursor == (ids[2],)
+
+    seen = []
+    after = None
+    while True:
+        page = EmployeeRepository.get_page(limit=3, after=after)
+        seen += [e.employee_id for e in page.items]
+        if page.next_cursor is None:
+            break
+        after = page.next_cursor
+    assert seen == ids
+    assert [e.employee_id for e in EmployeeRepository.iter_all(page_size=2)] == ids
+
+    # ровно две полные страницы: у второй нет продолжения, пустой третьей нет
+    first = EmployeeRepository.get_page(limit=len(ids) - 1)
+    last = EmployeeRepository.get_page(limit=1, after=first.next_cursor)
+    assert len(last.items) == 1 and last.next_cursor is None
+
+    try:
+        EmployeeRepository.get_page(limit=0)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("limit=0 должен быть отклонён")
+
+
+def test_composite_key_breaks_ties_and_survives_inserts(temp_db):
+    employee_id = _employees(1)[0]
+    dates = ["2025-11-03", "2025-11-01", "2025-11-03", "2025-11-02", "2025-11-03"]
+    for day in dates:
+        AbsenceRepository.create(Absence(None, employee_id, 1, day, day, "Approved"))
+
+    page = AbsenceRepository.get_page_for_employee(employee_id, limit=3)
+    assert [(a.date_from, a.absence_id) for a in page.items] == [
+        ("2025-11-01", 2), ("2025-11-02", 4), ("2025-11-03", 1)]
+    # вставка перед курсором не сдвигает следующую страницу (в отличие от OFFSET)
+    AbsenceRepository.create(Absence(None, employee_id, 1, "2025-10-01", "2025-10-01", "Approved"))
+    rest = AbsenceRepository.get_page_for_employee(employee_id, limit=3, after=page.next_cursor)
+    assert [(a.date_from, a.absence_id) for a in rest.items] == [("2025-11-03", 3), ("2025-11-03", 5)]
+    assert rest.next_cursor is None
+
+    for day in ("2025-11-05", "2025-11-04", "2025-11-06"):
+        WorkDayRepository.create(WorkDay(None, employee_id, day, "09:00", None))
+    assert [w.work_date for w in WorkDayRepository.iter_for_employee(employee_id, page_size=2)] == [
+        "2025-11-04", "2025-11-05", "2025-11-06"]
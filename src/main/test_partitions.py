@@ -0,0 +1,87 @@
+import os
+import sqlite3
+
+import db
+import partitions
+import services
+from models import Employee, WorkDay
+from repositories import EmployeeRepository, TimeEntryRepository, WorkDayRepository
+
+
+def _punches(employee_id: int, day: str, times):
+    return [(employee_id, f"{day} {t}", "IN" if i % 2 == 0 else "OUT", "test")
+            for i, t in enumerate(times)]
+
+
+def _hours() -> dict:
+    with db.get_connection() as conn:
+        return {r[0]: r[1] for r in conn.execute("SELECT workday_id, total_hours FROM WorkDays")}
+
+
+def test_enable_moves_entries_and_keeps_hours(temp_db):
+    employee_id = EmployeeRepository.create(Employee(None, "Иванов", "Иван", None, None, "ИТ"))
+    services.ingest_punches(_punches(employee_id, "2025-10-31", ["09:00:00", "18:00:00"])
+                            + _punches(employee_id, "2025-11-03", ["09:00:00", "17:00:00"]))
+    manual = WorkDayRepository.create(WorkDay(None, employee_id, "2025-11-04", "09:00", 7.5))
+    services.ingest_punches(_punches(employee_id, "2025-11-04", ["09:00:00", "10:00:00"]))
+    with db.get_connection() as conn:
+        # БД, где состояния дней ещё не считались: enable досчитает их;
+        # день, загруженный без пересчёта часов, так и останется без часов
+        conn.execute("DELETE FROM WorkDayState")
+        imported = conn.execute("INSERT INTO WorkDays (employee_id, work_date) VALUES (?, '2025-11-05')",
+                                (employee_id,)).lastrowid
+        conn.executemany("INSERT INTO TimeEntries (workday_id, event_time, event_type) VALUES (?, ?, ?)",
+                         [(imported, "2025-11-05 09:00:00", "IN"), (imported, "2025-11-05 12:00:00", "OUT")])
+        conn.commit()
+    hours_before = _hours()
+    assert hours_before[manual] == 7.5 and hours_before[imported] is None
+    report_before = services.get_personal_report(employee_id)
+
+    with db.get_connection() as conn:
+        assert partitions.enable(conn) == {"2025-10": 2, "2025-11": 6}
+        assert conn.execute("SELECT COUNT(*) FROM main.TimeEntries").fetchone()[0] == 0
+
+    assert _hours() == hours_before
+    assert services.get_personal_report(employee_id) == report_before
+    assert [e.event_time for e in TimeEntryRepository.get_for_workday(manual)] == [
+        "2025-11-04 09:00:00", "2025-11-04 10:00:00"]
+
+
+def test_partition_created_in_transaction_uses_wal(temp_db):
+    employee_id = EmployeeRepository.create(Employee(None, "Иванов", "Иван", None, None, "ИТ"))
+    with db.get_connection() as conn:
+        partitions.enable(conn)
+
+    # раздел за декабрь создаётся внутри transaction() ingest_punches
+    services.ingest_punches(_punches(employee_id, "2025-12-01", ["09:00:00", "18:00:00"]))
+    part = os.path.join(os.path.splitext(temp_db)[0] + ".parts", "te_2025_12.db")
+    conn = sqlite3.connect(part)
+    try:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0].lower() == "wal"
+        ids = [r[0] for r in conn.execute("SELECT time_entry_id FROM TimeEntries")]
+    finally:
+        conn.close()
+    assert len(ids) == 2 and min(ids) > partitions._month_key("2025-12") * partitions.ID_BLOCK
+
+
+def test_archive_and_restore(temp_db):
+    employee_id = EmployeeRepository.create(Employee(None, "Иванов", "Иван", None, None, "ИТ"))
+    services.ingest_punches(_punches(employee_id, "2025-11-03", ["09:00:00", "17:00:00"]))
+    key = (employee_id, "2025-11-03")
+    workday_id = WorkDayRepository.get_or_create_ids([key])[key]
+    with db.get_connection() as conn:
+        partitions.enable(conn)
+        archived = partitions.archive(conn, "2025-11", os.path.join(os.path.dirname(temp_db), "archive"))
+    assert os.path.exists(archived)
+    assert TimeEntryRepository.get_for_workday(workday_id) == []
+    try:
+        services.ingest_punches(_punches(employee_id, "2025-11-05", ["09:00:00"]))
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("запись в архивный раздел должна быть отклонена")
+
+    with db.get_connection() as conn:
+        partitions.restore(conn, "2025-11")
+    assert len(TimeEntryRepository.get_for_workday(workday_id)) == 2
+    assert _hours()[workday_id] == 8.0
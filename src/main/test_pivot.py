@@ -0,0 +1,48 @@
+import os
+
+import pivot
+from models import Absence, Employee, WorkDay
+from repositories import AbsenceRepository, EmployeeRepository, WorkDayRepository
+
+
+def _workday(employee_id: int, day: str, total_hours) -> None:
+    WorkDayRepository.create(WorkDay(None, employee_id, day, "09:00", total_hours))
+
+
+def test_cells_and_totals(temp_db):
+    ivanov = EmployeeRepository.create(Employee(None, "Иванов", "Иван", None, None, "ИТ"))
+    petrov = EmployeeRepository.create(Employee(None, "Петров", "Пётр", None, None, "Склад"))
+    _workday(ivanov, "2025-11-03", 8.0)
+    _workday(ivanov, "2025-11-04", None)      # день без часов, но в отпуске
+    _workday(ivanov, "2025-11-07", None)      # день без часов и без отсутствия
+    _workday(petrov, "2025-11-03", 4.5)
+    AbsenceRepository.create(Absence(None, ivanov, 1, "2025-10-30", "2025-11-05", "Approved"))
+    AbsenceRepository.create(Absence(None, ivanov, 2, "2025-11-06", "2025-11-06", "Pending"))
+    AbsenceRepository.create(Absence(None, petrov, 2, "2025-11-28", "2025-12-02", "Approved"))
+
+    table = pivot.build("2025-11")
+    assert table.days == 30 and len(table) == 2
+    rows = list(table.rows())
+    ivanov_row, petrov_row, total = rows
+    assert ivanov_row[:2] == ["ИТ", "Иванов Иван"]
+    cells = ivanov_row[2:2 + table.days]
+    assert cells[:7] == ["ОТ", "ОТ", "8", "ОТ", "ОТ", "", "0"]
+    assert ivanov_row[-3:] == ["2", "4", "8"]           # дней, неявок, часов
+    assert petrov_row[2 + 27:2 + 30] == ["Б", "Б", "Б"]
+    assert petrov_row[-3:] == ["1", "3", "4.5"]
+    assert total[1] == "Итого" and total[2 + 2] == "12.5" and total[-1] == "12.5"
+
+    department = pivot.build("2025-11", "Склад")
+    assert len(department) == 1 and list(department.rows())[0][1] == "Петров Пётр"
+
+
+def test_export_csv(temp_db):
+    employee_id = EmployeeRepository.create(Employee(None, "Иванов", "Иван", None, None, "ИТ"))
+    _workday(employee_id, "2024-02-29", 7.25)
+    table = pivot.build("2024-02")
+    filename = os.path.join(os.path.dirname(temp_db), "tabel.csv")
+    assert pivot.export_csv(table, filename) == 2
+    with open(filename, encoding="utf-8") as f:
+        lines = f.read().splitlines()
+    assert lines[0].split(";")[-4:] == ["29", "Дней", "Неявок", "Часов"]
+    assert lines[1].split(";")[-4:] == ["7.25", "1", "0", "7.25"]
@@ -0,0 +1,138 @@
+import sqlite3
+import threading
+
+import db
+from models import Employee, WorkDay
+from repositories import EmployeeRepository, WorkDayRepository
+
+
+def _in_thread(func):
+    result = []
+    thread = threading.Thread(target=lambda: result.append(func()))
+    thread.start()
+    thread.join(10)
+    return result[0]
+
+
+def _acquire_in_thread(pool):
+    """Взять соединение в другом потоке и вернуть его в пул."""
+    def take():
+        conn = pool.acquire()
+        conn.close()
+        return conn
+    return _in_thread(take)
+
+
+def test_connection_is_reused_within_thread(temp_db):
+    pool = db.ConnectionPool(temp_db, size=2, timeout=1)
+    outer = pool.acquire()
+    inner = pool.acquire()
+    assert inner is outer
+    # другой поток получает своё соединение
+    assert _acquire_in_thread(pool) is not outer
+
+    inner.close()
+    assert pool.holds_connection()      # внешний вызов ещё держит соединение
+    outer.close()
+    assert not pool.holds_connection()
+    # после последнего close() соединение вернулось в пул и выдаётся снова
+    again = pool.acquire()
+    assert again is outer
+    again.close()
+    pool.close_all()
+
+
+def test_connection_is_released_after_exception(temp_db):
+    employee_id = EmployeeRepository.create(Employee(None, "Иванов", "Иван", None, None, "ИТ"))
+    try:
+        with db.get_connection() as conn:
+            conn.execute("UPDATE Employee SET department = 'Склад' WHERE employee_id = ?",
+                         (employee_id,))
+            raise KeyError("сбой посреди работы")
+    except KeyError:
+        pass
+    assert not db.get_pool().holds_connection()
+    # незафиксированное изменение откатилось при возврате в пул
+    assert EmployeeRepository.get_by_id(employee_id).department == "ИТ"
+
+    # ошибка SQL внутри репозитория тоже не оставляет соединение за потоком
+    try:
+        WorkDayRepository.create(WorkDay(None, employee_id + 100, "2025-11-03", "09:00", None))
+    except sqlite3.IntegrityError:
+        pass
+    else:
+        raise AssertionError("рабочий день несуществующего сотрудника должен быть отклонён")
+    assert not db.get_pool().holds_connection()
+
+
+def test_unhealthy_connection_is_discarded(temp_db):
+    pool = db.ConnectionPool(temp_db, size=1, timeout=1)
+    broken = pool.acquire()
+    broken.close()
+    broken.close_physical()             # соединение в пуле «сломалось»
+
+    conn = pool.acquire()
+    assert conn is not broken
+    assert conn.execute("SELECT COUNT(*) FROM Employee").fetchone()[0] == 0
+    conn.close()
+    # слот сломанного соединения не потерян: пул размером 1 по-прежнему выдаёт соединение
+    assert _acquire_in_thread(pool) is conn
+    pool.close_all()
+
+
+def test_exhausted_pool_times_out(temp_db):
+    pool = db.ConnectionPool(temp_db, size=1, timeout=0.1)
+    conn = pool.acquire()
+
+    def other_thread():
+        try:
+            pool.acquire()
+        except db.PoolExhaustedError:
+            return True
+        return False
+
+    assert _in_thread(other_thread)
+    conn.close()
+    pool.close_all()
+
+
+def _closed(conn) -> bool:
+    try:
+        conn.execute("SELECT 1")
+    except sqlite3.ProgrammingError:
+        return True
+    return False
+
+
+def test_close_all_shuts_the_pool_down(temp_db):
+    pool = db.ConnectionPool(temp_db, size=2, timeout=1)
+    # другой поток держит соединение, пока пул закрывают
+    taken, release = threading.Event(), threading.Event()
+    busy = []
+
+    def worker():
+        conn = pool.acquire()
+        busy.append(conn)
+        taken.set()
+        release.wait(10)
+        conn.close()
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    assert taken.wait(10)
+    idle = pool.acquire()
+    idle.close()
+
+    pool.close_all()
+    assert _closed(idle)                # свободные закрываются сразу
+    assert not _closed(busy[0])         # занятое — при возврате
+    try:
+        pool.acquire()
+    except db.PoolExhaustedError:
+        pass
+    else:
+        raise AssertionError("закрытый пул не должен выдавать соединения")
+
+    release.set()
+    thread.join(10)
+    assert _closed(busy[0])
@@ -0,0 +1,187 @@
+import asyncio
+import json
+import sqlite3
+import threading
+
+import db
+import hours
+import punch_server
+import services
+from models import Employee
+from repositories import EmployeeRepository
+
+
+def _rejected(message: dict) -> bool:
+    try:
+        punch_server.parse_punch(message)
+    except ValueError:
+        return True
+    return False
+
+
+def test_event_time_is_validated():
+    assert hours.normalize_time("2025-11-03T09:05") == "2025-11-03 09:05:00"
+    assert hours.normalize_time("2025-11-03 09:05:00") == "2025-11-03 09:05:00"
+    punch = {"employee_id": 1, "event_type": "IN"}
+    for bad in ("2025-13-45 99:99:99", "2025-02-30 09:00:00", "завтра", "", 20251103):
+        assert _rejected({**punch, "event_time": bad}), bad
+    assert punch_server.parse_punch({**punch, "event_time": "2025-11-03T09:05:00"}) == (
+        1, "2025-11-03 09:05:00", "IN", None)
+
+
+def test_writer_commits_with_full_sync_and_restores_profile(temp_db):
+    employee_id = EmployeeRepository.create(Employee(None, "Иванов", "Иван", None, None, "ИТ"))
+    errors = punch_server.PunchServer._write_batch([
+        (employee_id, "2025-11-03 09:00:00", "IN", "test"),
+        (employee_id + 1, "2025-11-03 09:00:00", "IN", "test"),   # нет такого сотрудника
+    ])
+    assert errors[0] is None and errors[1] is not None
+
+    levels = {"OFF": 0, "NORMAL": 1, "FULL": 2}
+    with db.get_connection() as conn:
+        assert conn.execute("PRAGMA synchronous").fetchone()[0] == levels[db.SYNCHRONOUS or "FULL"]
+        assert conn.execute("SELECT COUNT(*) FROM TimeEntries").fetchone()[0] == 1
+
+
+# ---------- сервер целиком: настоящий сокет, несколько терминалов ----------
+
+class _GatedIngest:
+    """
+    Обёртка над ingest_punches: запоминает пачки и, пока gate закрыт,
+    держит писателя — так в очереди копятся отметки следующей пачки.
+    """
+
+    def __init__(self):
+        self.gate = threading.Event()
+        self.gate.set()
+        self.calls = []
+
+    def __call__(self, punches, synchronous=None):
+        self.gate.wait(10)
+        self.calls.append((len(punches), synchronous))
+        services.ingest_punches(punches, synchronous=synchronous)
+
+
+def _punch(employee_id: int, minute: int, request_id) -> dict:
+    return {"id": request_id, "employee_id": employee_id, "event_type": "IN" if minute % 2 == 0 else "OUT",
+            "event_time": f"2025-11-03 09:{minute:02d}:00", "source": f"terminal-{employee_id}"}
+
+
+def _committed(path: str, employee_id: int, event_time: str) -> bool:
+    # отдельное соединение видит только зафиксированное
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("""
+            SELECT 1 FROM TimeEntries t JOIN WorkDays w ON w.workday_id = t.workday_id
+            WHERE w.employee_id = ? AND t.event_time = ?
+        """, (employee_id, event_time)).fetchone() is not None
+    finally:
+        conn.close()
+
+
+async def _client(port: int, messages: list, on_reply=None) -> list:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    # всё пачкой, не дожидаясь ответов
+    writer.write(b"".join(json.dumps(m).encode() + b"\n" for m in messages))
+    await writer.drain()
+    replies = []
+    for message in messages:
+        reply = json.loads(await asyncio.wait_for(reader.readline(), 10))
+        if on_reply is not None:
+            on_reply(message, reply)
+        replies.append(reply)
+    writer.close()
+    return replies
+
+
+def _serve(scenario, **options):
+    async def run():
+        server = punch_server.PunchServer(**options)
+        tcp_server = await server.start("127.0.0.1", 0)
+        try:
+            return await scenario(server, tcp_server.sockets[0].getsockname()[1])
+        finally:
+            tcp_server.close()
+            await tcp_server.wait_closed()
+            await server.stop()
+    return asyncio.run(run())
+
+
+def test_concurrent_clients_get_acks_after_group_commit(temp_db, monkeypatch):
+    ingest = _GatedIngest()
+    monkeypatch.setattr(punch_server, "ingest_punches", ingest)
+    employees = [EmployeeRepository.create(Employee(None, f"Сотрудник{i}", "Иван", None, None, "ИТ"))
+                 for i in range(4)]
+    not_durable = []
+
+    def check_durable(message, reply):
+        if reply["status"] == "ok" and not _committed(temp_db, message["employee_id"], message["event_time"]):
+            not_durable.append(message["id"])
+
+    async def scenario(server, port):
+        ingest.gate.clear()
+        clients = [_client(port, [_punch(e, m, f"{e}-{m}") for m in range(20)], check_durable)
+                   for e in employees]
+        tasks = [asyncio.ensure_future(c) for c in clients]
+        await asyncio.sleep(0.2)          # пока писатель занят, отметки копятся в очереди
+        ingest.gate.set()
+        return await asyncio.gather(*tasks), server.stats()
+
+    results, stats = _serve(scenario, linger=0.01)
+
+    for employee_id, replies in zip(employees, results):
+        # ответы в порядке запросов, все подтверждены
+        assert [r["id"] for r in replies] == [f"{employee_id}-{m}" for m in range(20)]
+        assert {r["status"] for r in replies} == {"ok"}
+    assert not not_durable, not_durable
+    assert stats["committed"] == 80
+    # 80 отметок ушли несколькими пачками, а не 80 транзакциями
+    assert stats["batches"] == len(ingest.calls) < 10
+    assert {sync for _, sync in ingest.calls} == {punch_server.WRITER_SYNCHRONOUS}
+
+
+def test_full_queue_replies_busy(temp_db, monkeypatch):
+    ingest = _GatedIngest()
+    monkeypatch.setattr(punch_server, "ingest_punches", ingest)
+    employee_id = EmployeeRepository.create(Employee(None, "Иванов", "Иван", None, None, "ИТ"))
+
+    async def scenario(server, port):
+        ingest.gate.clear()
+        # первая отметка у писателя, вторая занимает очередь, третьей места нет
+        task = asyncio.ensure_future(_client(port, [_punch(employee_id, m, m) for m in range(3)]))
+        await asyncio.sleep(0.3)
+        ingest.gate.set()
+        return await task
+
+    replies = _serve(scenario, max_queue=1, enqueue_timeout=0.05, linger=0)
+    assert [r["status"] for r in replies] == ["ok", "ok", "busy"]
+    assert [r["id"] for r in replies] == [0, 1, 2]
+    assert not _committed(temp_db, employee_id, "2025-11-03 09:02:00")
+
+
+def test_failed_batch_is_split_and_good_punches_committed(temp_db, monkeypatch):
+    ingest = _GatedIngest()
+    monkeypatch.setattr(punch_server, "ingest_punches", ingest)
+    employee_id = EmployeeRepository.create(Employee(None, "Иванов", "Иван", None, None, "ИТ"))
+    missing = employee_id + 100
+
+    async def scenario(server, port):
+        ingest.gate.clear()
+        first = asyncio.ensure_future(_client(port, [_punch(employee_id, 0, "first")]))
+        await asyncio.sleep(0.1)          # писатель занят первой отметкой
+        messages = [_punch(employee_id, m, m) for m in range(1, 8)]
+        messages.insert(4, _punch(missing, 30, "bad"))
+        second = asyncio.ensure_future(_client(port, messages))
+        await asyncio.sleep(0.2)
+        ingest.gate.set()
+        return (await first) + (await second), server.stats()
+
+    replies, stats = _serve(scenario, linger=0.01)
+    statuses = {r["id"]: r["status"] for r in replies}
+    assert statuses.pop("bad") == "error"
+    assert set(statuses.values()) == {"ok"} and len(statuses) == 8
+    assert stats["committed"] == 8 and stats["batches"] == 2
+    # вторая пачка (8 отметок) не прошла целиком и делилась пополам до виноватой
+    assert ingest.calls[1][0] == 8 and len(ingest.calls) > 3
+    assert all(_committed(temp_db, employee_id, f"2025-11-03 09:{m:02d}:00") for m in range(8))
+    assert not _committed(temp_db, missing, "2025-11-03 09:30:00")
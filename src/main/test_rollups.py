@@ -0,0 +1,63 @@
+import db
+import rollups
+import services
+from models import Employee, TimeEntry
+from repositories import EmployeeRepository, TimeEntryRepository, WorkDayRepository
+
+
+def _rollup_tables() -> dict:
+    result = {}
+    with db.get_connection() as conn:
+        for table, (key1, key2) in rollups.ROLLUP_TABLES.items():
+            result[table] = sorted(
+                (r[0], r[1], round(r[2], 6), r[3], r[4], round(r[5], 6))
+                for r in conn.execute(f"""
+                    SELECT {key1}, {key2}, hours, punches, late_days, overtime_hours FROM {table}
+                    WHERE hours != 0 OR punches != 0 OR late_days != 0 OR overtime_hours != 0
+                """)
+            )
+    return result
+
+
+def _assert_matches_rebuild() -> dict:
+    incremental = _rollup_tables()
+    with db.get_connection() as conn:
+        rollups.rebuild(conn)
+    assert incremental == _rollup_tables()
+    return incremental
+
+
+def _punch(employee_id: int, event_time: str, event_type: str) -> None:
+    key = (employee_id, event_time[:10])
+    workday_id = WorkDayRepository.get_or_create_ids([key])[key]
+    TimeEntryRepository.create(TimeEntry(None, workday_id, event_time, event_type, "test"))
+
+
+def test_incremental_rollups_match_rebuild(temp_db):
+    ivanov = EmployeeRepository.create(Employee(None, "Иванов", "Иван", None, None, "ИТ"))
+    petrov = EmployeeRepository.create(Employee(None, "Петров", "Пётр", None, None, "Склад"))
+    for day in ("2025-11-03", "2025-11-04", "2025-12-01"):
+        _punch(ivanov, f"{day} 09:00:00", "IN")
+        _punch(ivanov, f"{day} 19:00:00", "OUT")
+        _punch(petrov, f"{day} 08:00:00", "IN")
+        _punch(petrov, f"{day} 12:00:00", "OUT")
+
+    tables = _assert_matches_rebuild()
+    assert ("ИТ", "2025-11", 20.0, 4, 0, 4.0) in tables["DepartmentMonthStats"]
+    assert services.get_monthly_report(ivanov)[0] == ("2025-11", 20.0, 4, 0, 4.0)
+
+
+def test_department_change_moves_rollups(temp_db):
+    ivanov = EmployeeRepository.create(Employee(None, "Иванов", "Иван", None, None, "ИТ"))
+    _punch(ivanov, "2025-11-03 08:00:00", "IN")
+    _punch(ivanov, "2025-11-03 18:00:00", "OUT")
+
+    services.update_employee_data(ivanov, None, "Склад")
+    # отметка задним числом за день, который был ещё в старом отделе
+    _punch(ivanov, "2025-11-03 19:00:00", "IN")
+    _punch(ivanov, "2025-11-03 20:00:00", "OUT")
+
+    tables = _assert_matches_rebuild()
+    assert tables["DepartmentDayStats"] == [("Склад", "2025-11-03", 11.0, 4, 0, 3.0)]
+    assert services.get_department_summary("2025-11", "2025-11") == [
+        ("Склад", "2025-11", 11.0, 4, 0, 3.0)]
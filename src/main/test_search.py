@@ -0,0 +1,48 @@
+import db
+from models import Employee
+from repositories import EmployeeRepository
+
+
+def _names(text: str, limit: int = 20) -> list:
+    return [f"{e.last_name} {e.first_name}" for e in EmployeeRepository.search(text, limit)]
+
+
+def _check_search() -> None:
+    create = EmployeeRepository.create
+    petrov = create(Employee(None, "Петров", "Иван", "Сергеевич", "Кладовщик", "Склад"))
+    create(Employee(None, "Семёнов", "Пётр", None, "Инженер", "ИТ"))
+    create(Employee(None, "Иванов", "Олег", None, "Петрограф", "Лаборатория"))
+    create(Employee(None, "Сидорова", "Анна", None, "Инженер", "ИТ"))
+
+    assert _names("иван пет") == ["Петров Иван", "Иванов Олег"]    # второй — по должности
+    assert _names("ИВАН") == ["Иванов Олег", "Петров Иван"]
+    assert _names("семен") == _names("Семён") == ["Семёнов Пётр"]
+    # совпадения в ФИО — раньше совпадений в должности
+    assert _names("петр") == ["Петров Иван", "Семёнов Пётр", "Иванов Олег"]
+    assert _names("петр", limit=2) == ["Петров Иван", "Семёнов Пётр"]
+    assert _names("инж ит") == ["Семёнов Пётр", "Сидорова Анна"]
+    assert _names("ров") == []                      # только начало слова
+    assert _names('" - *') == [] and _names("") == []
+    assert _names('петров"') == ["Петров Иван"]     # кавычка не ломает запрос
+
+    EmployeeRepository.update(Employee(petrov, "Петрова", "Ирина", None, "Кладовщик", "Склад"))
+    assert _names("ирин") == ["Петрова Ирина"] and _names("иван") == ["Иванов Олег"]
+    EmployeeRepository.delete(petrov)
+    assert _names("петров") == []
+
+
+def test_fts_search(temp_db):
+    with db.get_connection() as conn:
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'EmployeeSearch'").fetchone() is None:
+            return                                # SQLite без FTS5 — проверяет test_search_without_fts
+    _check_search()
+
+
+def test_search_without_fts(temp_db):
+    with db.get_connection() as conn:
+        # как в сборке SQLite без FTS5: ни индекса, ни триггеров
+        for name in ("insert", "update", "delete"):
+            conn.execute(f"DROP TRIGGER IF EXISTS trg_employee_{name}_search")
+        conn.execute("DROP TABLE IF EXISTS EmployeeSearch")
+        conn.commit()
+    _check_search()
@@ -0,0 +1,121 @@
+import builtins
+import time
+from dataclasses import replace
+
+import app
+import db
+import services
+import sessions
+from repositories import UserAccountRepository, UserRoleRepository
+
+
+def _login() -> str:
+    token = sessions.login("ivanov", "emp11")
+    assert token is not None
+    return token
+
+
+def _role_names(token: str) -> set:
+    return {r.name for r in sessions.get_session(token)[1]}
+
+
+def test_session_expires_without_access(seeded_db, monkeypatch):
+    monkeypatch.setattr(sessions, "SESSION_TTL", 0.2)
+    token = _login()
+    assert sessions.login("ivanov", "wrong") is None
+
+    # обращение продлевает сессию
+    for _ in range(3):
+        time.sleep(0.1)
+        assert sessions.get_session(token)[0].login == "ivanov"
+    time.sleep(0.25)
+    assert sessions.get_session(token) is None
+
+    other = _login()
+    time.sleep(0.25)
+    assert sessions.purge_expired() == 1
+    assert sessions.get_session(other) is None
+
+
+def test_account_changes_revoke_sessions(seeded_db):
+    token, kept = _login(), _login()
+    account = UserAccountRepository.get_by_login("ivanov")
+
+    # смена ролей сбрасывает кэш, но не сессии
+    UserRoleRepository.add_role_to_user(account.user_id, 2)
+    assert _role_names(token) == {"Employee", "HR"}
+    UserRoleRepository.remove_role_from_user(account.user_id, 2)
+    assert _role_names(kept) == {"Employee"}
+
+    # блокировка завершает все сессии пользователя
+    UserAccountRepository.update(replace(account, is_active=0))
+    assert sessions.get_session(token) is None and sessions.get_session(kept) is None
+    assert sessions.login("ivanov", "emp11") is None
+
+    UserAccountRepository.update(account)
+    token = _login()
+    UserAccountRepository.delete(account.user_id)
+    assert sessions.get_session(token) is None
+
+
+def test_stale_read_is_not_cached(seeded_db, monkeypatch):
+    user_id = UserAccountRepository.get_by_login("ivanov").user_id
+    original = services.get_roles_for_user
+
+    def roles_then_concurrent_change(uid):
+        roles = original(uid)
+        # пока читали, другой поток изменил пользователя и сбросил кэш
+        sessions.invalidate_user(uid)
+        return roles
+
+    monkeypatch.setattr(services, "get_roles_for_user", roles_then_concurrent_change)
+    assert sessions.load_user(user_id)[0].login == "ivanov"
+    # прочитанное до сброса в кэш не попало
+    assert sessions.auth_cache.get(user_id) is None
+
+    monkeypatch.setattr(services, "get_roles_for_user", original)
+    sessions.load_user(user_id)
+    assert sessions.auth_cache.get(user_id) is not None
+
+
+def test_cache_is_invalidated_on_commit(seeded_db):
+    token = _login()
+    user_id = sessions.get_session(token)[0].user_id
+
+    with db.transaction():
+        UserRoleRepository.add_role_to_user(user_id, 3)
+        # до COMMIT другие видят прежние роли — и кэш их не теряет
+        assert sessions.auth_cache.get(user_id) is not None
+        # прочитанное внутри транзакции не кэшируется
+        sessions.invalidate_user(user_id)
+        assert "Manager" in {r.name for r in sessions.load_user(user_id)[1]}
+        assert sessions.auth_cache.get(user_id) is None
+    assert _role_names(token) == {"Employee", "Manager"}
+
+    try:
+        with db.transaction():
+            UserRoleRepository.remove_role_from_user(user_id, 3)
+            raise KeyError("откат")
+    except KeyError:
+        pass
+    # после отката сбрасывать нечего: кэш и БД совпадают
+    assert sessions.auth_cache.get(user_id) is not None
+    assert _role_names(token) == {"Employee", "Manager"}
+
+
+def test_app_asks_again_when_session_is_gone(seeded_db, monkeypatch, capsys):
+    answers = iter(["ivanov", "emp11", "ivanov", "emp11", "0"])
+    monkeypatch.setattr(builtins, "input", lambda prompt="": next(answers))
+    sessions_seen = []
+
+    def get_session(token):
+        # первую сессию успели отозвать между входом и её чтением
+        sessions_seen.append(token)
+        return None if len(sessions_seen) == 1 else sessions.get_session(token)
+
+    monkeypatch.setattr(app, "get_session", get_session)
+    app.main()
+    out = capsys.readouterr().out
+    assert "Вход не удался" in out and "Успешный вход" in out and "Выход из программы" in out
+    assert len(set(sessions_seen)) == 2
+    assert all(sessions.get_session(t) is None for t in sessions_seen)      # обе закрыты
@@ -0,0 +1,88 @@
+import pytest
+
+import services
+import tracing
+from models import Employee
+from repositories import EmployeeRepository, WorkDayRepository
+
+
+@pytest.fixture
+def traced(temp_db):
+    tracing.reset()
+    tracing.enable()
+    try:
+        yield
+    finally:
+        tracing.disable()
+        tracing.reset()
+
+
+def _callers(sql_start: str) -> dict:
+    return {s["caller"]: s for s in tracing.snapshot() if s["sql"].startswith(sql_start)}
+
+
+def test_queries_are_attributed_to_calling_function(traced):
+    employee_id = EmployeeRepository.create(Employee(None, "Иванов", "Иван", None, None, "ИТ"))
+    services.ingest_punches([(employee_id, "2025-11-03 09:00:00", "IN", "test"),
+                             (employee_id, "2025-11-03 18:00:00", "OUT", "test")])
+    for _ in range(3):
+        WorkDayRepository.get_for_employee(employee_id)
+
+    # запрос выполняет mappers.fetch_all, но приписан репозиторию
+    select = _callers("SELECT workday_id")
+    assert "repositories.WorkDayRepository.get_for_employee" in select
+    assert select["repositories.WorkDayRepository.get_for_employee"]["count"] == 3
+    assert select["repositories.WorkDayRepository.get_for_employee"]["rows"] == 3
+    # запросы hours и rollups — тому, кто пишет отметки
+    callers = {s["caller"] for s in tracing.snapshot()}
+    assert not {c for c in callers if c.split(".")[0] in tracing._SKIP_MODULES}, callers
+    assert list(_callers("UPDATE WorkDays SET total_hours")) == ["repositories.TimeEntryRepository._create_many"]
+    assert list(_callers("INSERT INTO DepartmentDayStats")) == ["repositories.TimeEntryRepository._create_many"]
+    assert "services._ingest_punches" in _callers("COMMIT")
+
+    inserted = _callers("INSERT INTO Employee (")
+    assert list(inserted) == ["repositories.EmployeeRepository.create"]
+    assert inserted["repositories.EmployeeRepository.create"]["rows"] == 1
+    assert "repositories.EmployeeRepository.create" in _callers("COMMIT")
+
+
+def test_percentiles_use_nearest_rank():
+    stats = tracing.StatementStats("f", "SELECT 1")
+    for ms in range(100, 0, -1):
+        stats.add(ms / 1000, 1)
+    assert round(stats.percentile(50) * 1000) == 50
+    assert round(stats.percentile(95) * 1000) == 95
+    assert round(stats.percentile(99) * 1000) == 99
+    assert round(stats.percentile(100) * 1000) == 100
+    assert round(stats.percentile(0) * 1000) == 1
+
+    row = stats.as_dict()
+    assert (row["count"], row["rows"]) == (100, 100)
+    assert round(row["mean_ms"], 6) == 50.5 and round(row["max_ms"]) == 100
+    assert tracing.StatementStats("f", "SELECT 1").percentile(95) == 0.0
+
+
+def test_report_orders_statements_and_sums_callers():
+    statements = [
+        {"caller": "a.f", "sql": "SELECT 1", "count": 10, "rows": 10, "total_ms": 5.0,
+         "p50_ms": 0.4, "p95_ms": 0.9, "p99_ms": 1.0, "max_ms": 1.0},
+        {"caller": "a.f", "sql": "SELECT 2", "count": 1, "rows": 0, "total_ms": 7.0,
+         "p50_ms": 7.0, "p95_ms": 7.0, "p99_ms": 7.0, "max_ms": 7.0},
+        {"caller": "b.g", "sql": "SELECT 3", "count": 2, "rows": 4, "total_ms": 9.0,
+         "p50_ms": 4.5, "p95_ms": 4.5, "p99_ms": 4.5, "max_ms": 4.5},
+    ]
+    lines = tracing.report(statements, sort="total").splitlines()
+    assert [line.strip() for line in lines[2:7:2]] == ["SELECT 3", "SELECT 2", "SELECT 1"]
+    assert lines[1].split()[:3] == ["2", "9.0", "4.500"]
+    # итоги по функциям: a.f — 11 запросов и 12 мс
+    assert lines[-2].split() == ["11", "12.0", "a.f"]
+    assert lines[-1].split() == ["2", "9.0", "b.g"]
+
+    lines = tracing.report(statements, top=1, sort="count").splitlines()
+    assert lines[2].strip() == "SELECT 1"
+    try:
+        tracing.report(statements, sort="avg")
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("неизвестная сортировка должна давать ошибку")
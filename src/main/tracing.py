@@ -0,0 +1,408 @@
+# tracing.py
+"""
+Трассировка SQL-запросов (включается явно).
+
+Когда трассировка включена, пул db.get_connection() создаёт соединения
+db.TracedConnection с курсорами TracingCursor: для каждого запроса замеряется время выполнения
+вместе с чтением строк и число возвращённых строк (для INSERT/UPDATE/DELETE —
+затронутых). Запрос приписывается вызывающей функции — первому кадру стека
+вне db.py, этого модуля и вспомогательных модулей (_SKIP_MODULES: mappers,
+partitions, hours, rollups...), например repositories.EmployeeRepository.get_by_id.
+COMMIT замеряется отдельно, а set_trace_callback досчитывает операторы,
+которые не проходят через курсор (например, срабатывания триггеров).
+
+Медленные запросы (дольше SLOW_QUERY_MS) пишутся в журнал worktime.slow_queries.
+
+Включить:
+    tracing.enable(slow_ms=50, log_path="slow.log")  — из кода;
+    WORKTIME_TRACE=trace.json python app.py             — из окружения,
+        статистика запишется в trace.json при выходе;
+    python tracing.py run --top 10 app.py               — запуск скрипта с отчётом
+        (параметры трассировки — до имени скрипта, всё после него — аргументы скрипта).
+Отчёт по сохранённой статистике:
+    python tracing.py report trace.json --sort p95
+
+Пока трассировка выключена, пул создаёт обычные соединения и курсоры,
+поэтому накладных расходов нет; enable()/disable() пересоздают пул.
+"""
+import argparse
+import atexit
+import json
+import logging
+import math
+import os
+import random
+import re
+import runpy
+import sqlite3
+import sys
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+ENABLED = False
+# порог медленного запроса, мс
+SLOW_QUERY_MS = 200.0
+# сколько замеров на запрос хранить для перцентилей (дальше — случайная выборка)
+SAMPLES_PER_STATEMENT = 2000
+
+slow_log = logging.getLogger("worktime.slow_queries")
+
+# кадры этого файла и этих модулей пропускаются при поиске вызывающей функции
+_THIS_FILE = __file__
+# (mappers, partitions, hours, rollups, report_cache, employee_search — вспомогательные:
+# их запросы приписываются репозиторию или сервису, который их вызвал)
+_SKIP_MODULES = {"db", "functools", "contextlib", "mappers", "partitions", "hours", "rollups",
+                 "report_cache", "employee_search"}
+
+_lock = threading.Lock()
+_local = threading.local()
+_stats: Dict[Tuple[str, str], "StatementStats"] = {}
+_normalized: Dict[str, str] = {}
+
+_WS_RE = re.compile(r"\s+")
+# IN (?, ?, ?) и VALUES (?, ?), (?, ?) разной длины сводим к одному виду
+_PLACEHOLDERS_RE = re.compile(r"\(\?(?:, ?\?)+\)")
+_GROUPS_RE = re.compile(r"(\([^()]*\))(?:, ?\1)+")
+
+
+class StatementStats:
+    __slots__ = ("caller", "sql", "count", "total", "max", "rows", "samples", "errors")
+
+    def __init__(self, caller: str, sql: str):
+        self.caller = caller
+        self.sql = sql
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.rows = 0
+        self.errors = 0
+        self.samples: List[float] = []
+
+    def add(self, duration: float, rows: int) -> None:
+        self.count += 1
+        self.total += duration
+        self.rows += rows
+        if duration > self.max:
+            self.max = duration
+        if len(self.samples) < SAMPLES_PER_STATEMENT:
+            self.samples.append(duration)
+        else:
+            # выборка с резервуаром: каждый замер попадает с равной вероятностью
+            i = random.randrange(self.count)
+            if i < SAMPLES_PER_STATEMENT:
+                self.samples[i] = duration
+
+    def percentile(self, p: float) -> float:
+        # по ближайшему рангу: наименьший замер, не меньше которого p% замеров
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        rank = math.ceil(p / 100 * len(ordered))
+        return ordered[min(max(rank - 1, 0), len(ordered) - 1)]
+
+    def as_dict(self) -> dict:
+        return {
+            "caller": self.caller,
+            "sql": self.sql,
+            "count": self.count,
+            "errors": self.errors,
+            "rows": self.rows,
+            "total_ms": self.total * 1000,
+            "mean_ms": self.total / self.count * 1000 if self.count else 0.0,
+            "p50_ms": self.percentile(50) * 1000,
+            "p95_ms": self.percentile(95) * 1000,
+            "p99_ms": self.percentile(99) * 1000,
+            "max_ms": self.max * 1000,
+        }
+
+
+def normalize_sql(sql: str) -> str:
+    result = _normalized.get(sql)
+    if result is None:
+        result = _WS_RE.sub(" ", sql).strip().rstrip(";").strip()
+        result = _PLACEHOLDERS_RE.sub("(?, ...)", result)
+        result = _GROUPS_RE.sub(r"\1, ...", result)
+        if len(_normalized) < 10000:
+            _normalized[sql] = result
+    return result
+
+
+def _caller() -> str:
+    frame = sys._getframe(2)
+    while frame is not None and (frame.f_code.co_filename == _THIS_FILE
+                                 or frame.f_globals.get("__name__") in _SKIP_MODULES):
+        frame = frame.f_back
+    if frame is None:
+        return "?"
+    return f"{frame.f_globals.get('__name__', '?')}.{frame.f_code.co_qualname}"
+
+
+def _record(caller: str, sql: str, duration: float, rows: int,
+            params=None, error: bool = False) -> None:
+    key = (caller, normalize_sql(sql))
+    with _lock:
+        stats = _stats.get(key)
+        if stats is None:
+            stats = _stats[key] = StatementStats(*key)
+        stats.add(duration, rows)
+        if error:
+            stats.errors += 1
+    if duration * 1000 >= SLOW_QUERY_MS:
+        slow_log.warning("%.1f ms  %s  rows=%d  %s  params=%.200r",
+                         duration * 1000, caller, rows, key[1], params)
+
+
+def timed(name: str, func: Callable[[], object]) -> object:
+    """Выполнить func (например, COMMIT) и учесть его время под именем name."""
+    caller = _caller()
+    _local.busy = True
+    started = time.perf_counter()
+    error = True
+    try:
+        result = func()
+        error = False
+        return result
+    finally:
+        _local.busy = False
+        _record(caller, name, time.perf_counter() - started, 0, error=error)
+
+
+def trace_statement(statement: str) -> None:
+    """Callback для set_trace_callback: учитывает операторы в обход курсора."""
+    # запросы курсора уже учтены; срабатывания триггеров приходят как '-- TRIGGER ...'
+    if getattr(_local, "busy", False) and not statement.startswith("--"):
+        return
+    _record(_caller(), statement, 0.0, 0)
+
+
+class TracingCursor(sqlite3.Cursor):
+    """
+    Курсор с замером времени. Выполнение запроса считается законченным,
+    когда строки дочитаны, курсор закрыт или выполняет следующий запрос.
+    """
+
+    _pending = None     # [caller, sql, params, длительность, строки]
+
+    def _start(self, run: Callable[[], object], sql: str, params) -> None:
+        self._finish()
+        caller = _caller()
+        _local.busy = True
+        started = time.perf_counter()
+        try:
+            run()
+        except BaseException:
+            _record(caller, sql, time.perf_counter() - started, 0, params, error=True)
+            raise
+        finally:
+            _local.busy = False
+        elapsed = time.perf_counter() - started
+        if self.description is None:
+            # INSERT/UPDATE/DELETE: строк для чтения нет
+            _record(caller, sql, elapsed, max(self.rowcount, 0), params)
+        else:
+            self._pending = [caller, sql, params, elapsed, 0]
+
+    def _finish(self) -> None:
+        pending = self._pending
+        if pending is not None:
+            self._pending = None
+            _record(pending[0], pending[1], pending[3], pending[4], pending[2])
+
+    def _fetched(self, started: float, rows: int, done: bool) -> None:
+        pending = self._pending
+        if pending is not None:
+            pending[3] += time.perf_counter() - started
+            pending[4] += rows
+            if done:
+                self._finish()
+
+    def execute(self, sql, parameters=()):
+        self._start(lambda: super(TracingCursor, self).execute(sql, parameters), sql, parameters)
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        self._start(lambda: super(TracingCursor, self).executemany(sql, seq_of_parameters), sql, None)
+        return self
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        self._fetched(started, row is not None, row is None)
+        return row
+
+    def fetchmany(self, size=None):
+        size = self.arraysize if size is None else size
+        started = time.perf_counter()
+        rows = super().fetchmany(size)
+        self._fetched(started, len(rows), len(rows) < size)
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self._fetched(started, len(rows), True)
+        return rows
+
+    def __next__(self):
+        started = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._fetched(started, 0, True)
+            raise
+        self._fetched(started, 1, False)
+        return row
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        try:
+            self._finish()
+        except Exception:
+            pass
+
+
+# ====== Включение и отчёты ======
+
+def _reset_pool() -> None:
+    # пул создаёт соединения нужного класса заново; занятые соединения
+    # старого пула закроются при возврате
+    import db
+    db.configure_pool()
+
+
+def _configure(slow_ms: Optional[float], log_path: Optional[str]) -> None:
+    global SLOW_QUERY_MS
+    if slow_ms is not None:
+        SLOW_QUERY_MS = slow_ms
+    if log_path is not None:
+        handler = logging.FileHandler(log_path, encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+        slow_log.addHandler(handler)
+        slow_log.setLevel(logging.WARNING)
+
+
+def enable(slow_ms: Optional[float] = None, log_path: Optional[str] = None) -> None:
+    """Включить трассировку. Пул соединений пересоздаётся."""
+    global ENABLED
+    _configure(slow_ms, log_path)
+    if not ENABLED:
+        ENABLED = True
+        _reset_pool()
+
+
+def disable() -> None:
+    global ENABLED
+    if ENABLED:
+        ENABLED = False
+        _reset_pool()
+
+
+def reset() -> None:
+    with _lock:
+        _stats.clear()
+
+
+def snapshot() -> List[dict]:
+    """Статистика по всем запросам (список словарей)."""
+    with _lock:
+        return [s.as_dict() for s in _stats.values()]
+
+
+def dump(path: str) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"slow_query_ms": SLOW_QUERY_MS, "statements": snapshot()},
+                  f, ensure_ascii=False, indent=2)
+
+
+# имя сортировки -> поле статистики
+SORT_KEYS = {"total": "total_ms", "count": "count", "p95": "p95_ms", "max": "max_ms", "rows": "rows"}
+
+
+def report(statements: Optional[List[dict]] = None, top: int = 20, sort: str = "total") -> str:
+    """Текстовый отчёт: самые дорогие запросы и итоги по вызывающим функциям."""
+    statements = snapshot() if statements is None else statements
+    if sort not in SORT_KEYS:
+        raise ValueError(f"sort должен быть одним из {', '.join(SORT_KEYS)}")
+    field = SORT_KEYS[sort]
+    lines = [f"{'вызовов':>8} {'всего, мс':>11} {'p50':>8} {'p95':>8} {'p99':>8} {'строк':>9}  функция / запрос"]
+    for s in sorted(statements, key=lambda s: s[field], reverse=True)[:top]:
+        lines.append(f"{s['count']:>8} {s['total_ms']:>11.1f} {s['p50_ms']:>8.3f} {s['p95_ms']:>8.3f} "
+                     f"{s['p99_ms']:>8.3f} {s['rows']:>9}  {s['caller']}")
+        lines.append(f"{'':>57}{s['sql'][:110]}")
+
+    by_caller: Dict[str, List[float]] = {}
+    for s in statements:
+        acc = by_caller.setdefault(s["caller"], [0, 0.0])
+        acc[0] += s["count"]
+        acc[1] += s["total_ms"]
+    lines.append("")
+    lines.append(f"{'запросов':>8} {'всего, мс':>11}  функция")
+    for caller, (count, total) in sorted(by_caller.items(), key=lambda kv: kv[1][1], reverse=True)[:top]:
+        lines.append(f"{count:>8} {total:>11.1f}  {caller}")
+    return "\n".join(lines)
+
+
+def _enable_from_env() -> None:
+    # вызывается при импорте (из db.py), когда пула ещё нет — пересоздавать нечего
+    global ENABLED
+    path = os.environ.get("WORKTIME_TRACE")
+    if not path:
+        return
+    slow_ms = os.environ.get("WORKTIME_SLOW_MS")
+    _configure(float(slow_ms) if slow_ms else None, os.environ.get("WORKTIME_SLOW_LOG"))
+    ENABLED = True
+    atexit.register(dump, path)
+
+
+_enable_from_env()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Трассировка SQL-запросов")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_report = sub.add_parser("report", help="отчёт по сохранённой статистике")
+    p_report.add_argument("path", help="JSON-файл, записанный dump() / WORKTIME_TRACE")
+
+    p_run = sub.add_parser("run", help="запустить скрипт с трассировкой и вывести отчёт",
+                           epilog="Параметры трассировки указываются до имени скрипта: "
+                                  "всё после него (можно отделить «--») передаётся скрипту.")
+    p_run.add_argument("--dump", help="сохранить статистику в JSON")
+    p_run.add_argument("--slow-ms", type=float, help="порог медленного запроса, мс")
+    p_run.add_argument("--slow-log", help="файл журнала медленных запросов")
+
+    for p in (p_report, p_run):
+        p.add_argument("--top", type=int, default=20)
+        p.add_argument("--sort", choices=list(SORT_KEYS), default="total")
+
+    # позиционные — после параметров: REMAINDER забирает всё, что идёт за скриптом
+    p_run.add_argument("script")
+    p_run.add_argument("args", nargs=argparse.REMAINDER)
+    args = parser.parse_args()
+
+    if args.command == "report":
+        with open(args.path, encoding="utf-8") as f:
+            statements = json.load(f)["statements"]
+        print(report(statements, args.top, args.sort))
+        return
+
+    enable(args.slow_ms, args.slow_log)
+    script_args = args.args[1:] if args.args[:1] == ["--"] else args.args
+    sys.argv = [args.script] + script_args
+    sys.path.insert(0, os.path.dirname(os.path.abspath(args.script)))
+    try:
+        runpy.run_path(args.script, run_name="__main__")
+    finally:
+        if args.dump:
+            dump(args.dump)
+        print(report(top=args.top, sort=args.sort), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    # db.py делает import tracing — пусть он получит этот же модуль, а не вторую копию
+    sys.modules.setdefault("tracing", sys.modules[__name__])
+    main()